@@ -0,0 +1,76 @@
+"""
+    Edge query benchmark, needs a Redis server with RedisGraph
+
+    Compares three ways of answering edges { adjacent_nodes }: the
+    original two get_node_by_id queries per edge (timed on a sample and
+    extrapolated), the batched node loader, and load_edges_with_nodes,
+    which returns the nodes with the edges in one query.
+
+    Run from the server directory:
+        python -m benchmarks.bench_edges --host 127.0.0.1
+"""
+import argparse
+import asyncio
+import time
+from src.api.loaders import Loaders
+from src.database.controller import Controller
+from benchmarks.synthetic import building_graph
+
+GRAPH = "bench_edges"
+
+
+async def legacy_adjacent_nodes(db, edges):
+    """adjacent_nodes as it was, two sequential queries per edge"""
+    for edge in edges:
+        for node_id in edge:
+            await db.get_node_by_id(GRAPH, node_id)
+
+
+async def loader_adjacent_nodes(db):
+    """edges query followed by the batched node loader"""
+    edges = await db.load_edges(GRAPH)
+    loaders = Loaders(db)
+    await asyncio.gather(
+        *[loaders.nodes.load_many([(GRAPH, n), (GRAPH, m)]) for n, m in edges]
+    )
+
+
+def timed(coroutine):
+    """Seconds taken to run a coroutine"""
+    start = time.perf_counter()
+    asyncio.run(coroutine)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", default="6379")
+    arg_parser.add_argument("--floors", type=int, default=10)
+    arg_parser.add_argument("--corridors", type=int, default=10)
+    arg_parser.add_argument("--length", type=int, default=200)
+    arg_parser.add_argument("--sample", type=int, default=500)
+    args = arg_parser.parse_args()
+
+    nodes, edges, _ = building_graph(args.floors, args.corridors, args.length, GRAPH)
+    print(f"Building: {len(nodes)} nodes, {len(edges)} edges")
+
+    db = Controller(host=args.host, port=args.port)
+    asyncio.run(db.save_graph(GRAPH, nodes, edges))
+    stored_edges = asyncio.run(db.load_edges(GRAPH))
+
+    sample = stored_edges[: args.sample]
+    elapsed = timed(legacy_adjacent_nodes(db, sample))
+    print(
+        f"Per edge queries: {elapsed / len(sample) * len(stored_edges):.2f}s "
+        f"(extrapolated from {len(sample)} edges)"
+    )
+
+    print(f"Batched loader:   {timed(loader_adjacent_nodes(db)):.2f}s")
+    print(f"Single query:     {timed(db.load_edges_with_nodes(GRAPH)):.2f}s")
+
+    db.redis_db.delete(GRAPH)
+
+
+if __name__ == "__main__":
+    main()
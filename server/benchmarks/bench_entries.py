@@ -0,0 +1,110 @@
+"""
+    Entry read and write benchmark, needs a Redis server
+
+    Compares Controller.add_entries and load_entries (pipelined hash
+    commands) against the original one command per entry, and counts the
+    round trips each makes to Redis.
+
+    Run from the server directory:
+        python -m benchmarks.bench_entries --host 127.0.0.1
+"""
+import argparse
+import asyncio
+import time
+from redis.connection import Connection
+from src.database.controller import Controller
+from src.types.map_types import Polygon
+from benchmarks.synthetic import building_graph
+
+round_trips = 0
+
+
+def count_round_trips():
+    """
+    Count every packed command (a single command or a whole pipeline)
+    sent to Redis
+    """
+    send_packed_command = Connection.send_packed_command
+
+    def counting(self, *args, **kwargs):
+        global round_trips
+        round_trips += 1
+        return send_packed_command(self, *args, **kwargs)
+
+    Connection.send_packed_command = counting
+
+
+async def legacy_add_entries(db, graph_name, entries):
+    """add_entries as it was before pipelining"""
+    for entry in entries:
+        await db.add_entry(graph_name, entry)
+
+
+async def legacy_load_entries(db, graph_name, entry_type):
+    """load_entries as it was before pipelining"""
+    keys = db.redis_db.scan_iter(f"{entry_type.__name__}:{graph_name}:*")
+    return [await db.load_entry(key, entry_type) for key in keys]
+
+
+def measure(label, function, count):
+    """Run a coroutine function, print its time and round trips"""
+    global round_trips
+    round_trips = 0
+    start = time.perf_counter()
+    asyncio.run(function())
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:24} {elapsed:.2f}s ({count / elapsed:.0f} entries/s), "
+        f"{round_trips} round trips"
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", default="6379")
+    arg_parser.add_argument("--floors", type=int, default=10)
+    arg_parser.add_argument("--corridors", type=int, default=5)
+    arg_parser.add_argument("--length", type=int, default=200)
+    arg_parser.add_argument("--pipeline-size", type=int, default=500)
+    args = arg_parser.parse_args()
+
+    _, _, polygons = building_graph(args.floors, args.corridors, args.length)
+    # stair polygons share an ID across floors, keep one of each
+    polygons = list({polygon.id: polygon for polygon in polygons}.values())
+    print(f"Building: {len(polygons)} polygons")
+
+    db = Controller(host=args.host, port=args.port, pipeline_size=args.pipeline_size)
+    count_round_trips()
+
+    def clear(graph_name):
+        for key in db.redis_db.scan_iter(f"Polygon:{graph_name}:*"):
+            db.redis_db.delete(key)
+
+    measure(
+        "Per entry writes:",
+        lambda: legacy_add_entries(db, "bench_legacy", polygons),
+        len(polygons),
+    )
+    measure(
+        "Per entry reads:",
+        lambda: legacy_load_entries(db, "bench_legacy", Polygon),
+        len(polygons),
+    )
+    clear("bench_legacy")
+
+    measure(
+        "Pipelined writes:",
+        lambda: db.add_entries("bench_pipeline", polygons),
+        len(polygons),
+    )
+    measure(
+        "Pipelined reads:",
+        lambda: db.load_entries("bench_pipeline", Polygon),
+        len(polygons),
+    )
+    clear("bench_pipeline")
+
+
+if __name__ == "__main__":
+    main()
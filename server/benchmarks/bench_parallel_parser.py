@@ -0,0 +1,101 @@
+"""
+    Parser benchmark on a synthetic many-floor building
+
+    Compares parsing every level in one process against parsing the levels
+    in parallel worker processes, which should give the same graph.
+
+    Run from the server directory:
+        python -m benchmarks.bench_parallel_parser
+"""
+import argparse
+import os
+import time
+from src.parser.graph_parser import Parser
+from benchmarks.bench_stairs import staircase_json
+from benchmarks.synthetic import building_graph
+
+
+def linestring_json(nodes, edges):
+    """
+    GeoJSON LineString features of the edges on each floor, edges between
+    floors are left to the parser to make from the staircases
+    """
+    features = []
+    for start, end in edges:
+        start, end = nodes[start], nodes[end]
+        if start.level != end.level:
+            continue
+
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"level": str(int(start.level)), "indoor": "way"},
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[start.lon, start.lat], [end.lon, end.lat]],
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def points_json(polygons):
+    """
+    A GeoJSON PoI in the middle of every room
+    """
+    features = []
+    for polygon in polygons:
+        if "room-name" not in polygon.tags:
+            continue
+
+        lat = (polygon.NE[0] + polygon.SW[0]) / 2
+        lon = (polygon.NE[1] + polygon.SW[1]) / 2
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {
+                    "level": str(int(float(polygon.level))),
+                    "amenity": "desk",
+                },
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--floors", type=int, default=16)
+    arg_parser.add_argument("--corridors", type=int, default=5)
+    arg_parser.add_argument("--length", type=int, default=100)
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = arg_parser.parse_args()
+
+    nodes, edges, polygons = building_graph(args.floors, args.corridors, args.length)
+    layers = (
+        staircase_json(polygons, args.floors),
+        linestring_json(nodes, edges),
+        points_json(polygons),
+    )
+    print(f"Building: {len(nodes)} nodes, {len(polygons)} polygons")
+
+    start = time.perf_counter()
+    serial = Parser("bench", *layers)
+    serial_time = time.perf_counter() - start
+    print(f"Serial: {serial_time:.2f}s")
+
+    start = time.perf_counter()
+    parallel = Parser("bench", *layers, workers=args.workers)
+    parallel_time = time.perf_counter() - start
+    print(
+        f"{args.workers} workers: {parallel_time:.2f}s "
+        f"({serial_time / parallel_time:.1f}x)"
+    )
+
+    assert parallel.nodes == serial.nodes
+    assert parallel.edges == serial.edges
+    assert parallel.pois == serial.pois
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+    Polygon parser benchmark on a synthetic building
+
+    Compares parse_rooms (point in polygon through per level R-trees)
+    against the original in_poly, which scanned every polygon on the
+    level for every node.
+
+    Run from the server directory:
+        python -m benchmarks.bench_parser
+"""
+import argparse
+import copy
+import time
+import shapely.geometry
+from src.parser.polygon_parser import PolygonParser
+from benchmarks.synthetic import building_graph
+
+
+def polygon_json(polygons):
+    """
+    GeoJSON features of polygons, as the map editor exports them
+    """
+    features = []
+    for polygon in polygons:
+        properties = dict(polygon.tags)
+        properties["level"] = str(int(float(polygon.level)))
+        features.append(
+            {
+                "type": "Feature",
+                "properties": properties,
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[[lon, lat] for lat, lon in polygon.vertices]],
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def legacy_parse_rooms(parser, nodes):
+    """
+    parse_rooms as it was before the R-trees were added
+    """
+    geodesy_polygons = [
+        {
+            "id": poly.id,
+            "level": float(poly.level),
+            "polygon": shapely.geometry.Polygon(poly.vertices),
+        }
+        for poly in parser.polygons
+    ]
+
+    def in_poly(node, level):
+        lookup_polys = {}
+        for poly in parser.polygons:
+            lookup_polys[poly.id] = poly
+
+        rooms_on_level = filter(lambda x: x["level"] == level, geodesy_polygons)
+
+        for room in rooms_on_level:
+            if room["polygon"].contains(node):
+                return lookup_polys[room["id"]]
+
+        return None
+
+    for node in nodes:
+        room = in_poly(shapely.geometry.Point(node.lat, node.lon), node.level)
+        if room is not None:
+            node.poly_id = room.id
+
+    return nodes
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--floors", type=int, default=4)
+    arg_parser.add_argument("--corridors", type=int, default=5)
+    arg_parser.add_argument("--length", type=int, default=250)
+    args = arg_parser.parse_args()
+
+    nodes, _, polygons = building_graph(args.floors, args.corridors, args.length)
+    for node in nodes:
+        node.poly_id = -1
+    print(f"Building: {len(nodes)} nodes, {len(polygons)} polygons")
+
+    start = time.perf_counter()
+    parser = PolygonParser("bench", polygon_json(polygons))
+    parser.load_polygons()
+    print(f"load_polygons: {time.perf_counter() - start:.2f}s")
+
+    legacy_nodes = copy.deepcopy(nodes)
+    start = time.perf_counter()
+    legacy_parse_rooms(parser, legacy_nodes)
+    legacy = time.perf_counter() - start
+    print(f"Linear in_poly: {legacy:.2f}s")
+
+    start = time.perf_counter()
+    parsed_nodes = parser.parse_rooms(nodes)
+    current = time.perf_counter() - start
+    print(f"R-tree in_poly: {current:.2f}s ({legacy / current:.0f}x)")
+
+    assert [n.poly_id for n in parsed_nodes] == [n.poly_id for n in legacy_nodes]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+    Router benchmark on a synthetic building
+
+    Compares A* using the router's precomputed node arrays against the
+    original heuristic, which built dataclasses, shapely geometry and a
+    pyproj Geod on every call, the networkx backend against the CSR
+    backend, and both against a contraction hierarchy.
+
+    Run from the server directory:
+        python -m benchmarks.bench_router
+"""
+import argparse
+import dataclasses
+import random
+import time
+import networkx as nx
+import shapely.geometry
+from pyproj import Geod
+from src.path_finding.router import BACKENDS, Router
+from src.types.map_types import PathNode
+from benchmarks.synthetic import building_graph
+
+
+def legacy_heuristic(router: Router):
+    """
+    The heuristic as it was before the node arrays were added
+    """
+    fields = [field.name for field in dataclasses.fields(PathNode)]
+    fields.remove("tags")
+
+    # the flat dicts the router used to store as networkx node attributes
+    flat_nodes = {}
+    for node in router.nodes:
+        flat = {k: v for k, v in dataclasses.asdict(node).items() if k != "tags"}
+        flat.update(node.tags)
+        flat_nodes[node.id] = flat
+
+    def to_node(attributes):
+        kwargs = {field: attributes[field] for field in fields}
+        kwargs["tags"] = {k: attributes[k] for k in fields ^ attributes.keys()}
+        return PathNode(**kwargs)
+
+    def heuristic(n, m):
+        n_node = to_node(flat_nodes[n])
+        m_node = to_node(flat_nodes[m])
+
+        n_lat_lon = shapely.geometry.Point(n_node.lat, n_node.lon)
+        m_lat_lon = shapely.geometry.Point(m_node.lat, m_node.lon)
+
+        line_string = shapely.geometry.LineString([n_lat_lon, m_lat_lon])
+        geod = Geod(ellps="WGS84")
+        weight = geod.geometry_length(line_string)
+
+        try:
+            n_poly = router.lookup_polys[n_node.poly_id]
+            m_poly = router.lookup_polys[m_node.poly_id]
+
+            if n_poly.tags["indoor"] == "room" and m_poly.tags["indoor"] == "room":
+                weight += 10000
+        except KeyError:
+            pass
+
+        return weight
+
+    return heuristic
+
+
+def time_queries(find_path, pairs):
+    """
+    Returns the mean time per query in seconds
+    """
+    start = time.perf_counter()
+    for source, target in pairs:
+        find_path(source, target)
+    return (time.perf_counter() - start) / len(pairs)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--floors", type=int, default=10)
+    arg_parser.add_argument("--corridors", type=int, default=5)
+    arg_parser.add_argument("--length", type=int, default=200)
+    arg_parser.add_argument("--queries", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    nodes, edges, polys = building_graph(args.floors, args.corridors, args.length)
+    print(f"Building: {len(nodes)} nodes, {len(edges)} edges, {len(polys)} polygons")
+
+    routers = {}
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        routers[backend] = Router(nodes, edges, polys, backend=backend)
+        print(
+            f"{backend} router built in {time.perf_counter() - start:.3f}s, "
+            f"~{routers[backend].estimated_size() / 2 ** 20:.1f} MiB"
+        )
+    router = routers["networkx"]
+
+    start = time.perf_counter()
+    routers["hierarchy"] = Router(nodes, edges, polys, backend="csr")
+    routers["hierarchy"].build_hierarchy()
+    print(f"Contraction hierarchy built in {time.perf_counter() - start:.3f}s")
+
+    rng = random.Random(0)
+    pairs = [(rng.choice(nodes).id, rng.choice(nodes).id) for _ in range(args.queries)]
+
+    heuristic = legacy_heuristic(router)
+    legacy = time_queries(
+        lambda s, t: nx.astar_path(router.graph, s, t, heuristic=heuristic), pairs
+    )
+    print(f"Legacy heuristic:  {legacy * 1000:.2f} ms/query")
+
+    for backend, backend_router in routers.items():
+        current = time_queries(backend_router.find_path, pairs)
+        print(
+            f"{backend + ' find_path:':21} {current * 1000:.2f} ms/query "
+            f"({legacy / current:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+    Graph write throughput benchmark, needs a Redis server with RedisGraph
+
+    Compares Controller.save_graph (batched UNWIND queries) against the
+    original approach of building one redisgraph Graph object and
+    committing it as a single CREATE query.
+
+    Run from the server directory:
+        python -m benchmarks.bench_save_graph --host 127.0.0.1
+"""
+import argparse
+import asyncio
+import dataclasses
+import time
+from redisgraph import Edge, Graph, Node
+from src.database.controller import Controller
+from benchmarks.synthetic import building_graph
+
+
+def flat_properties(node):
+    """Node properties as they are stored in RedisGraph"""
+    properties = {k: v for k, v in dataclasses.asdict(node).items() if k != "tags"}
+    properties.update(node.tags)
+    return {k: "" if v is None else v for k, v in properties.items()}
+
+
+def legacy_save_graph(redis_db, graph_name, nodes, edges):
+    """
+    save_graph as it was before batching
+    """
+    graph = Graph(graph_name, redis_db)
+    lookup_nodes = {node.id: node for node in nodes}
+
+    for node_ids in edges:
+        node_objs = []
+        node_label = "node"
+        for node_id in node_ids:
+            node = lookup_nodes[node_id]
+            if "indoor" in node.tags:
+                node_label = node.tags["indoor"]
+
+            node_alias = "n" + str(node_id)
+            if node_alias not in graph.nodes:
+                node_obj = Node(
+                    label=node_label,
+                    properties=flat_properties(node),
+                    alias=node_alias,
+                )
+                graph.add_node(node_obj)
+            node_objs.append(graph.nodes[node_alias])
+
+        graph.add_edge(Edge(node_objs[0], node_label, node_objs[1]))
+
+    graph.commit()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", default="6379")
+    arg_parser.add_argument("--floors", type=int, default=10)
+    arg_parser.add_argument("--corridors", type=int, default=10)
+    arg_parser.add_argument("--length", type=int, default=500)
+    arg_parser.add_argument(
+        "--skip-legacy",
+        action="store_true",
+        help="the single query can exceed server limits on big maps",
+    )
+    args = arg_parser.parse_args()
+
+    nodes, edges, _ = building_graph(args.floors, args.corridors, args.length)
+    print(f"Building: {len(nodes)} nodes, {len(edges)} edges")
+
+    db = Controller(host=args.host, port=args.port)
+
+    if not args.skip_legacy:
+        db.redis_db.delete("bench_legacy")
+        start = time.perf_counter()
+        legacy_save_graph(db.redis_db, "bench_legacy", nodes, edges)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Single commit: {elapsed:.2f}s "
+            f"({len(nodes) / elapsed:.0f} nodes/s, {len(edges) / elapsed:.0f} edges/s)"
+        )
+        db.redis_db.delete("bench_legacy")
+
+    start = time.perf_counter()
+    asyncio.run(db.save_graph("bench_bulk", nodes, edges))
+    elapsed = time.perf_counter() - start
+    print(
+        f"Batched UNWIND: {elapsed:.2f}s "
+        f"({len(nodes) / elapsed:.0f} nodes/s, {len(edges) / elapsed:.0f} edges/s)"
+    )
+    db.redis_db.delete("bench_bulk")
+
+
+if __name__ == "__main__":
+    main()
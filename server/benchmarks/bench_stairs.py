@@ -0,0 +1,122 @@
+"""
+    Stairway connection benchmark on a tall synthetic building
+
+    Compares connect_stairways (nodes grouped by room and level once)
+    against the original, which searched every polygon for every path node
+    and rebuilt its staircase's edges once per node on it.
+
+    Run from the server directory:
+        python -m benchmarks.bench_stairs
+"""
+import argparse
+import time
+from src.parser.polygon_parser import PolygonParser
+from benchmarks.bench_parser import polygon_json
+from benchmarks.synthetic import building_graph
+
+
+def staircase_json(polygons, floors):
+    """
+    GeoJSON features of a building, each staircase one feature spanning
+    every floor as the map editor exports them
+    """
+    json_polygons = polygon_json([p for p in polygons if "stairs" not in p.tags])
+
+    staircases = {}
+    for polygon in polygons:
+        if "stairs" in polygon.tags:
+            staircases.setdefault(polygon.id, polygon)
+
+    for staircase in polygon_json(list(staircases.values()))["features"]:
+        staircase["properties"]["level"] = f"0;{floors}"
+        json_polygons["features"].append(staircase)
+
+    return json_polygons
+
+
+def legacy_connect_stairways(parser, nodes):
+    """
+    connect_stairways as it was before nodes were grouped
+    """
+
+    def nodes_between_adj_levels(nodes):
+        levels = sorted({n.level for n in nodes})
+        edges = []
+
+        for node in nodes:
+            level_index = levels.index(node.level)
+
+            above_nodes = below_nodes = []
+            if level_index - 1 > 0:
+                below = levels[level_index - 1]
+                below_nodes = filter(lambda n, b=below: n.level == b, nodes)
+
+            if level_index + 1 < len(levels):
+                above = levels[level_index + 1]
+                above_nodes = filter(lambda n, a=above: n.level == a, nodes)
+
+            for adj in list(above_nodes) + list(below_nodes):
+                edges.append((node.id, adj.id))
+
+            nodes.remove(node)
+
+        return edges
+
+    geodesy_polygons = [{"id": poly.id, "tags": poly.tags} for poly in parser.polygons]
+    total_edges = []
+    way_nodes = list(filter(lambda n: n.tags["indoor"] == "way", nodes))
+
+    for node in way_nodes:
+        room = None
+        for poly in geodesy_polygons:
+            if poly["id"] == node.poly_id:
+                room = poly
+                break
+
+        if room is None or "stairs" not in room["tags"]:
+            continue
+
+        same_room = list(
+            filter(lambda n, node=node: node.poly_id == n.poly_id, way_nodes)
+        )
+        total_edges += nodes_between_adj_levels(same_room)
+
+    return total_edges
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--floors", type=int, default=100)
+    arg_parser.add_argument("--corridors", type=int, default=5)
+    arg_parser.add_argument("--length", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    nodes, edges, polygons = building_graph(args.floors, args.corridors, args.length)
+    print(f"Building: {len(nodes)} nodes, {len(polygons)} polygons")
+
+    parser = PolygonParser("bench", staircase_json(polygons, args.floors))
+    parser.load_polygons()
+    nodes = parser.parse_rooms(nodes)
+
+    start = time.perf_counter()
+    legacy_edges = legacy_connect_stairways(parser, nodes)
+    legacy = time.perf_counter() - start
+    print(f"Per node connect_stairways: {legacy:.2f}s, {len(legacy_edges)} edges")
+
+    start = time.perf_counter()
+    stair_edges = parser.connect_stairways(nodes)
+    current = time.perf_counter() - start
+    print(
+        f"Grouped connect_stairways: {current:.2f}s, {len(stair_edges)} edges "
+        f"({legacy / current:.0f}x)"
+    )
+
+    # one edge per pair of stair nodes on neighbouring floors
+    stair_ids = {n.id for n in nodes if "stairs" in parser.polygons[n.poly_id].tags}
+    expected = {frozenset(e) for e in edges if set(e) <= stair_ids}
+    assert len(stair_edges) == len(expected)
+    assert {frozenset(e) for e in stair_edges} == expected
+
+
+if __name__ == "__main__":
+    main()
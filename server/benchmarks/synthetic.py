@@ -0,0 +1,153 @@
+"""
+    Synthetic buildings for benchmarks
+
+    Every floor is a set of parallel corridors joined at both ends, with a
+    room off every corridor node and a staircase at the start of every
+    corridor connecting it to the floors above and below.
+"""
+import math
+from itertools import count
+from typing import List, Tuple
+from src.types.map_types import PathNode, Polygon
+
+ORIGIN = (53.809, -1.554)
+# metres between neighbouring corridor nodes
+SPACING = 2.0
+# metres between parallel corridors
+CORRIDOR_GAP = 10.0
+
+METRES_PER_DEGREE_LAT = 111320.0
+METRES_PER_DEGREE_LON = METRES_PER_DEGREE_LAT * math.cos(math.radians(ORIGIN[0]))
+
+
+def offset(north: float, east: float) -> Tuple[float, float]:
+    """
+    lat, lon of a point some metres north and east of the origin
+    """
+    return (
+        ORIGIN[0] + north / METRES_PER_DEGREE_LAT,
+        ORIGIN[1] + east / METRES_PER_DEGREE_LON,
+    )
+
+
+def rectangle(north: float, east: float, height: float, width: float):
+    """
+    Closed list of (lat, lon) vertices for a rectangle with its south west
+    corner at north, east
+    """
+    corners = [
+        offset(north, east),
+        offset(north + height, east),
+        offset(north + height, east + width),
+        offset(north, east + width),
+    ]
+    return corners + [corners[0]]
+
+
+def building_graph(
+    floors: int = 10, corridors: int = 5, length: int = 200, graph: str = "bench"
+) -> Tuple[List[PathNode], List[Tuple[int, int]], List[Polygon]]:
+    """
+    Generate the path nodes, edges and polygons of a building
+
+    Args:
+        floors (int): number of floors
+        corridors (int): number of parallel corridors on each floor
+        length (int): number of nodes along each corridor
+
+    Returns:
+        nodes, edges and polygons, ready to be given to a Router
+    """
+    nodes = []
+    edges = []
+    polygons = []
+    poly_ids = count()
+
+    def add_polygon(level, vertices, tags, poly_id=None):
+        # polygons spanning several floors share an ID, as in the parser
+        if poly_id is None:
+            poly_id = next(poly_ids)
+        lats = [lat for lat, _ in vertices]
+        lons = [lon for _, lon in vertices]
+        polygons.append(
+            Polygon(
+                poly_id,
+                graph,
+                level,
+                vertices,
+                (max(lats), max(lons)),
+                (min(lats), min(lons)),
+                tags,
+            )
+        )
+        return polygons[-1].id
+
+    def add_node(level, north, east, poly_id):
+        lat, lon = offset(north, east)
+        nodes.append(
+            PathNode(len(nodes), graph, level, lat, lon, poly_id, {"indoor": "way"})
+        )
+        return nodes[-1].id
+
+    # stair nodes per corridor index, per floor
+    stairs = []
+    stair_polys = [None] * corridors
+
+    for floor in range(floors):
+        level = float(floor)
+        floor_stairs = []
+        corridor_ends = []
+
+        for corridor in range(corridors):
+            north = corridor * CORRIDOR_GAP
+            corridor_poly = add_polygon(
+                level,
+                rectangle(north - 1, 0, 2, length * SPACING),
+                {"indoor": "corridor"},
+            )
+
+            prev_id = None
+            first_id = None
+            for step in range(length):
+                east = step * SPACING
+                node_id = add_node(level, north, east, corridor_poly)
+                if prev_id is not None:
+                    edges.append((prev_id, node_id))
+                else:
+                    first_id = node_id
+                prev_id = node_id
+
+                # a room to the north of every corridor node
+                room_poly = add_polygon(
+                    level,
+                    rectangle(north + 1, east - 1, 4, SPACING),
+                    {"indoor": "room", "room-name": f"{floor}.{corridor}.{step}"},
+                )
+                room_id = add_node(level, north + 2, east, room_poly)
+                edges.append((node_id, room_id))
+
+            corridor_ends.append((first_id, prev_id))
+
+            stair_polys[corridor] = add_polygon(
+                level,
+                rectangle(north - 1, -4, 2, 4),
+                {"indoor": "room", "stairs": "yes"},
+                stair_polys[corridor],
+            )
+            stair_id = add_node(level, north, -2, stair_polys[corridor])
+            edges.append((stair_id, first_id))
+            floor_stairs.append(stair_id)
+
+        # join the corridors together at both ends
+        for (first, last), (next_first, next_last) in zip(
+            corridor_ends, corridor_ends[1:]
+        ):
+            edges.append((first, next_first))
+            edges.append((last, next_last))
+
+        stairs.append(floor_stairs)
+
+    for below, above in zip(stairs, stairs[1:]):
+        edges += list(zip(below, above))
+
+    return nodes, edges, polygons
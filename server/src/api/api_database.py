@@ -1,6 +1,28 @@
 """
-    Simple config file to share DB connection in type files
+    Simple config file to share DB connection and caches in type files
 """
+import os
+from concurrent.futures import ProcessPoolExecutor
 from src.database.controller import Controller
+from src.api.graph_cache import GraphCache
+from src.api.locator import BuildingLocator
+
+# Memory budget for built routers kept between route requests
+ROUTER_CACHE_BYTES = 256 * 1024 * 1024
+# Memory budget for spatial indices used by bounding box queries
+SPATIAL_CACHE_BYTES = 128 * 1024 * 1024
+# Graph representation used for routing, "networkx" or "csr"
+ROUTER_BACKEND = os.environ.get("ROUTER_BACKEND", "networkx")
+# Worker processes parsing maps for add_graph, so parsing doesn't block
+# the event loop
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "2"))
 
 db = Controller(host="redis")
+router_cache = GraphCache(ROUTER_CACHE_BYTES, size_of=lambda r: r.estimated_size())
+spatial_cache = GraphCache(
+    SPATIAL_CACHE_BYTES, size_of=lambda index: index.estimated_size()
+)
+# footprints of every graph, loaded from the database on first use
+locator = BuildingLocator()
+# maps are parsed in these processes, workers are started on first use
+parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
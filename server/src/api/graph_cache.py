@@ -0,0 +1,125 @@
+"""
+    In-process cache for objects that are expensive to build from a graph
+    (e.g. routers), keyed by graph name
+"""
+import logging
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+
+class GraphCache:
+    """
+    Least-recently-used cache keyed by graph name, bounded by an estimated
+    memory budget rather than an entry count (one building can be much
+    bigger than another)
+    """
+
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int] = sys.getsizeof):
+        """
+        Args:
+            max_bytes (int): memory budget for everything in the cache
+            size_of (Callable): returns the estimated size of a cached value
+                                in bytes
+        """
+        self.log = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.current_bytes = 0
+
+        # graph name -> (value, size), ordered least to most recently used
+        self.__entries = OrderedDict()
+        # graph name -> number of times it has been invalidated, used to
+        # stop a value built from stale data being cached after invalidation
+        self.__generations = {}
+        # bumped by clear(), invalidates every graph at once
+        self.__epoch = 0
+
+    def __contains__(self, graph_name: str) -> bool:
+        return graph_name in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def generation(self, graph_name: str) -> Tuple[int, int]:
+        """
+        Returns the current generation of a graph, pass this to `put` when
+        the value was built from data loaded after calling this
+        """
+        return (self.__epoch, self.__generations.get(graph_name, 0))
+
+    def get(self, graph_name: str) -> Optional[Any]:
+        """
+        Returns the cached value for a graph or None, marks it as recently
+        used
+        """
+        if graph_name not in self.__entries:
+            return None
+
+        self.__entries.move_to_end(graph_name)
+        return self.__entries[graph_name][0]
+
+    def put(
+        self,
+        graph_name: str,
+        value: Any,
+        generation: Optional[Tuple[int, int]] = None,
+    ) -> bool:
+        """
+        Cache a value for a graph, evicting least recently used graphs until
+        it fits in the memory budget
+
+        Args:
+            graph_name (str): graph the value was built from
+            value (Any): value to cache
+            generation (tuple): generation of the graph when its data was
+                                loaded, if the graph has been invalidated
+                                since then the value is not cached
+
+        Returns:
+            True if the value was cached
+        """
+        if generation is not None and generation != self.generation(graph_name):
+            self.log.debug("Not caching %s, invalidated while building", graph_name)
+            return False
+
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            self.log.warning(
+                "Not caching %s, %d bytes is over the budget of %d",
+                graph_name,
+                size,
+                self.max_bytes,
+            )
+            return False
+
+        self.__remove(graph_name)
+
+        while self.current_bytes + size > self.max_bytes:
+            evicted, (_, evicted_size) = self.__entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.log.debug("Evicted %s from cache", evicted)
+
+        self.__entries[graph_name] = (value, size)
+        self.current_bytes += size
+        return True
+
+    def invalidate(self, graph_name: str) -> None:
+        """
+        Drop a graph from the cache, call whenever the graph is rewritten
+        """
+        self.__generations[graph_name] = self.__generations.get(graph_name, 0) + 1
+        self.__remove(graph_name)
+
+    def clear(self) -> None:
+        """
+        Drop everything from the cache
+        """
+        self.__epoch += 1
+        self.__entries.clear()
+        self.current_bytes = 0
+
+    def __remove(self, graph_name: str) -> None:
+        if graph_name in self.__entries:
+            _, size = self.__entries.pop(graph_name)
+            self.current_bytes -= size
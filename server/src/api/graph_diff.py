@@ -0,0 +1,214 @@
+"""
+    Differences between two versions of a graph
+
+    Used to update a stored graph when its map changes, only rebuilding
+    and invalidating what the changes affect. Parsed IDs follow the order
+    of the map's features, so they're first carried over from the old
+    version by geometry (stable_ids), then everything is matched by ID.
+"""
+import dataclasses
+from collections import Counter
+import itertools
+from typing import Callable, Dict, List, Set, Tuple
+from src.types.map_types import PathNode, PoI, Polygon
+
+
+@dataclasses.dataclass
+class GraphDiff:
+    """
+    Changes turning one version of a graph into another, removed lists
+    hold the old versions of removed or changed items and added lists the
+    new versions of added or changed ones
+    """
+
+    removed_nodes: List[PathNode] = dataclasses.field(default_factory=list)
+    added_nodes: List[PathNode] = dataclasses.field(default_factory=list)
+    # node ID pairs whose edges are deleted, only between unchanged nodes
+    # as the edges of removed nodes are deleted with them
+    removed_edges: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+    # edges created, repeated for parallel edges
+    added_edges: List[Tuple[int, int]] = dataclasses.field(default_factory=list)
+    removed_polygons: List[Polygon] = dataclasses.field(default_factory=list)
+    added_polygons: List[Polygon] = dataclasses.field(default_factory=list)
+    removed_pois: List[PoI] = dataclasses.field(default_factory=list)
+    added_pois: List[PoI] = dataclasses.field(default_factory=list)
+    # levels with anything changed on them
+    levels: Set[float] = dataclasses.field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return self.routing_changed or bool(self.removed_pois or self.added_pois)
+
+    @property
+    def routing_changed(self) -> bool:
+        """
+        Whether routes may have changed, routers are built from the nodes,
+        edges and polygons
+        """
+        return bool(
+            self.removed_nodes
+            or self.added_nodes
+            or self.removed_edges
+            or self.added_edges
+            or self.removed_polygons
+            or self.added_polygons
+        )
+
+
+def diff_entries(old: list, new: list) -> Tuple[list, list]:
+    """
+    Entries removed or changed and entries added or changed, by ID
+
+    Polygons on many levels are one entry per level with the same ID, if
+    any of them changed all of them are returned
+    """
+    old_by_id = {}
+    for entry in old:
+        old_by_id.setdefault(entry.id, []).append(entry)
+    new_by_id = {}
+    for entry in new:
+        new_by_id.setdefault(entry.id, []).append(entry)
+
+    removed = [
+        entry
+        for entry_id, entries in old_by_id.items()
+        if new_by_id.get(entry_id) != entries
+        for entry in entries
+    ]
+    added = [
+        entry
+        for entry_id, entries in new_by_id.items()
+        if old_by_id.get(entry_id) != entries
+        for entry in entries
+    ]
+    return removed, added
+
+
+def diff_graph(old: tuple, new: tuple) -> GraphDiff:
+    """
+    Changes turning an old version of a graph into a new one
+
+    Args:
+        old (tuple): nodes, edges, polygons and PoIs of the old version
+        new (tuple): nodes, edges, polygons and PoIs of the new version
+    """
+    old_nodes, old_edges, old_polygons, old_pois = old
+    new_nodes, new_edges, new_polygons, new_pois = new
+
+    diff = GraphDiff()
+    diff.removed_nodes, diff.added_nodes = diff_entries(old_nodes, new_nodes)
+    diff.removed_polygons, diff.added_polygons = diff_entries(
+        old_polygons, new_polygons
+    )
+    diff.removed_pois, diff.added_pois = diff_entries(old_pois, new_pois)
+
+    # edges of deleted nodes go with them, so every edge of a changed node
+    # is created again
+    recreated = {node.id for node in diff.removed_nodes}
+    old_counts = Counter(old_edges)
+    new_counts = Counter(new_edges)
+
+    for edge, count in new_counts.items():
+        if edge[0] in recreated or edge[1] in recreated:
+            diff.added_edges += [edge] * count
+        elif old_counts[edge] != count:
+            # parallel edges are all deleted and created again
+            if old_counts[edge]:
+                diff.removed_edges.append(edge)
+            diff.added_edges += [edge] * count
+
+    for edge in old_counts:
+        if edge[0] in recreated or edge[1] in recreated:
+            continue
+        if edge not in new_counts:
+            diff.removed_edges.append(edge)
+
+    changed = diff.removed_nodes + diff.added_nodes
+    changed += diff.removed_polygons + diff.added_polygons
+    changed += diff.removed_pois + diff.added_pois
+    diff.levels = {float(entry.level) for entry in changed}
+
+    node_levels = {node.id: float(node.level) for node in old_nodes + new_nodes}
+    for edge in diff.removed_edges + diff.added_edges:
+        diff.levels.update(node_levels[node_id] for node_id in edge)
+
+    return diff
+
+
+def carry_ids(old: list, new: list, key: Callable, next_id: int) -> Dict[int, int]:
+    """
+    Give new entries the IDs of old entries with the same key, and fresh
+    IDs from next_id to the rest. Entries with the same ID (a polygon on
+    many levels) are keyed by their first entry
+
+    Returns:
+        the ID each new ID is changed to
+    """
+    old_ids = {}
+    for entry in old:
+        old_ids.setdefault(key(entry), entry.id)
+
+    taken = set()
+    fresh = itertools.count(next_id)
+    ids = {}
+    for entry in new:
+        if entry.id in ids:
+            continue
+        old_id = old_ids.get(key(entry))
+        if old_id is not None and old_id not in taken:
+            taken.add(old_id)
+            ids[entry.id] = old_id
+        else:
+            ids[entry.id] = next(fresh)
+
+    for entry in new:
+        entry.id = ids[entry.id]
+    return ids
+
+
+def stable_ids(old: tuple, new: tuple) -> tuple:
+    """
+    Change the IDs of a newly parsed version of a graph to those of the
+    same nodes, polygons and PoIs in the old version (at the same place),
+    so adding a feature doesn't change the IDs of every feature after it
+
+    Args:
+        old (tuple): nodes, edges, polygons and PoIs of the old version
+        new (tuple): nodes, edges, polygons and PoIs of the new version,
+            their IDs are changed
+
+    Returns:
+        the new version with its edges changed to match
+    """
+    old_nodes, _, old_polygons, old_pois = old
+    new_nodes, new_edges, new_polygons, new_pois = new
+
+    def next_id(entries):
+        return max((entry.id for entry in entries), default=-1) + 1
+
+    polygon_ids = carry_ids(
+        old_polygons,
+        new_polygons,
+        lambda p: (str(p.level), tuple(tuple(vertex) for vertex in p.vertices)),
+        next_id(old_polygons),
+    )
+    node_ids = carry_ids(
+        old_nodes,
+        new_nodes,
+        lambda n: (n.lat, n.lon, float(n.level)),
+        next_id(old_nodes),
+    )
+    carry_ids(
+        old_pois,
+        new_pois,
+        lambda p: (p.lat, p.lon, float(p.level)),
+        next_id(old_pois),
+    )
+
+    for node in new_nodes:
+        node.poly_id = polygon_ids.get(node.poly_id, node.poly_id)
+    for poi in new_pois:
+        if poi.nearest_path_node is not None:
+            poi.nearest_path_node = node_ids[poi.nearest_path_node]
+    edges = [(node_ids[start], node_ids[end]) for start, end in new_edges]
+
+    return new_nodes, edges, new_polygons, new_pois
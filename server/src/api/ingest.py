@@ -0,0 +1,192 @@
+"""
+    Map parsing for add_graph and update_graph, run in worker processes
+
+    Parsing a map, building its routing hierarchy and encoding its snapshot
+    is CPU bound shapely and networkx work, which would stop the event loop
+    serving every other request for as long as it takes. These functions
+    are given to a process pool instead and return everything that needs
+    saving, so only the (I/O bound) saving is left to the server process.
+
+    This module shouldn't import the API database, as worker processes
+    import it to run the functions.
+"""
+import dataclasses
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+from src.api.graph_diff import GraphDiff, diff_graph, stable_ids
+from src.api.locator import building_footprint
+from src.api.snapshot import build_snapshot, read_snapshot
+from src.parser.geojson_stream import iter_feature_file
+from src.parser.graph_parser import Parser
+from src.path_finding.contraction import ContractionHierarchy
+from src.path_finding.preprocess import build_hierarchy
+from src.types.map_types import PathNode, PoI, Polygon
+
+# Processes the levels of a map are parsed in, started by each process
+# parsing a map, by default the cores are shared between the parse workers
+# so parsing doesn't slow down queries
+LEVEL_WORKERS = int(
+    os.environ.get(
+        "PARSE_LEVEL_WORKERS",
+        str(max(1, (os.cpu_count() or 1) // int(os.environ.get("PARSE_WORKERS", "2")))),
+    )
+)
+
+# Status of an import job, in the order they happen (or failed)
+JOB_PARSING = "parsing"
+JOB_SAVING = "saving"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+@dataclasses.dataclass
+class ParsedGraph:
+    """
+    A parsed map, ready to be saved
+    """
+
+    graph: str
+    nodes: List[PathNode]
+    edges: List[Tuple[int, int]]
+    polygons: List[Polygon]
+    pois: List[PoI]
+    # None if the graph is an update that didn't change routing
+    hierarchy: Optional[ContractionHierarchy]
+    snapshot: bytes
+    etag: str
+    footprint: List[Tuple[float, float]]
+
+
+def job_record(fields: Dict[str, str]) -> dict:
+    """
+    Import job as returned by the API, from the fields stored for it
+    """
+    return {
+        "id": fields["id"],
+        "graph": fields["graph"],
+        "status": fields["status"],
+        "error": fields.get("error") or None,
+        "created": float(fields["created"]),
+        "updated": float(fields["updated"]),
+    }
+
+
+def parse_layers(graph: str, polygons, linestring, points) -> ParsedGraph:
+    """
+    Parse a map given as GeoJSON FeatureCollections, or iterables of their
+    features, and build everything saved with it
+    """
+    parsed = Parser(graph, polygons, linestring, points, workers=LEVEL_WORKERS)
+    logging.getLogger(__name__).info("Graph parsed for %s", graph)
+    return prepare_graph(graph, parsed)
+
+
+def prepare_graph(graph: str, parsed: Parser, hierarchy: bool = True) -> ParsedGraph:
+    """
+    Build everything saved with a parsed map
+
+    Args:
+        hierarchy (bool): whether to build the routing hierarchy
+    """
+    log = logging.getLogger(__name__)
+
+    routing = None
+    if hierarchy:
+        routing = build_hierarchy(parsed.nodes, parsed.edges, parsed.polygons)
+        log.info("Routing hierarchy built for %s", graph)
+
+    blob, etag = build_snapshot(
+        graph, parsed.nodes, parsed.edges, parsed.polygons, parsed.pois
+    )
+    log.info("Snapshot built for %s (%d bytes)", graph, len(blob))
+
+    return ParsedGraph(
+        graph,
+        parsed.nodes,
+        parsed.edges,
+        parsed.polygons,
+        parsed.pois,
+        routing,
+        blob,
+        etag,
+        building_footprint(parsed.polygons),
+    )
+
+
+def parse_json(graph: str, polygons: str, linestring: str, points: str) -> ParsedGraph:
+    """
+    Parse a map given as the (escaped) JSON strings add_graph receives
+
+    Raises:
+        ValueError or KeyError if the map can't be parsed
+    """
+    layers = [
+        json.loads(layer.encode("utf-8").decode("unicode-escape"))
+        for layer in (polygons, linestring, points)
+    ]
+    return parse_layers(graph, *layers)
+
+
+def parse_files(graph: str, paths: Dict[str, str]) -> ParsedGraph:
+    """
+    Parse a map from GeoJSON files, streaming their features
+
+    Args:
+        graph (str): name of the graph
+        paths (Dict[str, str]): path of the "polygons", "linestring" and
+            "points" layers
+
+    Raises:
+        ValueError or KeyError if the map can't be parsed
+    """
+    return parse_layers(
+        graph,
+        iter_feature_file(paths["polygons"]),
+        iter_feature_file(paths["linestring"]),
+        iter_feature_file(paths["points"]),
+    )
+
+
+def update_files(
+    graph: str, paths: Dict[str, str], snapshot: bytes
+) -> Tuple[ParsedGraph, GraphDiff]:
+    """
+    Parse a new version of a map from GeoJSON files and diff it against
+    the snapshot of the saved version
+
+    Nodes, polygons and PoIs keep the IDs they had in the saved version,
+    and the routing hierarchy is only rebuilt if routing changed.
+
+    Args:
+        graph (str): name of the graph
+        paths (Dict[str, str]): path of the "polygons", "linestring" and
+            "points" layers
+        snapshot (bytes): encoded snapshot of the saved version
+
+    Raises:
+        ValueError or KeyError if the map can't be parsed
+    """
+    log = logging.getLogger(__name__)
+
+    parsed = Parser(
+        graph,
+        iter_feature_file(paths["polygons"]),
+        iter_feature_file(paths["linestring"]),
+        iter_feature_file(paths["points"]),
+        workers=LEVEL_WORKERS,
+    )
+    old = read_snapshot(snapshot)
+    new = stable_ids(old, (parsed.nodes, parsed.edges, parsed.polygons, parsed.pois))
+    parsed.edges = new[1]
+    diff = diff_graph(old, new)
+    log.info("Update of %s parsed, %d levels changed", graph, len(diff.levels))
+    return prepare_graph(graph, parsed, hierarchy=diff.routing_changed), diff
+
+
+def snapshot_footprint(snapshot: bytes) -> List[Tuple[float, float]]:
+    """
+    Footprint of the graph an encoded snapshot is of
+    """
+    return building_footprint(read_snapshot(snapshot)[2])
@@ -0,0 +1,126 @@
+"""
+    Per request batching loaders
+
+    Resolvers for fields of every item in a list (e.g. the polygon of every
+    node) each ask a loader for one key, the loader collects the keys asked
+    for while the resolvers run and fetches them all with one batch call.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+from src.types.map_types import Polygon
+
+
+class DataLoader:
+    """
+    Batches and caches loads of keys for the lifetime of one request
+    """
+
+    def __init__(self, batch_load: Callable[[List[Hashable]], Awaitable[List[Any]]]):
+        """
+        Args:
+            batch_load (Callable): coroutine function taking a list of
+                unique keys and returning their values in the same order
+        """
+        self.batch_load = batch_load
+        self.cache: Dict[Hashable, asyncio.Future] = {}
+        self.queue: List[Hashable] = []
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        """
+        Future value of a key, keys loaded in the same iteration of the
+        event loop are fetched together
+        """
+        if key in self.cache:
+            return self.cache[key]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.cache[key] = future
+
+        # dispatch once every resolver already scheduled has asked for keys
+        if not self.queue:
+            loop.call_soon(self.__dispatch)
+        self.queue.append(key)
+
+        return future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        """
+        Values of several keys
+        """
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value already fetched by something else
+        """
+        if key not in self.cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self.cache[key] = future
+
+    def __dispatch(self) -> None:
+        keys, self.queue = self.queue, []
+        asyncio.ensure_future(self.__load_batch(keys))
+
+    async def __load_batch(self, keys: List[Hashable]) -> None:
+        try:
+            values = await self.batch_load(keys)
+        except Exception as error:  # pylint: disable=broad-except
+            # every resolver waiting on the batch gets the error, and the
+            # keys can be tried again
+            for key in keys:
+                self.cache.pop(key).set_exception(error)
+            return
+
+        for key, value in zip(keys, values):
+            self.cache[key].set_result(value)
+
+
+async def load_by_graph(
+    keys: List[Tuple[str, Hashable]],
+    load: Callable[[str, List[Hashable]], Awaitable[List[Any]]],
+) -> List[Any]:
+    """
+    Batch load (graph, id) keys with one load(graph, ids) call per graph
+
+    Returns:
+        values in the same order as the keys
+    """
+    graph_ids = {}
+    for graph, key_id in keys:
+        graph_ids.setdefault(graph, []).append(key_id)
+
+    graphs = list(graph_ids)
+    results = await asyncio.gather(*[load(graph, graph_ids[graph]) for graph in graphs])
+
+    values = {}
+    for graph, graph_values in zip(graphs, results):
+        for key_id, value in zip(graph_ids[graph], graph_values):
+            values[(graph, key_id)] = value
+
+    return [values[key] for key in keys]
+
+
+class Loaders:
+    """
+    The loaders for one request, every key is a (graph, id) tuple
+    """
+
+    def __init__(self, controller):
+        """
+        Args:
+            controller (Controller): database to load from
+        """
+        self.polygons = DataLoader(
+            lambda keys: load_by_graph(
+                keys,
+                lambda graph, ids: controller.load_entries_by_ids(graph, ids, Polygon),
+            )
+        )
+        self.nodes = DataLoader(
+            lambda keys: load_by_graph(keys, controller.get_nodes_by_ids)
+        )
+        self.neighbours = DataLoader(
+            lambda keys: load_by_graph(keys, controller.get_neighbours_of_nodes)
+        )
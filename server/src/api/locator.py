@@ -0,0 +1,148 @@
+"""
+    Find which building (graph) a point is in
+
+    Every graph has a footprint, the convex hull of its polygons, and the
+    footprints are kept in an R-tree so a lookup only tests the few
+    buildings whose bounding boxes contain the point.
+"""
+from typing import Dict, List, Optional, Tuple
+import shapely.geometry
+from shapely.strtree import STRtree
+from src.types.map_types import Polygon
+
+
+def building_footprint(polygons: List[Polygon]) -> List[Tuple[float, float]]:
+    """
+    (lat, lon) vertices of the convex hull of a building's polygons
+    """
+    vertices = [vertex for polygon in polygons for vertex in polygon.vertices]
+    hull = shapely.geometry.MultiPoint(vertices).convex_hull
+    if hull.is_empty:
+        return []
+
+    if isinstance(hull, shapely.geometry.Polygon):
+        return list(hull.exterior.coords)
+    # a line or point, when there aren't enough vertices for an area
+    return list(hull.coords)
+
+
+class BuildingLocator:
+    """
+    Spatial index of building footprints
+    """
+
+    def __init__(self):
+        # graph name -> footprint geometry
+        self.footprints: Dict[str, shapely.geometry.base.BaseGeometry] = {}
+        # whether the footprints have been loaded from the database, and the
+        # version of the database's footprints they were loaded at
+        self.loaded = False
+        self.version: Optional[int] = None
+        # count of adds and removes, and the count at each graph's last one
+        self.edits = 0
+        self.__edited: Dict[str, int] = {}
+        self.__graphs: List[str] = []
+        self.__tree: Optional[STRtree] = None
+
+    def __len__(self) -> int:
+        return len(self.footprints)
+
+    def load(
+        self,
+        footprints: Dict[str, List[Tuple[float, float]]],
+        version: Optional[int] = None,
+        since: Optional[int] = None,
+    ) -> None:
+        """
+        Replace the footprints with those of many graphs (e.g. everything in
+        the database)
+
+        Args:
+            footprints (Dict): graph name -> (lat, lon) outline
+            version (int): version of the database's footprints loaded
+            since (int): edits before the footprints were loaded, graphs
+                added or removed since are newer than the loaded copy and
+                kept as they are
+        """
+        if since is None:
+            since = self.edits
+
+        def stale(graph):
+            return self.__edited.get(graph, 0) <= since
+
+        for graph in list(self.footprints):
+            if graph not in footprints and stale(graph):
+                self.__discard(graph)
+        for graph, vertices in footprints.items():
+            if stale(graph):
+                self.__set(graph, vertices)
+
+        self.version = version
+        self.loaded = True
+
+    def add(self, graph: str, vertices: List[Tuple[float, float]]) -> None:
+        """
+        Add or replace the footprint of a graph
+        """
+        self.__record(graph)
+        self.__set(graph, vertices)
+
+    def remove(self, graph: str) -> None:
+        """
+        Remove the footprint of a graph
+        """
+        self.__record(graph)
+        self.__discard(graph)
+
+    def __record(self, graph: str) -> None:
+        self.edits += 1
+        self.__edited[graph] = self.edits
+
+    def __set(self, graph: str, vertices: List[Tuple[float, float]]) -> None:
+        if len(vertices) == 0:
+            self.__discard(graph)
+            return
+
+        if len(vertices) == 1:
+            footprint = shapely.geometry.Point(vertices[0])
+        elif len(vertices) < 4:
+            footprint = shapely.geometry.LineString(vertices)
+        else:
+            footprint = shapely.geometry.Polygon(vertices)
+
+        self.footprints[graph] = footprint
+        # the tree can't be changed, it's rebuilt on the next lookup
+        self.__tree = None
+
+    def __discard(self, graph: str) -> None:
+        if self.footprints.pop(graph, None) is not None:
+            self.__tree = None
+
+    def clear(self) -> None:
+        """
+        Remove every footprint
+        """
+        self.footprints.clear()
+        self.__edited.clear()
+        self.loaded = False
+        self.version = None
+        self.__tree = None
+
+    def locate(self, lat: float, lon: float) -> Optional[str]:
+        """
+        Name of the graph a point is in, the smallest if the point is in
+        more than one, or None
+        """
+        if self.__tree is None:
+            self.__graphs = list(self.footprints)
+            self.__tree = STRtree([self.footprints[g] for g in self.__graphs])
+
+        point = shapely.geometry.Point(lat, lon)
+        matches = [
+            self.__graphs[index]
+            for index in self.__tree.query(point, predicate="intersects")
+        ]
+        if not matches:
+            return None
+
+        return min(matches, key=lambda graph: (self.footprints[graph].area, graph))
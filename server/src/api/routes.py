@@ -0,0 +1,40 @@
+"""
+    Plain HTTP routes served alongside the GraphQL API
+"""
+import gzip
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from src.api.api_database import db
+from src.api.snapshot import accepts_gzip, etag_matches, identity_etag
+
+
+async def snapshot_endpoint(request: Request) -> Response:
+    """
+    Serve the map snapshot of a graph, gzipped if the client accepts it,
+    or 304 if the client's copy (If-None-Match) is current
+    """
+    snapshot = await db.load_snapshot(request.path_params["graph"])
+    if snapshot is None:
+        return Response("No snapshot for graph", status_code=404)
+
+    blob, etag = snapshot
+    gzipped = accepts_gzip(request.headers.get("accept-encoding", ""))
+    if not gzipped:
+        etag = identity_etag(etag)
+    # clients must revalidate, the map changes whenever it's added again
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    else:
+        # a whole map, too slow to decompress on the event loop
+        blob = await run_in_threadpool(gzip.decompress, blob)
+    return Response(blob, media_type="application/json", headers=headers)
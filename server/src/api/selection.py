@@ -0,0 +1,36 @@
+"""
+    Fields selected by GraphQL queries, so resolvers can skip loading what
+    isn't asked for
+"""
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def selected_fields(info) -> set:
+    """
+    Names of the fields selected on the result of a resolver, including
+    those selected through fragment spreads and inline fragments
+
+    Directives aren't evaluated, so fields under @skip or @include count
+    as selected
+    """
+    names = set()
+    spread = set()
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                names.add(selection.name.value)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = info.fragments.get(name)
+                if name not in spread and fragment is not None:
+                    spread.add(name)
+                    collect(fragment.selection_set)
+
+    for field_node in info.field_nodes:
+        collect(field_node.selection_set)
+    return names
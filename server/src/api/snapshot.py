@@ -0,0 +1,149 @@
+"""
+    Whole map snapshots
+
+    A snapshot is every node, edge, polygon and PoI of a graph in one
+    gzipped JSON document, built once when the graph is added so clients
+    can download a map in one request with no resolvers involved. Entries
+    are stored as columns (one list per field) rather than one object per
+    entry, which is much smaller.
+"""
+import dataclasses
+import gzip
+import hashlib
+import json
+from typing import Dict, List, Tuple, Type
+from src.types.map_types import PathNode, PoI, Polygon
+
+# Version of the snapshot format, bump when it changes
+SNAPSHOT_VERSION = 1
+
+
+def columns(entries: List) -> Dict[str, list]:
+    """
+    Transpose dataclass entries into a list per field, leaving out the
+    graph name which is the same for every entry
+    """
+    if not entries:
+        return {}
+
+    names = [
+        field.name for field in dataclasses.fields(entries[0]) if field.name != "graph"
+    ]
+    return {name: [getattr(entry, name) for entry in entries] for name in names}
+
+
+def rows(graph: str, table: Dict[str, list], entry_type: Type) -> List:
+    """
+    Dataclass entries from a list per field, the inverse of columns
+    """
+    names = list(table)
+    return [
+        entry_type(graph=graph, **dict(zip(names, values)))
+        for values in zip(*table.values())
+    ]
+
+
+def build_snapshot(
+    graph: str,
+    nodes: List[PathNode],
+    edges: List[Tuple[int, int]],
+    polygons: List[Polygon],
+    pois: List[PoI],
+) -> Tuple[bytes, str]:
+    """
+    Encode a graph as a snapshot
+
+    Args:
+        graph (str): name of the graph
+        nodes (List[PathNode]): every node, including walls
+        edges (List[Tuple[int, int]]): node ID pairs
+        polygons (List[Polygon]): every polygon
+        pois (List[PoI]): every PoI
+
+    Returns:
+        the gzipped snapshot and its ETag
+    """
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "graph": graph,
+        "nodes": columns(nodes),
+        # flattened pairs, [n0, m0, n1, m1, ...]
+        "edges": [node_id for edge in edges for node_id in edge],
+        "polygons": columns(polygons),
+        "pois": columns(pois),
+    }
+    encoded = json.dumps(snapshot, separators=(",", ":")).encode("utf-8")
+    # a fixed mtime means the same map always gives the same bytes and ETag
+    blob = gzip.compress(encoded, compresslevel=9, mtime=0)
+
+    return blob, f'"{hashlib.sha1(blob).hexdigest()}"'
+
+
+def read_snapshot(
+    blob: bytes,
+) -> Tuple[List[PathNode], List[Tuple[int, int]], List[Polygon], List[PoI]]:
+    """
+    Decode a snapshot into the graph it was built from
+
+    Raises:
+        ValueError if the snapshot is of another version
+    """
+    snapshot = json.loads(gzip.decompress(blob))
+    if snapshot["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {snapshot['version']} is not supported")
+
+    graph = snapshot["graph"]
+    edges = snapshot["edges"]
+    return (
+        rows(graph, snapshot["nodes"], PathNode),
+        list(zip(edges[::2], edges[1::2])),
+        rows(graph, snapshot["polygons"], Polygon),
+        rows(graph, snapshot["pois"], PoI),
+    )
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    # weak comparison, as the header is only used for GET
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+
+    return False
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header accepts gzip, a missing header is
+    taken as not accepting it as plenty of clients don't decode it
+    """
+    accepted = {}
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+
+    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
+
+
+def identity_etag(etag: str) -> str:
+    """
+    ETag of the uncompressed version of a snapshot, which differs from the
+    gzipped one so caches don't mix them up
+    """
+    return etag[:-1] + '-identity"'
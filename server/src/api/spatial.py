@@ -0,0 +1,104 @@
+"""
+    In-process spatial index for viewport (bounding box) queries
+
+    Features are put in one R-tree per type and level, polygons by their
+    NE / SW bounding box and nodes and PoIs as points, all in (lat, lon).
+"""
+from typing import Dict, List, Sequence, Tuple
+import shapely.geometry
+from shapely.strtree import STRtree
+from src.types.map_types import PathNode, PoI, Polygon
+
+# Rough memory used by one indexed feature (geometry, tree entry and the
+# dataclass), polygons also store their vertices
+FEATURE_BYTES = 1024
+VERTEX_BYTES = 64
+
+
+class FeatureTree:
+    """
+    R-tree over features, returning the features rather than tree indices
+    """
+
+    def __init__(self, features: list, geometries: list):
+        self.features = features
+        self.tree = STRtree(geometries)
+
+    def intersecting(self, area) -> list:
+        """
+        Features intersecting an area, in the order they were indexed
+        """
+        indices = self.tree.query(area, predicate="intersects")
+        return [self.features[index] for index in sorted(indices)]
+
+
+class SpatialIndex:
+    """
+    Spatial indices of the levels of one graph, levels are added as they
+    are first asked for
+    """
+
+    def __init__(self):
+        # level -> (polygon tree, node tree, poi tree)
+        self.levels: Dict[float, Tuple[FeatureTree, FeatureTree, FeatureTree]] = {}
+        # level -> estimated bytes used by its trees
+        self.__sizes: Dict[float, int] = {}
+
+    def __contains__(self, level: float) -> bool:
+        return float(level) in self.levels
+
+    def add_level(
+        self,
+        level: float,
+        polygons: List[Polygon],
+        nodes: List[PathNode],
+        pois: List[PoI],
+    ) -> None:
+        """
+        Index the features on a level
+        """
+        polygon_boxes = [
+            shapely.geometry.box(p.SW[0], p.SW[1], p.NE[0], p.NE[1]) for p in polygons
+        ]
+        node_points = [shapely.geometry.Point(n.lat, n.lon) for n in nodes]
+        poi_points = [shapely.geometry.Point(p.lat, p.lon) for p in pois]
+
+        self.levels[float(level)] = (
+            FeatureTree(polygons, polygon_boxes),
+            FeatureTree(nodes, node_points),
+            FeatureTree(pois, poi_points),
+        )
+        size = (len(polygons) + len(nodes) + len(pois)) * FEATURE_BYTES
+        size += sum(len(p.vertices) for p in polygons) * VERTEX_BYTES
+        self.__sizes[float(level)] = size
+
+    def remove_level(self, level: float) -> None:
+        """
+        Drop the index of a level (e.g. when it's changed), it's loaded
+        again the next time it's asked for
+        """
+        self.levels.pop(float(level), None)
+        self.__sizes.pop(float(level), None)
+
+    def within_bbox(
+        self, level: float, sw: Sequence[float], ne: Sequence[float]
+    ) -> Tuple[List[Polygon], List[PathNode], List[PoI]]:
+        """
+        Features on a level inside (or overlapping) a bounding box
+
+        Args:
+            level (float): level to search, must have been added
+            sw (Sequence[float]): (lat, lon) of the south west corner
+            ne (Sequence[float]): (lat, lon) of the north east corner
+
+        Returns:
+            polygons, nodes and PoIs in the box
+        """
+        area = shapely.geometry.box(sw[0], sw[1], ne[0], ne[1])
+        return tuple(tree.intersecting(area) for tree in self.levels[float(level)])
+
+    def estimated_size(self) -> int:
+        """
+        Estimated memory used by the index in bytes
+        """
+        return sum(self.__sizes.values())
@@ -1,19 +1,20 @@
 """
     Edge type resolvers
 """
-from src.api.api_database import db
 from ariadne import ObjectType
 
 edge = ObjectType("Edge")
 
 
 @edge.field("adjacent_nodes")
-async def resolved_adj_nodes(obj, *_):
+async def resolved_adj_nodes(obj, info, **_):
     """
     Get two adjacent nodes with edge
     """
-    nodes = []
-    for node_id in obj["edge"]:
-        nodes.append(await db.get_node_by_id(obj["graph"], node_id))
+    # the edges query fetches the nodes along with the edges when it can
+    if "adjacent_nodes" in obj:
+        return obj["adjacent_nodes"]
 
-    return nodes
+    return await info.context["loaders"].nodes.load_many(
+        [(obj["graph"], node_id) for node_id in obj["edge"]]
+    )
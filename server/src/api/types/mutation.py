@@ -3,13 +3,41 @@ Mutation resolvers
 """
 import asyncio
 import logging
-import json
-from src.api.api_database import db
-from src.parser.graph_parser import Parser
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from functools import partial
+from typing import Optional, Tuple
+from src.api.api_database import (
+    db,
+    locator,
+    parse_pool,
+    router_cache,
+    spatial_cache,
+)
+from src.api.graph_diff import GraphDiff
+from src.api.ingest import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_PARSING,
+    JOB_SAVING,
+    ParsedGraph,
+    job_record,
+    parse_files,
+    parse_json,
+    snapshot_footprint,
+    update_files,
+)
+from src.types.map_types import PoI, Polygon
 from ariadne import MutationType
 
 mutation = MutationType()
 log = logging.getLogger(__name__)
+# import jobs running after their mutation returned, kept so they aren't
+# garbage collected part way through
+background_jobs = set()
 
 
 @mutation.field("add_graph")
@@ -18,35 +46,305 @@ async def resolve_add_graph(*_, graph, polygons, linestring, points):
     Parses JSON strings and adds a graph to the database
     """
     log.info("Adding graph %s", graph)
+    job = await create_job(graph)
+    return await run_job(job["id"], parse_json, graph, polygons, linestring, points)
+
+
+@mutation.field("add_graph_files")
+async def resolve_add_graph_files(*_, graph, polygons, linestring, points):
+    """
+    Adds a graph to the database from uploaded GeoJSON files, the files are
+    parsed as they are read rather than decoded whole
+    """
+    log.info("Adding graph %s from files", graph)
+    job = await create_job(graph)
+    paths = await save_uploads(polygons=polygons, linestring=linestring, points=points)
+    return await import_files(job["id"], graph, paths)
+
+
+@mutation.field("import_graph")
+async def resolve_import_graph(*_, graph, polygons, linestring, points):
+    """
+    Starts adding a graph from uploaded GeoJSON files and returns the job
+    without waiting for it, its progress is given by the import_job query
+    """
+    log.info("Importing graph %s", graph)
+    job = await create_job(graph)
+    # uploads are closed when the request ends, so they're copied first
+    paths = await save_uploads(polygons=polygons, linestring=linestring, points=points)
+
+    task = asyncio.create_task(import_files(job["id"], graph, paths))
+    background_jobs.add(task)
+    task.add_done_callback(background_jobs.discard)
+    return job
+
+
+@mutation.field("rollback_graph")
+async def resolve_rollback_graph(*_, graph):
+    """
+    Makes the version of a graph saved before the live one live again,
+    rolling back twice undoes it
+    """
+    async with db.graph_lock(graph):
+        version = await db.rollback_version(graph)
+    if version is None:
+        log.warning("No previous version of %s to roll back to", graph)
+        return False
+
+    snapshot = await db.load_snapshot(version)
+    if snapshot is not None:
+        loop = asyncio.get_running_loop()
+        footprint = await loop.run_in_executor(
+            parse_pool, snapshot_footprint, snapshot[0]
+        )
+        await db.save_footprint(graph, footprint)
+        locator.add(graph, footprint)
+
+    router_cache.invalidate(graph)
+    spatial_cache.invalidate(graph)
+    log.info("Graph %s rolled back to %s", graph, version)
+    return True
+
+
+@mutation.field("update_graph")
+async def resolve_update_graph(*_, graph, polygons, linestring, points):
+    """
+    Updates a graph to a new version of its map, uploaded as GeoJSON files,
+    only rebuilding and invalidating what changed since the saved version
+    """
+    log.info("Updating graph %s", graph)
+    job = await create_job(graph)
+    paths = await save_uploads(polygons=polygons, linestring=linestring, points=points)
+
+    # diffed against the live version, the update is saved as a new one
+    version = await db.graph_version(graph)
+    snapshot = await db.load_snapshot(version)
+    if snapshot is None:
+        # nothing to diff against, e.g. the graph hasn't been added
+        log.info("No snapshot of %s, adding it instead", graph)
+        return await import_files(job["id"], graph, paths)
+
     try:
-        json_polygons = json.loads(polygons.encode("utf-8").decode("unicode-escape"))
-        json_linestring = json.loads(
-            linestring.encode("utf-8").decode("unicode-escape")
+        return await run_job(
+            job["id"],
+            update_files,
+            graph,
+            paths,
+            snapshot[0],
+            save=partial(save_graph_update, version),
         )
-        json_points = json.loads(points.encode("utf-8").decode("unicode-escape"))
-    except json.JSONDecodeError:
-        print("JSON FAIL")
-        return False
+    finally:
+        for path in paths.values():
+            os.remove(path)
+
+
+async def create_job(graph: str) -> dict:
+    """
+    Record a new import job of a graph
+    """
+    now = time.time()
+    fields = {
+        "id": uuid.uuid4().hex,
+        "graph": graph,
+        "status": JOB_PARSING,
+        "error": "",
+        "created": now,
+        "updated": now,
+    }
+    await db.save_job(fields["id"], fields)
+    return job_record(fields)
+
+
+async def update_job(job_id: str, status: str, error: str = "") -> None:
+    """
+    Record the progress of an import job
+    """
+    await db.save_job(
+        job_id, {"status": status, "error": error, "updated": time.time()}
+    )
+
+
+async def save_uploads(**uploads) -> dict:
+    """
+    Copy uploaded files to temporary files, so worker processes can read
+    them, returning the path of each
+    """
 
-    log.info("JSON loaded for %s", graph)
+    def copy(upload):
+        with tempfile.NamedTemporaryFile(suffix=".geojson", delete=False) as file:
+            shutil.copyfileobj(upload.file, file)
+        return file.name
 
+    loop = asyncio.get_running_loop()
+    paths = {}
+    for name, upload in uploads.items():
+        paths[name] = await loop.run_in_executor(None, copy, upload)
+    return paths
+
+
+async def run_job(job_id: str, parse, graph: str, *layers, save=None) -> bool:
+    """
+    Parse a graph in the process pool and save it, recording the progress
+    of its job
+
+    Args:
+        job_id (str): ID of the import job
+        parse (Callable): parse_json, parse_files or update_files
+        graph (str): name of the graph
+        layers: the rest of the arguments of parse
+        save (Callable): coroutine function saving what parse returns,
+            save_parsed_graph by default
+
+    Returns:
+        Whether the graph was added, False if it couldn't be parsed
+    """
+    loop = asyncio.get_running_loop()
     try:
-        parsed = Parser(graph, json_polygons, json_linestring, json_points)
-    except (ValueError, KeyError) as e:
-        print(f"PARSER FAIL {e:}")
-        return False
+        try:
+            parsed = await loop.run_in_executor(parse_pool, parse, graph, *layers)
+        except (ValueError, KeyError) as e:
+            log.warning("Parsing %s failed: %s", graph, e)
+            await update_job(job_id, JOB_FAILED, f"{type(e).__name__}: {e}")
+            return False
+
+        await update_job(job_id, JOB_SAVING)
+        await (save or save_parsed_graph)(parsed)
+        await update_job(job_id, JOB_DONE)
+        return True
+    except Exception as e:
+        log.exception("Import job %s of %s failed", job_id, graph)
+        await update_job(job_id, JOB_FAILED, f"{type(e).__name__}: {e}")
+        raise
+
 
-    log.info("Graph parsed for %s", graph)
+async def import_files(job_id: str, graph: str, paths: dict) -> bool:
+    """
+    run_job for temporary GeoJSON files, which are removed afterwards
+    """
+    try:
+        return await run_job(job_id, parse_files, graph, paths)
+    finally:
+        for path in paths.values():
+            os.remove(path)
+
+
+async def stage_graph(parsed: ParsedGraph, hierarchy_of: Optional[str] = None) -> str:
+    """
+    Write a parsed graph to a new version, which isn't read until it's
+    promoted, and delete it again if any of it can't be written
+
+    Args:
+        parsed (ParsedGraph): graph to write
+        hierarchy_of (str): version to copy the routing hierarchy from
+            instead of saving the parsed one, for updates that didn't
+            change routing
+
+    Returns:
+        The new version
+    """
+    version = await db.new_version(parsed.graph)
+    if hierarchy_of is None:
+        hierarchy = db.save_hierarchy(version, parsed.hierarchy)
+    else:
+        hierarchy = db.copy_hierarchy(hierarchy_of, version)
 
     # probably if it parses fine it'll get saved okay
     tasks = []
-    tasks.append(asyncio.create_task(db.save_graph(graph, parsed.nodes, parsed.edges)))
-    tasks.append(asyncio.create_task(db.add_entries(graph, parsed.polygons)))
-    tasks.append(asyncio.create_task(db.add_entries(graph, parsed.pois)))
+    tasks.append(
+        asyncio.create_task(db.save_graph(version, parsed.nodes, parsed.edges))
+    )
+    tasks.append(asyncio.create_task(db.add_entries(version, parsed.polygons, Polygon)))
+    tasks.append(asyncio.create_task(db.add_entries(version, parsed.pois, PoI)))
+    tasks.append(asyncio.create_task(hierarchy))
+    tasks.append(
+        asyncio.create_task(db.save_snapshot(version, parsed.snapshot, parsed.etag))
+    )
 
-    await asyncio.wait(tasks)
-    log.info("Graph added for %s", graph)
-    return True
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        # readers never saw it, so it can just go
+        await asyncio.wait(tasks)
+        await db.delete_version(version)
+        raise
+    return version
+
+
+async def save_parsed_graph(parsed: ParsedGraph) -> None:
+    """
+    Save a parsed graph to the database as a new version, make it the live
+    version once it's all written and update the caches built from it
+    """
+    graph = parsed.graph
+    version = await stage_graph(parsed)
+
+    async with db.graph_lock(graph):
+        retired = await db.promote_version(graph, version)
+    await db.save_footprint(graph, parsed.footprint)
+    # drop routers built from the old version of this graph
+    router_cache.invalidate(graph)
+    spatial_cache.invalidate(graph)
+    locator.add(graph, parsed.footprint)
+    log.info("Graph added for %s as %s", graph, version)
+
+    # the version before the one kept for rollback
+    if retired is not None:
+        await db.delete_version(retired)
+
+
+async def save_graph_update(
+    version: str, update: Tuple[ParsedGraph, GraphDiff]
+) -> None:
+    """
+    Save an updated graph as a new version and promote it like an import,
+    then update (or drop) the caches built from the levels that changed
+
+    IDs are carried over from the version the update was diffed against,
+    so routers and the indices of unchanged levels stay valid. The update
+    fails if that version is no longer live once the new one is written,
+    e.g. another update or import finished in the meantime
+
+    Args:
+        version (str): version of the graph the update was diffed against
+        update (Tuple[ParsedGraph, GraphDiff]): what update_files returned
+    """
+    parsed, diff = update
+    graph = parsed.graph
+    if not diff:
+        log.info("Graph %s is unchanged", graph)
+        return
+
+    staged = await stage_graph(
+        parsed, hierarchy_of=None if diff.routing_changed else version
+    )
+    try:
+        async with db.graph_lock(graph):
+            if await db.graph_version(graph) != version:
+                raise RuntimeError(f"{graph} changed while its update was parsed")
+            retired = await db.promote_version(graph, staged)
+    except Exception:
+        await db.delete_version(staged)
+        raise
+
+    if diff.routing_changed:
+        router_cache.invalidate(graph)
+    # keep the indices of unchanged levels, the rest are loaded again
+    index = spatial_cache.get(graph)
+    spatial_cache.invalidate(graph)
+    if index is not None:
+        for level in diff.levels:
+            index.remove_level(level)
+        if index.levels:
+            spatial_cache.put(graph, index, spatial_cache.generation(graph))
+    if diff.removed_polygons or diff.added_polygons:
+        await db.save_footprint(graph, parsed.footprint)
+        locator.add(graph, parsed.footprint)
+    log.info(
+        "Graph updated for %s as %s, levels %s", graph, staged, sorted(diff.levels)
+    )
+
+    if retired is not None:
+        await db.delete_version(retired)
 
 
 @mutation.field("flush_all")
@@ -54,5 +352,8 @@ async def resolve_flush_all(*_):
     """
     DEBUG method (deletes everything in DB)
     """
-    await db.redis_db.flushall()
+    await db.flush_all()
+    router_cache.clear()
+    spatial_cache.clear()
+    locator.clear()
     return True
@@ -3,22 +3,20 @@
     These define how to resolve fields in the node type
 """
 from ariadne import ObjectType
-from src.types.map_types import Polygon
-from src.api.api_database import db
 
 node = ObjectType("Node")
 
 
 @node.field("neighbours")
-async def resolve_neighbours(obj, *_):
+async def resolve_neighbours(obj, info, **_):
     """
     Resolve the node neighbours of a given node
     """
-    return await db.get_node_neighbours(obj.graph, obj.id)
+    return await info.context["loaders"].neighbours.load((obj.graph, obj.id))
 
 
 @node.field("polygon")
-async def resolve_polygon(obj, *_):
+async def resolve_polygon(obj, info, **_):
     """
     Gets polygon nodes is in
     """
@@ -26,4 +24,4 @@ async def resolve_polygon(obj, *_):
         # This is just a node that's not in a room
         return None
 
-    return await db.load_entry_by_id(obj.graph, obj.poly_id, Polygon)
+    return await info.context["loaders"].polygons.load((obj.graph, obj.poly_id))
@@ -1,14 +1,13 @@
 """
     Path type resolvers
 """
-from src.path_finding.router import Router
 
 
 class PathObj:
     """Path resolvers"""
 
-    def __init__(self, nodes, edges, polys, start_id, end_id):
-        self.router = Router(nodes, edges, polys)
+    def __init__(self, router, start_id, end_id):
+        self.router = router
         self.path_ids = self.router.find_path(start_id, end_id)
         self.path_nodes = self.router.get_path_nodes(self.path_ids)
 
@@ -28,3 +27,42 @@ class PathObj:
         """list of floors that are spanned by a path"""
         levels = {x.level for x in self.path_nodes}
         return levels
+
+
+class RouteMatrixObj:
+    """Route matrix resolvers"""
+
+    def __init__(self, router, sources, targets, paths=True):
+        """
+        Args:
+            paths (bool): whether paths are asked for, they're only
+                          unwound if they are (or if paths() is called
+                          anyway)
+        """
+        self.router = router
+        self.sources_ids = sources
+        self.targets_ids = targets
+        self.distance_matrix, self.path_matrix = router.route_matrix(
+            sources, targets, paths=paths
+        )
+
+    def sources(self, *_):
+        """source node ids (rows)"""
+        return self.sources_ids
+
+    def targets(self, *_):
+        """target node ids (columns)"""
+        return self.targets_ids
+
+    def distances(self, *_):
+        """route lengths from every source to every target"""
+        return self.distance_matrix
+
+    def paths(self, *_):
+        """route node ids from every source to every target"""
+        if self.path_matrix is None:
+            # not expected from the query, so only unwound now
+            _, self.path_matrix = self.router.route_matrix(
+                self.sources_ids, self.targets_ids, paths=True
+            )
+        return self.path_matrix
@@ -1,15 +1,14 @@
 """
     PoI type resolvers
 """
-from src.api.api_database import db
 from ariadne import ObjectType
 
 poi = ObjectType("PoI")
 
 
 @poi.field("nearest_path_node")
-async def nearest_path_node(obj, *_):
+async def nearest_path_node(obj, info, **_):
     """
     Resolve the nearest path node object for the PoI
     """
-    return await db.get_node_by_id(obj.graph, obj.nearest_path_node)
+    return await info.context["loaders"].nodes.load((obj.graph, obj.nearest_path_node))
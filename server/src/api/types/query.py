@@ -2,14 +2,80 @@
     Query type resolvers
     These define how we respond to queries
 """
+import asyncio
 from ariadne import QueryType
-from src.api.api_database import db
-from src.api.types.path import PathObj
+from src.api.api_database import (
+    db,
+    locator,
+    router_cache,
+    spatial_cache,
+    ROUTER_BACKEND,
+)
+from src.api.ingest import job_record
+from src.api.selection import selected_fields
+from src.api.spatial import SpatialIndex
+from src.api.types.path import PathObj, RouteMatrixObj
+from src.path_finding.router import Router
 from src.types.map_types import Polygon, PoI
 
 query = QueryType()
 
 
+async def get_router(graph: str) -> Router:
+    """
+    Returns the cached router for a graph, building and caching it
+    from the database if there isn't one
+    """
+    router = router_cache.get(graph)
+    if router is not None:
+        return router
+
+    generation = router_cache.generation(graph)
+    # everything from one version, in case another is promoted meanwhile
+    version = await db.graph_version(graph)
+    (nodes, edges), polys, hierarchy = await asyncio.gather(
+        db.load_graph(version),
+        db.load_entries(version, Polygon),
+        db.load_hierarchy(version),
+    )
+
+    router = Router(nodes, edges, polys, backend=ROUTER_BACKEND, hierarchy=hierarchy)
+    router_cache.put(graph, router, generation)
+    return router
+
+
+async def get_spatial_index(graph: str, level: float) -> SpatialIndex:
+    """
+    Returns the cached spatial index for a graph with a level indexed,
+    loading the level from the database if it isn't
+    """
+    index = spatial_cache.get(graph)
+    if index is not None and level in index:
+        return index
+
+    generation = spatial_cache.generation(graph)
+    version = await db.graph_version(graph)
+    polygons, nodes, pois = await asyncio.gather(
+        db.load_entries(version, Polygon, level),
+        db.load_nodes(version, level),
+        db.load_entries(version, PoI, level),
+    )
+
+    if spatial_cache.generation(graph) != generation:
+        # the graph changed while this loaded, the cached index mustn't get
+        # the old level so it's only used for this request
+        index = SpatialIndex()
+        index.add_level(level, polygons, nodes, pois)
+        return index
+
+    # another request may have started an index while this one loaded
+    index = spatial_cache.get(graph) or SpatialIndex()
+    index.add_level(level, polygons, nodes, pois)
+    # put again so the cache accounts for the new level
+    spatial_cache.put(graph, index, generation)
+    return index
+
+
 @query.field("node")
 async def resolve_node(*_, graph, id):
     """
@@ -19,45 +85,52 @@ async def resolve_node(*_, graph, id):
 
 
 @query.field("nodes")
-async def resolve_nodes(*_, graph):
+async def resolve_nodes(*_, graph, level=None):
     """
     Resolver for loading all nodes in graph
     """
-    return await db.load_nodes(graph)
+    return await db.load_nodes(graph, level)
 
 
 @query.field("walls")
-async def resolve_walls(*_, graph):
+async def resolve_walls(*_, graph, level=None):
     """
     Resolver for loading all walls in graph
     """
-    return await db.load_walls(graph)
+    return await db.load_walls(graph, level)
 
 
 @query.field("search_nodes")
-async def resolve_search_nodes(*_, graph, search):
+async def resolve_search_nodes(*_, graph, search, offset, limit):
     """
     Resolver for searching for nodes within a graph
     """
-    return await db.search_room_nodes(graph, search)
+    return await db.search_room_nodes(graph, search, offset, limit)
 
 
 @query.field("search_polygons")
-async def resolve_search_polys(*_, graph, search):
+async def resolve_search_polys(*_, graph, search, offset, limit):
     """
     Resolver for searching for polygons within a graph
     """
-    return await db.search_rooms(graph, search)
+    return await db.search_rooms(graph, search, offset, limit)
 
 
 @query.field("edges")
-async def resolve_edges(*_, graph):
+async def resolve_edges(_, info, graph, level=None):
     """
-    Resolver for loading all edges in a graph
+    Resolver for loading all edges in a graph, with their nodes in the
+    same query if adjacent_nodes is asked for
     """
-    edges = await db.load_edges(graph)
-    dictionary = [{"edge": e, "graph": graph} for e in edges]
-    return dictionary
+    if "adjacent_nodes" not in selected_fields(info):
+        edges = await db.load_edges(graph, level)
+        return [{"edge": e, "graph": graph} for e in edges]
+
+    edges = await db.load_edges_with_nodes(graph, level)
+    return [
+        {"edge": (n.id, m.id), "graph": graph, "adjacent_nodes": [n, m]}
+        for n, m in edges
+    ]
 
 
 @query.field("poi")
@@ -69,11 +142,11 @@ async def resolve_poi(*_, graph, id):
 
 
 @query.field("pois")
-async def resolve_pois(*_, graph):
+async def resolve_pois(*_, graph, level=None):
     """
     Resolver for loading all PoIs in a graph
     """
-    return await db.load_entries(graph, PoI)
+    return await db.load_entries(graph, PoI, level)
 
 
 @query.field("search_pois")
@@ -85,11 +158,38 @@ async def resolve_search_pois(*_, search):
 
 
 @query.field("search_pois_in_graph")
-async def resolve_search_pois_in_graphy(*_, graph, search):
+async def resolve_search_pois_in_graphy(*_, graph, search, offset, limit):
     """
     Resolver for searching for PoIs in a graph
     """
-    return await db.search_poi_by_name_in_graph(graph, search)
+    return await db.search_poi_by_name_in_graph(graph, search, offset, limit)
+
+
+@query.field("graph")
+async def resolve_graph(*_, lat, lon):
+    """
+    Resolver for the graph (building) a point is in
+    """
+    # footprints may have been saved by another process
+    version = await db.footprints_version()
+    if not locator.loaded or locator.version != version:
+        # graphs added here while loading are newer than what's loaded
+        edits = locator.edits
+        locator.load(await db.load_footprints(), version, since=edits)
+
+    return locator.locate(lat, lon)
+
+
+@query.field("import_job")
+async def resolve_import_job(*_, id):
+    """
+    Resolver for the progress of an import job
+    """
+    fields = await db.load_job(id)
+    if fields is None:
+        return None
+
+    return job_record(fields)
 
 
 @query.field("find_route")
@@ -97,14 +197,35 @@ async def resolve_find_route(*_, graph, start_id, end_id):
     """
     Pathfinding resolver
     """
-    # NB: this could be done smarter I think, lazy loading
-    nodes, edges = await db.load_graph(graph)
-    polys = await db.load_entries(graph, Polygon)
-
-    path_obj = PathObj(nodes, edges, polys, start_id, end_id)
+    router = await get_router(graph)
+    path_obj = PathObj(router, start_id, end_id)
     return path_obj
 
 
+@query.field("route_matrix")
+async def resolve_route_matrix(_, info, graph, sources, targets):
+    """
+    Many to many route lengths (and paths) resolver
+    """
+    router = await get_router(graph)
+    return RouteMatrixObj(
+        router, sources, targets, paths="paths" in selected_fields(info)
+    )
+
+
+@query.field("within_bbox")
+async def resolve_within_bbox(*_, graph, level, sw, ne):
+    """
+    Resolver for the polygons, nodes and PoIs in a bounding box
+    """
+    if len(sw) != 2 or len(ne) != 2:
+        raise ValueError("sw and ne must be [lat, lon]")
+
+    index = await get_spatial_index(graph, level)
+    polygons, nodes, pois = index.within_bbox(level, sw, ne)
+    return {"polygons": polygons, "nodes": nodes, "pois": pois}
+
+
 @query.field("polygon")
 async def resolve_poly(*_, graph, id):
     """
@@ -114,8 +235,8 @@ async def resolve_poly(*_, graph, id):
 
 
 @query.field("polygons")
-async def resolve_polygons(*_, graph):
+async def resolve_polygons(*_, graph, level=None):
     """
     Resolver for all polygons in a graph
     """
-    return await db.load_entries(graph, Polygon)
+    return await db.load_entries(graph, Polygon, level)
@@ -2,13 +2,42 @@
 import logging
 import warnings
 import asyncio
+import contextlib
 import json
-from typing import List, Type, Tuple
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Type, Tuple
 import dataclasses
+from itertools import islice
 import redis
-from redisgraph import Node, Edge, Graph
-from redisearch import Client, IndexDefinition, TextField, Query
+from redisgraph import Graph
+from redisearch import Client, IndexDefinition, TagField, TextField, Query
 from src.types.map_types import PathNode, PoI, Polygon
+from src.path_finding.contraction import ContractionHierarchy
+
+# Maximum nodes or edges written to RedisGraph in one query
+BULK_BATCH_SIZE = 1000
+# Maximum hash reads or writes sent to Redis in one pipeline
+PIPELINE_SIZE = 500
+# Maximum concurrent Redis connections, blocking calls run in a thread pool
+# of the same size so they never wait on the event loop
+MAX_CONNECTIONS = 16
+# Default number of search results returned per page
+SEARCH_LIMIT = 25
+# Seconds import job records are kept after their last update
+JOB_TTL = 7 * 24 * 60 * 60
+# Hashes of graph name -> live and previous version, a version is the name
+# everything of one import of the graph is stored under
+VERSIONS_KEY = "GraphVersions"
+PREVIOUS_VERSIONS_KEY = "PreviousGraphVersions"
+# Hash field of entries holding the version they were written to, so
+# searches only find the live version
+VERSION_FIELD = "graph_version"
+# Seconds a graph's lock is held at most, in case its holder dies
+GRAPH_LOCK_TIMEOUT = 10 * 60
+# Seconds between tries to take a graph's lock while another holds it
+GRAPH_LOCK_POLL = 0.05
 
 
 class Controller:
@@ -16,17 +45,45 @@ class Controller:
     Redis database controller
 
     Redis database must have Graph and Search modules
+
+    The redis, RedisGraph and RediSearch clients are all blocking, so every
+    call is run in a thread pool and awaited, letting concurrent requests
+    overlap their I/O instead of stalling the event loop.
+
+    Imports are written to a new version of a graph (see new_version) and
+    promoted once complete, so readers never see half of one. Methods that
+    read take the graph name and read its live version, methods that write
+    take the version (or graph name, for unversioned graphs) to write to.
     """
 
-    def __init__(self, host="127.0.0.1", port="6379"):
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port="6379",
+        pipeline_size=PIPELINE_SIZE,
+        max_connections=MAX_CONNECTIONS,
+    ):
         self.log = logging.getLogger(__name__)
-        self.redis_db = redis.Redis(host=host, port=port)
+        # blocks for a free connection rather than erroring when all are busy
+        pool = redis.BlockingConnectionPool(
+            host=host, port=port, max_connections=max_connections
+        )
+        self.redis_db = redis.Redis(connection_pool=pool)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_connections, thread_name_prefix="redis"
+        )
+        # commands sent per round trip when reading or writing many entries
+        self.pipeline_size = pipeline_size
 
         # define a search client and index fields for poi
         self.log.debug("Creating PoI search client")
         self.poi_search_client = Client("points_of_interest", conn=self.redis_db)
         poi_definition = IndexDefinition(prefix=["PoI:"])
-        poi_schema = TextField("amenity")
+        poi_schema = (
+            TextField("amenity"),
+            TagField("graph"),
+            TagField(VERSION_FIELD),
+        )
 
         self.log.debug("Creating rooms search client")
         self.room_search_client = Client("rooms", conn=self.redis_db)
@@ -34,26 +91,69 @@ class Controller:
         room_schema = (
             TextField("room-name"),
             TextField("room-no"),
+            TagField("graph"),
+            TagField(VERSION_FIELD),
         )
 
-        # Check to see if index is already in db, otherwise create it
-        try:
-            self.log.debug("Seeing if PoI search indicies exist")
-            self.poi_search_client.info()
-            self.log.debug("PoI search indicies exist")
-        except redis.ResponseError:
-            self.log.debug("PoI index does not exist, creating index")
-            self.poi_search_client.create_index(poi_schema, definition=poi_definition)
+        self.__ensure_index(self.poi_search_client, poi_schema, poi_definition)
+        self.__ensure_index(self.room_search_client, room_schema, room_definition)
 
+    def __ensure_index(
+        self, client: Client, schema: tuple, definition: IndexDefinition
+    ) -> None:
+        """
+        Create a search index if it doesn't exist, or recreate it if it's
+        missing fields (the documents are kept and indexed again)
+        """
+        # Check to see if index is already in db, otherwise create it
         try:
-            self.log.debug("Seeing if room search indicies exist")
-            self.room_search_client.info()
-            self.log.debug("Room search indicies exist")
+            self.log.debug("Seeing if %s search index exists", client.index_name)
+            info = client.info()
         except redis.ResponseError:
-            self.log.debug("Index does not exist, creating index")
-            self.room_search_client.create_index(
-                room_schema, definition=room_definition
+            self.log.debug("%s index does not exist, creating index", client.index_name)
+            client.create_index(schema, definition=definition)
+            return
+
+        missing = {field.name for field in schema} - self.__index_fields(info)
+        if missing:
+            self.log.info(
+                "%s index is missing %s, recreating index",
+                client.index_name,
+                ", ".join(sorted(missing)),
             )
+            client.dropindex(delete_documents=False)
+            client.create_index(schema, definition=definition)
+
+    @staticmethod
+    def __index_fields(info: dict) -> set:
+        """
+        Names of the fields of a search index from FT.INFO
+        """
+        names = set()
+        # "fields" in RediSearch 2.0, "attributes" after
+        for field in info.get("attributes") or info.get("fields") or []:
+            field = [
+                value.decode("utf-8") if isinstance(value, bytes) else value
+                for value in field
+            ]
+            names.add(field[1] if field[0] == "identifier" else field[0])
+        return names
+
+    @staticmethod
+    def __escape_tag(value: str) -> str:
+        """
+        Escape a value for use in a search TAG filter
+        """
+        return re.sub(r"(\W)", r"\\\1", value)
+
+    async def __run(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking function in the thread pool and wait for the result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(function, *args, **kwargs)
+        )
 
     @staticmethod
     def __serialise_list(ser_list):
@@ -120,12 +220,42 @@ class Controller:
             nodes.append(node_object)
         return nodes
 
+    @staticmethod
+    def __cypher_key(key: str) -> str:
+        """
+        Quote a property key for use in a cypher query
+        """
+        return "`" + str(key).replace("`", "``") + "`"
+
+    @staticmethod
+    def __batches(items: Iterable, size: int) -> Iterator[list]:
+        """
+        Split items into lists of at most size items
+        """
+        iterator = iter(items)
+        batch = list(islice(iterator, size))
+        while batch:
+            yield batch
+            batch = list(islice(iterator, size))
+
+    @staticmethod
+    def __node_label(node: PathNode) -> str:
+        """
+        Label of a node in RedisGraph, nodes are labelled by indoor tag
+        """
+        return node.tags.get("indoor") or "node"
+
     async def save_graph(
-        self, graph_name: str, nodes: List[PathNode], edges: List[tuple]
+        self,
+        graph_name: str,
+        nodes: List[PathNode],
+        edges: List[tuple],
+        batch_size: int = BULK_BATCH_SIZE,
     ) -> None:
         """
-        Save a graph given the nodes and edges to the database,
-        breadth-first traversal
+        Save a graph given the nodes and edges to the database, nodes and
+        edges are written in batches of parameterised UNWIND queries so
+        query size is bounded however big the map is
 
         This clears the whole graph at a given name!
 
@@ -135,48 +265,249 @@ class Controller:
                    by graph_parser)
             edges (list): A list of tuples mapping node id to node id
                    (sparse adjacency matrix)
+            batch_size (int): Maximum nodes or edges written per query
         """
         graph = Graph(graph_name, self.redis_db)
+        await self.__run(self.redis_db.delete, graph_name)
+
+        await self.__create_nodes(graph, nodes, batch_size)
+        # index node ids so edges can find their ends quickly, and levels
+        # so single floors can be loaded
+        await self.__create_indices(graph, {self.__node_label(n) for n in nodes})
+        await self.__create_edges(graph, nodes, edges, batch_size)
 
-        # first I want to be able to look up nodes by ID
-        lookup_nodes = {}
+    async def __create_nodes(
+        self, graph: Graph, nodes: List[PathNode], batch_size: int
+    ) -> None:
+        """
+        Create nodes in batches of parameterised UNWIND queries
+        """
+        # Nodes are grouped by label and property keys so each group can be
+        # created with one query shape, properties are passed as lists
+        # since graph parameters can't have quoted map keys
+        groups = {}
         for node in nodes:
-            lookup_nodes[node.id] = node
+            label = self.__node_label(node)
+            properties = dataclasses.asdict(
+                node, dict_factory=self.__dataclass_to_flat_dict
+            )
+            keys = tuple(sorted(properties))
+            groups.setdefault((label, keys), []).append(
+                [properties[key] for key in keys]
+            )
+
+        written = 0
+        for (label, keys), rows in groups.items():
+            properties = ", ".join(
+                f"{self.__cypher_key(key)}: row[{index}]"
+                for index, key in enumerate(keys)
+            )
+            query = (
+                "UNWIND $rows AS row "
+                f"CREATE (:{self.__cypher_key(label)} {{{properties}}})"
+            )
+
+            for batch in self.__batches(rows, batch_size):
+                await self.__run(graph.query, query, {"rows": batch})
+                written += len(batch)
+                self.log.info(
+                    "Saved %d/%d nodes to %s", written, len(nodes), graph.name
+                )
+
+    async def __create_indices(self, graph: Graph, labels: Iterable[str]) -> None:
+        """
+        Index the id and level of nodes with some labels
+        """
+        for label in labels:
+            for key in ("id", "level"):
+                await self.__run(
+                    graph.query,
+                    f"CREATE INDEX ON :{self.__cypher_key(label)}({key})",
+                )
+
+    async def __create_edges(
+        self,
+        graph: Graph,
+        nodes: List[PathNode],
+        edges: List[tuple],
+        batch_size: int,
+    ) -> None:
+        """
+        Create edges between existing nodes in batches of UNWIND queries
+
+        Args:
+            nodes (List[PathNode]): nodes the edges can be between, to find
+                their labels
+        """
+        lookup_labels = {node.id: self.__node_label(node) for node in nodes}
 
-        # loop through edges, add nodes from that
+        # Edges are labelled with the latter node's label
+        edge_groups = {}
         for node_ids in edges:
-            nodes = (lookup_nodes[node_ids[0]], lookup_nodes[node_ids[1]])
+            labels = (lookup_labels[node_ids[0]], lookup_labels[node_ids[1]])
+            edge_groups.setdefault(labels, []).append(list(node_ids))
+
+        written = 0
+        for (source_label, target_label), rows in edge_groups.items():
+            source = self.__cypher_key(source_label)
+            target = self.__cypher_key(target_label)
+            query = (
+                "UNWIND $rows AS row "
+                f"MATCH (n:{source} {{id: row[0]}}), (m:{target} {{id: row[1]}}) "
+                f"CREATE (n)-[:{target}]->(m)"
+            )
+
+            for batch in self.__batches(rows, batch_size):
+                await self.__run(graph.query, query, {"rows": batch})
+                written += len(batch)
+                self.log.info(
+                    "Saved %d/%d edges to %s", written, len(edges), graph.name
+                )
+
+    @contextlib.asynccontextmanager
+    async def graph_lock(self, graph_name: str):
+        """
+        Hold the lock of a graph, shared by every server process, while
+        changing which version is live
+        """
+        # not thread local, it's released from another executor thread
+        lock = self.redis_db.lock(
+            f"GraphLock:{graph_name}",
+            timeout=GRAPH_LOCK_TIMEOUT,
+            thread_local=False,
+        )
+        # polled rather than blocking, which would hold an executor thread
+        # (and connection) for as long as another import is promoted
+        while not await self.__run(lock.acquire, blocking=False):
+            await asyncio.sleep(GRAPH_LOCK_POLL)
+        try:
+            yield
+        finally:
+            await self.__run(lock.release)
+
+    async def graph_version(self, graph_name: str) -> str:
+        """
+        The live version of a graph, the graph name itself for graphs that
+        were saved before versions (or directly, e.g. in tests)
+        """
+        version = await self.__run(self.redis_db.hget, VERSIONS_KEY, graph_name)
+        if version is None:
+            return graph_name
+        return version.decode("utf-8")
+
+    async def new_version(self, graph_name: str) -> str:
+        """
+        Name of a new version of a graph to write an import to, it isn't
+        read until promoted with promote_version
+        """
+        number = await self.__run(self.redis_db.incr, f"VersionCount:{graph_name}")
+        return f"{graph_name}@{number}"
+
+    async def promote_version(self, graph_name: str, version: str) -> Optional[str]:
+        """
+        Atomically make a version of a graph the live one, the version it
+        replaces is kept for rollback_version
 
-            node_objs = []
-            node_label = "node"
-            for index, node in enumerate(nodes):
-                if "indoor" in node.tags:
-                    node_label = node.tags["indoor"]
+        Args:
+            graph_name (str): name of the graph
+            version (str): fully written version to promote
 
-                node_alias = "n" + str(node_ids[index])
+        Returns:
+            The version that was kept before, which is no longer needed
+            and can be deleted with delete_version, or None
+        """
 
-                if node_alias not in graph.nodes:
-                    node_properties = dataclasses.asdict(
-                        node, dict_factory=self.__dataclass_to_flat_dict
-                    )
+        def promote(pipeline):
+            live = pipeline.hget(VERSIONS_KEY, graph_name)
+            previous = pipeline.hget(PREVIOUS_VERSIONS_KEY, graph_name)
+            if live is None and pipeline.exists(graph_name, f"Snapshot:{graph_name}"):
+                # saved before versions, kept like any other version
+                live = graph_name.encode("utf-8")
+
+            live = live and live.decode("utf-8")
+            previous = previous and previous.decode("utf-8")
+            if live == version:
+                return None
+
+            pipeline.multi()
+            pipeline.hset(VERSIONS_KEY, graph_name, version)
+            if live is not None:
+                pipeline.hset(PREVIOUS_VERSIONS_KEY, graph_name, live)
+            return previous if previous not in (live, version) else None
+
+        retired = await self.__run(
+            self.redis_db.transaction,
+            promote,
+            VERSIONS_KEY,
+            PREVIOUS_VERSIONS_KEY,
+            graph_name,
+            f"Snapshot:{graph_name}",
+            value_from_callable=True,
+        )
+        self.log.info("Promoted %s to %s", graph_name, version)
+        return retired
 
-                    node_obj = Node(
-                        label=node_label, properties=node_properties, alias=node_alias
-                    )
+    async def rollback_version(self, graph_name: str) -> Optional[str]:
+        """
+        Atomically swap the live and previous versions of a graph, rolling
+        back again undoes it
 
-                    node_objs.append(node_obj)
-                    graph.add_node(node_obj)
-                else:
-                    node_objs.append(graph.nodes[node_alias])
+        Returns:
+            The version now live, or None if there is no previous version
+        """
 
-            # Edges are labelled with whatever the latter node's label is
-            # Given the rest of the program there's no place where these differ
-            # But maybe this is something to look at later for flexibility
-            edge = Edge(node_objs[0], node_label, node_objs[1])
-            graph.add_edge(edge)
+        def swap(pipeline):
+            live = pipeline.hget(VERSIONS_KEY, graph_name)
+            previous = pipeline.hget(PREVIOUS_VERSIONS_KEY, graph_name)
+            if live is None or previous is None:
+                return None
+
+            pipeline.multi()
+            pipeline.hset(VERSIONS_KEY, graph_name, previous)
+            pipeline.hset(PREVIOUS_VERSIONS_KEY, graph_name, live)
+            return previous.decode("utf-8")
+
+        version = await self.__run(
+            self.redis_db.transaction,
+            swap,
+            VERSIONS_KEY,
+            PREVIOUS_VERSIONS_KEY,
+            value_from_callable=True,
+        )
+        if version is not None:
+            self.log.info("Rolled %s back to %s", graph_name, version)
+        return version
 
-        self.log.debug("Commiting graph %s", graph_name)
-        graph.commit()
+    async def delete_version(self, version: str) -> None:
+        """
+        Delete everything stored under a version of a graph (one that
+        isn't live or kept, e.g. retired or from a failed import)
+        """
+        keys = [
+            version,
+            f"Hierarchy:{version}",
+            f"Snapshot:{version}",
+        ]
+        for entry_type in (Polygon, PoI):
+            name = entry_type.__name__
+            for pattern in (
+                f"{name}:{version}:*",
+                f"LevelEntries:{name}:{version}:*",
+            ):
+                keys += await self.__run(lambda: list(self.redis_db.scan_iter(pattern)))
+            keys.append(self.__entry_index_key(version, entry_type))
+            keys.append(self.__entry_levels_key(version, entry_type))
+            keys.append(self.__entries_indexed_key(version, entry_type))
+
+        for batch in self.__batches(keys, self.pipeline_size):
+            await self.__run(self.redis_db.delete, *batch)
+        self.log.info("Deleted version %s", version)
+
+    async def flush_all(self) -> None:
+        """
+        Delete everything in the database
+        """
+        await self.__run(self.redis_db.flushall)
 
     async def load_graph(
         self, graph_name: str
@@ -190,25 +521,173 @@ class Controller:
         Returns:
             tuple with two lists, first element is nodes, second is edges
         """
+        graph_name = await self.graph_version(graph_name)
         nodes, edges = await asyncio.gather(
             self.load_nodes(graph_name), self.load_edges(graph_name)
         )
 
         return (nodes, edges)
 
-    async def load_nodes(self, graph_name: str) -> List[PathNode]:
+    async def save_hierarchy(
+        self, graph_name: str, hierarchy: ContractionHierarchy
+    ) -> None:
+        """
+        Store the routing hierarchy of a graph alongside it
+
+        Args:
+            graph_name (str): graph the hierarchy was built from
+            hierarchy (ContractionHierarchy): preprocessed hierarchy
+        """
+        await self.__run(
+            self.redis_db.set,
+            f"Hierarchy:{graph_name}",
+            json.dumps(hierarchy.to_dict()),
+        )
+
+    async def copy_hierarchy(self, source: str, target: str) -> None:
+        """
+        Store the routing hierarchy of one version of a graph under another,
+        without decoding it, for versions with the same routing
+
+        Args:
+            source (str): version to copy the hierarchy of
+            target (str): version to copy it to
+        """
+        hierarchy = await self.__run(self.redis_db.get, f"Hierarchy:{source}")
+        if hierarchy is not None:
+            await self.__run(self.redis_db.set, f"Hierarchy:{target}", hierarchy)
+
+    async def load_hierarchy(self, graph_name: str) -> Optional[ContractionHierarchy]:
+        """
+        Load the routing hierarchy of a graph
+
+        Args:
+            graph_name (str): graph to load the hierarchy of
+
+        Returns:
+            The hierarchy, or None if there isn't one (or it's outdated)
+        """
+        graph_name = await self.graph_version(graph_name)
+        hierarchy = await self.__run(self.redis_db.get, f"Hierarchy:{graph_name}")
+        if hierarchy is None:
+            return None
+
+        return ContractionHierarchy.from_dict(json.loads(hierarchy))
+
+    async def save_snapshot(self, graph_name: str, blob: bytes, etag: str) -> None:
+        """
+        Store the map snapshot of a graph
+
+        Args:
+            graph_name (str): graph the snapshot is of
+            blob (bytes): encoded snapshot
+            etag (str): ETag of the snapshot
+        """
+        await self.__run(
+            self.redis_db.hset,
+            f"Snapshot:{graph_name}",
+            mapping={"blob": blob, "etag": etag},
+        )
+
+    async def load_snapshot(self, graph_name: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Load the map snapshot of a graph
+
+        Args:
+            graph_name (str): graph to load the snapshot of
+
+        Returns:
+            The encoded snapshot and its ETag, or None if there isn't one
+        """
+        graph_name = await self.graph_version(graph_name)
+        snapshot = await self.__run(self.redis_db.hgetall, f"Snapshot:{graph_name}")
+        if not snapshot:
+            return None
+
+        return snapshot[b"blob"], snapshot[b"etag"].decode("utf-8")
+
+    async def save_footprint(
+        self, graph_name: str, vertices: List[Tuple[float, float]]
+    ) -> None:
+        """
+        Store the footprint of a graph, used to find the graph a point is in
+
+        Args:
+            graph_name (str): graph the footprint is of
+            vertices (List[Tuple[float, float]]): (lat, lon) outline
+        """
+        pipeline = self.redis_db.pipeline()
+        pipeline.hset("Footprints", graph_name, json.dumps(vertices))
+        pipeline.incr("FootprintsVersion")
+        await self.__run(pipeline.execute)
+
+    async def footprints_version(self) -> int:
+        """
+        Version of the stored footprints, changed whenever one is saved, so
+        a process can tell when its copy is outdated
+        """
+        version = await self.__run(self.redis_db.get, "FootprintsVersion")
+        return int(version or 0)
+
+    async def load_footprints(self) -> Dict[str, List[Tuple[float, float]]]:
+        """
+        Load the footprints of every graph
+
+        Returns:
+            graph name -> (lat, lon) outline
+        """
+        footprints = await self.__run(self.redis_db.hgetall, "Footprints")
+        return {
+            graph.decode("utf-8"): [tuple(vertex) for vertex in json.loads(vertices)]
+            for graph, vertices in footprints.items()
+        }
+
+    async def save_job(self, job_id: str, fields: Dict[str, Any]) -> None:
+        """
+        Create or update the record of an import job, records expire
+        JOB_TTL seconds after they were last updated
+
+        Args:
+            job_id (str): ID of the job
+            fields (Dict[str, Any]): fields to set, e.g. graph and status
+        """
+        pipeline = self.redis_db.pipeline(transaction=True)
+        pipeline.hset(f"Job:{job_id}", mapping=fields)
+        pipeline.expire(f"Job:{job_id}", JOB_TTL)
+        await self.__run(pipeline.execute)
+
+    async def load_job(self, job_id: str) -> Optional[Dict[str, str]]:
+        """
+        Load the record of an import job
+
+        Returns:
+            The fields of the job, or None if there is no such job
+        """
+        job = await self.__run(self.redis_db.hgetall, f"Job:{job_id}")
+        if not job:
+            return None
+
+        return {
+            key.decode("utf-8"): value.decode("utf-8") for key, value in job.items()
+        }
+
+    async def load_nodes(
+        self, graph_name: str, level: Optional[float] = None
+    ) -> List[PathNode]:
         """
         Return all nodes in a given graph
 
         Args:
             graph_name: graph of which to return nodes from
+            level: only return nodes on this level
 
         Returns:
             List of nodes (see graph_parser for definition of their format)
         """
+        graph_name = await self.graph_version(graph_name)
         graph = Graph(graph_name, self.redis_db)
-        query = """MATCH (n:way) RETURN n"""
-        result = graph.query(query)
+        query, params = self.__label_query("way", level)
+        result = await self.__run(graph.query, query, params)
 
         nodes = []
         for res in result.result_set:
@@ -220,12 +699,15 @@ class Controller:
 
         return node_objects
 
-    async def load_walls(self, graph_name: str) -> List[PathNode]:
+    async def load_walls(
+        self, graph_name: str, level: Optional[float] = None
+    ) -> List[PathNode]:
         """
         Return all walls in a given graph
 
         Args:
             graph_name: graph of which to return nodes from
+            level: only return walls on this level
 
         Returns:
             List of nodes (see graph_parser for definition of their format)
@@ -233,9 +715,10 @@ class Controller:
 
         This way of doing things could probably just be return every node?
         """
+        graph_name = await self.graph_version(graph_name)
         graph = Graph(graph_name, self.redis_db)
-        query = """MATCH (n:wall) RETURN n"""
-        result = graph.query(query)
+        query, params = self.__label_query("wall", level)
+        result = await self.__run(graph.query, query, params)
 
         nodes = []
         for res in result.result_set:
@@ -247,28 +730,105 @@ class Controller:
 
         return node_objects
 
-    async def load_edges(self, graph_name: str) -> List[tuple]:
+    @staticmethod
+    def __label_query(label: str, level: Optional[float]) -> Tuple[str, dict]:
+        """
+        Query and parameters for every node with a label, on one level if
+        given (which uses the level index)
+        """
+        if level is None:
+            return f"MATCH (n:{label}) RETURN n", {}
+        return f"MATCH (n:{label} {{level: $level}}) RETURN n", {"level": level}
+
+    async def __edge_rows(
+        self, graph: Graph, returns: str, level: Optional[float]
+    ) -> list:
+        """
+        Rows of every edge, or the edges with an end on one level (so edges
+        between floors are on both floors)
+
+        Edges on a level are matched from each end separately, by label, so
+        both halves use the level index, which isn't used for an OR of two
+        nodes or for nodes without a label
+        """
+        if level is None:
+            result = await self.__run(graph.query, f"MATCH (n)-->(m) RETURN {returns}")
+            return result.result_set
+
+        result = await self.__run(graph.query, "CALL db.labels()")
+        labels = [self.__cypher_key(row[0]) for row in result.result_set]
+        if not labels:
+            return []
+
+        queries = [
+            f"MATCH (n:{label})-->(m) WHERE n.level = $level RETURN {returns}"
+            for label in labels
+        ]
+        queries += [
+            f"MATCH (n)-->(m:{label}) WHERE m.level = $level AND n.level <> $level "
+            f"RETURN {returns}"
+            for label in labels
+        ]
+        result = await self.__run(
+            graph.query, " UNION ALL ".join(queries), {"level": level}
+        )
+        return result.result_set
+
+    async def load_edges(
+        self, graph_name: str, level: Optional[float] = None
+    ) -> List[tuple]:
         """
         Returns all edges in a given graph
 
         Args:
             graph_name: graph of which to return edges from
+            level: only return edges with an end on this level
 
         Returns:
             list of tuples that contain two node ids that are connected
         """
+        graph_name = await self.graph_version(graph_name)
         graph = Graph(graph_name, self.redis_db)
-        query = """MATCH (n)-->(m) RETURN n.id, m.id"""
-        result = graph.query(query)
+        rows = await self.__edge_rows(graph, "n.id, m.id", level)
 
         edges = []
-        for res in result.result_set:
+        for res in rows:
             edges.append((res[0], res[1]))
 
         return edges
 
+    async def load_edges_with_nodes(
+        self, graph_name: str, level: Optional[float] = None
+    ) -> List[Tuple[PathNode, PathNode]]:
+        """
+        Returns all edges in a given graph with both of their nodes, in one
+        query
+
+        Args:
+            graph_name: graph of which to return edges from
+            level: only return edges with an end on this level
+
+        Returns:
+            list of tuples of the two node objects that are connected
+        """
+        graph_name = await self.graph_version(graph_name)
+        graph = Graph(graph_name, self.redis_db)
+        rows = await self.__edge_rows(graph, "n, m", level)
+
+        # nodes appear in many edges, only convert each once
+        nodes = {}
+
+        def to_node(graph_node):
+            if graph_node.id not in nodes:
+                nodes[graph_node.id] = self.__flat_dict_to_dataclass(
+                    graph_node.properties, PathNode
+                )
+            return nodes[graph_node.id]
+
+        return [(to_node(n), to_node(m)) for n, m in rows]
+
     async def load_entries(
-        self, graph_name: str, entry_type: Type
+        self, graph_name: str, entry_type: Type, level: Optional[float] = None
     ) -> List[Type]:  # noqa: E501
         """
         Returns all entries in a building matching a dataclass
@@ -276,14 +836,129 @@ class Controller:
         Args:
             graph_name (str): Name of graph you want PoIs for
             dataclass (Type): Dataclass to fetch from the DB
+            level (float): only return entries on this level
 
         Returns:
             list of dataclass entries for a given graph
         """
-        keys = self.redis_db.scan_iter(f"{entry_type.__name__}:{graph_name}:*")
-        entries = await asyncio.gather(
-            *[self.load_entry(key, entry_type) for key in keys]
+        graph_name = await self.graph_version(graph_name)
+        if level is not None:
+            return await self.__load_level_entries(graph_name, entry_type, level)
+
+        pipeline = self.redis_db.pipeline(transaction=False)
+        pipeline.smembers(self.__entry_index_key(graph_name, entry_type))
+        pipeline.exists(self.__entries_indexed_key(graph_name, entry_type))
+        entry_ids, indexed = await self.__run(pipeline.execute)
+
+        if not indexed:
+            # entries written before the index existed, find them the slow
+            # way once and index them
+            return await self.__index_entries(graph_name, entry_type)
+
+        return await self.__load_indexed_entries(graph_name, entry_ids, entry_type)
+
+    async def __load_level_entries(
+        self, graph_name: str, entry_type: Type, level: float
+    ) -> List[Type]:
+        """
+        Entries of a graph on one level, from the per level ID sets
+        """
+        indexed_key = self.__entries_indexed_key(graph_name, entry_type)
+        if not await self.__run(self.redis_db.exists, indexed_key):
+            # entries written before levels were indexed, index them now
+            entries = await self.__index_entries(graph_name, entry_type)
+            return [entry for entry in entries if float(entry.level) == float(level)]
+
+        entry_ids = await self.__run(
+            self.redis_db.smembers,
+            self.__entry_index_key(graph_name, entry_type, level),
         )
+        return await self.__load_indexed_entries(graph_name, entry_ids, entry_type)
+
+    async def __index_entries(self, graph_name: str, entry_type: Type) -> List[Type]:
+        """
+        Find the entries of a graph written before they were indexed by
+        scanning the keyspace, index them by ID and level and mark them
+        indexed, so they're only scanned for once even if there are none
+
+        Returns:
+            the entries found, in ID order
+        """
+        pattern = f"{entry_type.__name__}:{graph_name}:*"
+        keys = await self.__run(lambda: list(self.redis_db.scan_iter(pattern)))
+        entry_ids = [key.rsplit(b":", 1)[1] for key in keys]
+        entries = await self.__load_indexed_entries(graph_name, entry_ids, entry_type)
+
+        pipeline = self.redis_db.pipeline(transaction=False)
+        if entry_ids:
+            pipeline.sadd(self.__entry_index_key(graph_name, entry_type), *entry_ids)
+        for entry in entries:
+            self.__queue_level_index(pipeline, graph_name, entry)
+        pipeline.set(self.__entries_indexed_key(graph_name, entry_type), 1)
+        await self.__run(pipeline.execute)
+        return entries
+
+    async def __load_indexed_entries(
+        self, graph_name: str, entry_ids: Iterable[bytes], entry_type: Type
+    ) -> List[Type]:
+        """
+        Entries from IDs in an index set, in ID order
+        """
+        entry_ids = sorted(
+            (entry_id.decode("utf-8") for entry_id in entry_ids), key=int
+        )
+        entries = await self.load_entries_by_ids(graph_name, entry_ids, entry_type)
+        # skip IDs of entries that have since been deleted
+        return [entry for entry in entries if entry is not None]
+
+    async def load_entries_by_ids(
+        self, graph_name: str, entry_ids: Iterable, entry_type: Type
+    ) -> List[Optional[Type]]:
+        """
+        Load many entries of a graph by ID with pipelined reads
+
+        Args:
+            graph_name (str): Name of graph the entries are in
+            entry_ids (Iterable): IDs of the entries
+            entry_type (Type): Dataclass of the entries
+
+        Returns:
+            list of dataclass entries in the same order as the IDs, None
+            where there is no entry with an ID
+        """
+        graph_name = await self.graph_version(graph_name)
+        keys = [
+            f"{entry_type.__name__}:{graph_name}:{str(entry_id)}"
+            for entry_id in entry_ids
+        ]
+        return await self.load_entries_by_keys(keys, entry_type)
+
+    async def load_entries_by_keys(
+        self, keys: Iterable[str], entry_type: Type
+    ) -> List[Type]:
+        """
+        Load many entries with pipelined reads, one round trip per
+        pipeline_size entries
+
+        Args:
+            keys (Iterable[str]): Keys of the entries
+            entry_type (Type): Dataclass of the entries
+
+        Returns:
+            list of dataclass entries in the same order as the keys, None
+            where a key doesn't exist
+        """
+        entries = []
+        for batch in self.__batches(keys, self.pipeline_size):
+            pipeline = self.redis_db.pipeline(transaction=False)
+            for key in batch:
+                pipeline.hgetall(key)
+
+            for entry in await self.__run(pipeline.execute):
+                entries.append(
+                    self.__decode_entry(entry, entry_type) if entry else None
+                )
+
         return entries
 
     async def load_entry(self, key: str, entry_type: Type) -> Type:
@@ -297,10 +972,16 @@ class Controller:
         Returns:
             dataclass object of entry
         """
-        entry = self.redis_db.hgetall(key)
+        entry = await self.__run(self.redis_db.hgetall, key)
+        return self.__decode_entry(entry, entry_type)
 
+    def __decode_entry(self, entry: dict, entry_type: Type) -> Type:
+        """
+        Turn a raw hash from redis into a dataclass
+        """
         # decode binary strings (utf-8) -> python string
         entry = {k.decode("utf-8"): v.decode("utf-8") for k, v in entry.items()}
+        entry.pop(VERSION_FIELD, None)
 
         return self.__flat_dict_to_dataclass(entry, entry_type)
 
@@ -318,33 +999,117 @@ class Controller:
         Returns:
             dataclass object of entry
         """
+        graph_name = await self.graph_version(graph_name)
         key = f"{entry_type.__name__}:{graph_name}:{str(entry_id)}"
         return await self.load_entry(key, entry_type)
 
-    async def add_entries(self, graph_name: str, entries: List[Type]) -> None:
+    async def add_entries(
+        self, graph_name: str, entries: List[Type], entry_type: Optional[Type] = None
+    ) -> None:
         """
-        Adds a generic record from a list of dataclasses
+        Adds a generic record from a list of dataclasses, with pipelined
+        writes (one round trip per pipeline_size entries)
+
+        These should be all the entries of their type in the graph, as the
+        type is marked indexed
 
         Args:
             graph_name (str): name of the graph this PoI is identified
                               with
             entries (List[Type]): list of dataclass objects to add to db
                                   dataclass must have 'id' field
+            entry_type (Type): type of the entries, so it's marked even if
+                               there are none
+        """
+        # marked even with no entries, so loading them doesn't scan for
+        # entries written before they were indexed
+        entry_types = {type(entry) for entry in entries}
+        if entry_type is not None:
+            entry_types.add(entry_type)
+        for indexed_type in entry_types:
+            await self.__run(
+                self.redis_db.set,
+                self.__entries_indexed_key(graph_name, indexed_type),
+                1,
+            )
+        for batch in self.__batches(entries, self.pipeline_size):
+            pipeline = self.redis_db.pipeline(transaction=False)
+            for entry in batch:
+                self.__queue_entry(pipeline, graph_name, entry)
+            await self.__run(pipeline.execute)
+
+    def __queue_entry(self, pipeline, graph_name: str, entry: Type) -> None:
+        """
+        Queue the commands to write an entry and add it to the index sets
+        """
+        mapping = dataclasses.asdict(entry, dict_factory=self.__dataclass_to_flat_dict)
+        mapping[VERSION_FIELD] = graph_name
+        pipeline.hset(self.__entry_key(graph_name, entry), mapping=mapping)
+        pipeline.sadd(self.__entry_index_key(graph_name, type(entry)), entry.id)
+        self.__queue_level_index(pipeline, graph_name, entry)
+
+    def __queue_level_index(self, pipeline, graph_name: str, entry: Type) -> None:
+        """
+        Queue the commands to add an entry to the index set of its level
+        """
+        entry_type = type(entry)
+        pipeline.sadd(
+            self.__entry_index_key(graph_name, entry_type, entry.level), entry.id
+        )
+        pipeline.sadd(
+            self.__entry_levels_key(graph_name, entry_type), float(entry.level)
+        )
+
+    @staticmethod
+    def __entry_key(graph_name: str, entry: Type) -> str:
+        """
+        Key of the hash an entry is stored in
         """
-        await asyncio.gather(*[self.add_entry(graph_name, entry) for entry in entries])
+        return f"{type(entry).__name__}:{graph_name}:{str(entry.id)}"
+
+    @staticmethod
+    def __entry_index_key(
+        graph_name: str, entry_type: Type, level: Optional[float] = None
+    ) -> str:
+        """
+        Key of the set of IDs of every entry of a type in a graph (or on
+        one level of it), so they can be listed without scanning the whole
+        keyspace
+        """
+        if level is None:
+            return f"Entries:{entry_type.__name__}:{graph_name}"
+        return f"LevelEntries:{entry_type.__name__}:{graph_name}:{float(level)}"
+
+    @staticmethod
+    def __entries_indexed_key(graph_name: str, entry_type: Type) -> str:
+        """
+        Key marking that every entry of a type in a graph is in the index
+        sets, set when all of them are written or once they're indexed
+        """
+        return f"IndexedEntries:{entry_type.__name__}:{graph_name}"
+
+    @staticmethod
+    def __entry_levels_key(graph_name: str, entry_type: Type) -> str:
+        """
+        Key of the set of levels with entries of a type in a graph
+        """
+        return f"Levels:{entry_type.__name__}:{graph_name}"
 
     async def add_entry(self, graph_name: str, entry: Type) -> None:
         """
         Add a record to a given graph_name
 
+        This doesn't mark its type indexed, the graph may have entries
+        written before the index sets which are still to be found
+
         Args:
             graph_name (str): name of the graph this room is in
             entry (Type): Generic dataclass object
                           dataclass must have 'id' field
         """
-        entry_id = f"{type(entry).__name__}:{graph_name}:{str(entry.id)}"
-        mapping = dataclasses.asdict(entry, dict_factory=self.__dataclass_to_flat_dict)
-        self.redis_db.hset(entry_id, mapping=mapping)
+        pipeline = self.redis_db.pipeline(transaction=False)
+        self.__queue_entry(pipeline, graph_name, entry)
+        await self.__run(pipeline.execute)
 
     async def search_poi_by_name(self, poi_name: str) -> List[PoI]:
         """
@@ -356,55 +1121,109 @@ class Controller:
         Returns:
             Dictionary of POIs that match poi_name search string
         """
-        res = self.poi_search_client.search(poi_name)
-        pois = []
+        res, versions = await asyncio.gather(
+            self.__run(self.poi_search_client.search, poi_name),
+            self.__run(self.redis_db.hgetall, VERSIONS_KEY),
+        )
+        versions = {
+            graph.decode("utf-8"): version.decode("utf-8")
+            for graph, version in versions.items()
+        }
+        return self.__search_results(res.docs, PoI, versions)
+
+    async def search_poi_by_name_in_graph(
+        self,
+        graph: str,
+        poi_name: str,
+        offset: int = 0,
+        limit: int = SEARCH_LIMIT,
+    ) -> List[PoI]:
+        """
+        Search for PoIs in one graph, the graph is filtered on by the index
 
-        for doc in res.docs:
-            # transform back to the standard form
-            poi = doc.__dict__
-            # remove payload object that search returns
-            poi.pop("payload")
-            # remove prefix from redis db
-            poi["id"] = poi["id"].rsplit(":", 1)[1]
+        Args:
+            graph (str): name of the graph to search in
+            poi_name (str): Search string for the POI
+            offset (int): number of results to skip
+            limit (int): maximum number of results
 
-            poi_object = self.__flat_dict_to_dataclass(poi, PoI)
-            pois.append(poi_object)
+        Returns:
+            List of POIs that match poi_name search string
+        """
+        version = await self.graph_version(graph)
+        quer = Query(f"{self.__version_filter(graph, version)} ({poi_name})")
+        quer.paging(offset, limit)
+        res = await self.__run(self.poi_search_client.search, quer)
 
-        return pois
+        return self.__search_results(res.docs, PoI, {graph: version})
 
-    async def search_poi_by_name_in_graph(self, graph: str, poi_name: str) -> List[PoI]:
+    async def search_rooms(
+        self,
+        graph_name: str,
+        search_string: str,
+        offset: int = 0,
+        limit: int = SEARCH_LIMIT,
+    ) -> List[Polygon]:
         """
-        Search then filter for the graph you are looking for
-        probably a nicer way of doing this really lol
+        Search for room by name in one graph
+
+        Args:
+            graph_name (str): name of the graph to search in
+            search_string (str): search string
+            offset (int): number of results to skip
+            limit (int): maximum number of results
         """
-        results = await self.search_poi_by_name(poi_name)
-        return [r for r in results if r.graph == graph]
+        # First search the rooms keys for the search string, in brackets
+        # so the graph filter applies to all of it (e.g. "a | b")
+        version = await self.graph_version(graph_name)
+        quer = Query(f"{self.__version_filter(graph_name, version)} ({search_string})")
+        quer.slop(2).paging(offset, limit)
+        res = await self.__run(self.room_search_client.search, quer)
 
-    async def search_rooms(
-        self, graph_name: str, search_string: str
-    ) -> Tuple[List[Polygon]]:
+        return self.__search_results(res.docs, Polygon, {graph_name: version})
+
+    def __version_filter(self, graph_name: str, version: str) -> str:
+        """
+        Search filter for the entries of a version of a graph
         """
-        Search for room by name
+        if version == graph_name:
+            # unversioned, entries written before versions don't have one
+            return f"@graph:{{{self.__escape_tag(graph_name)}}}"
+        return f"@{VERSION_FIELD}:{{{self.__escape_tag(version)}}}"
+
+    def __search_results(
+        self, docs: list, entry_type: Type, versions: Dict[str, str]
+    ) -> List[Type]:
         """
-        # First search the rooms keys for the search string
-        quer = Query(search_string).slop(2)
-        quer._num = 25
-        res = self.room_search_client.search(quer)
+        Entries from search results, skipping those of versions that aren't
+        live (being imported or kept for rollback)
 
-        rooms = []
-        for doc in res.docs:
+        Args:
+            versions (Dict[str, str]): graph name -> live version, graphs
+                that aren't in it are unversioned
+        """
+        entries = []
+        for doc in docs:
             # transform back to the standard form
-            room = doc.__dict__
-            room.pop("payload")
+            entry = doc.__dict__
+            # remove payload object that search returns
+            entry.pop("payload")
             # remove prefix from redis db
-            room["id"] = room["id"].rsplit(":", 1)[1]
-            room_object = self.__flat_dict_to_dataclass(room, Polygon)
-            rooms.append(room_object)
+            entry["id"] = entry["id"].rsplit(":", 1)[1]
 
-        return [r for r in rooms if r.graph == graph_name]
+            graph = entry["graph"]
+            if entry.pop(VERSION_FIELD, graph) != versions.get(graph, graph):
+                continue
+            entries.append(self.__flat_dict_to_dataclass(entry, entry_type))
+
+        return entries
 
     async def search_room_nodes(
-        self, graph_name: str, search_string: str
+        self,
+        graph_name: str,
+        search_string: str,
+        offset: int = 0,
+        limit: int = SEARCH_LIMIT,
     ) -> List[PathNode]:  # noqa: E501
         """
         Search for room nodes by name
@@ -412,16 +1231,19 @@ class Controller:
         Args:
             graph_name (str): name of the graph to search in
             search_string (str): search string
+            offset (int): number of rooms to skip
+            limit (int): maximum number of rooms
 
         Returns:
             List of node objects
         """
-        rooms = await self.search_rooms(graph_name, search_string)
+        rooms = await self.search_rooms(graph_name, search_string, offset, limit)
         if not rooms:
             # If there are no rooms in the search don't do anything
             return []
 
         nodes = []
+        graph_name = await self.graph_version(graph_name)
 
         for room in rooms:
             poly_id = room.id
@@ -429,7 +1251,7 @@ class Controller:
             graph = Graph(graph_name, self.redis_db)
 
             query = """MATCH (n:way {poly_id: $poly_id}) RETURN n"""
-            res = graph.query(query, {"poly_id": poly_id})
+            res = await self.__run(graph.query, query, {"poly_id": poly_id})
             nodes.append(self.__redisgraph_result_to_node(res)[0])
 
         return nodes
@@ -447,13 +1269,69 @@ class Controller:
         Returns:
             List of neighbouring node objects
         """
+        graph_name = await self.graph_version(graph_name)
         graph = Graph(graph_name, self.redis_db)
 
         query = """MATCH (:way {id: $node_id})-->(m:way) RETURN m"""
-        res = graph.query(query, {"node_id": node_id})
+        res = await self.__run(graph.query, query, {"node_id": node_id})
         nodes = self.__redisgraph_result_to_node(res)
         return nodes
 
+    async def get_neighbours_of_nodes(
+        self, graph_name: str, node_ids: List[int]
+    ) -> List[List[PathNode]]:
+        """
+        Returns the neighbouring nodes of many nodes with one query
+
+        Args:
+            graph_name (str): name of graph to query
+            node_ids (List[int]): IDs of nodes you want neighbours of
+
+        Returns:
+            List of neighbouring node objects for each ID
+        """
+        graph_name = await self.graph_version(graph_name)
+        graph = Graph(graph_name, self.redis_db)
+
+        query = """UNWIND $node_ids AS node_id
+                   MATCH (:way {id: node_id})-->(m:way) RETURN node_id, m"""
+        res = await self.__run(graph.query, query, {"node_ids": list(node_ids)})
+
+        neighbours = {node_id: [] for node_id in node_ids}
+        for node_id, node in res.result_set:
+            neighbours[node_id].append(
+                self.__flat_dict_to_dataclass(node.properties, PathNode)
+            )
+
+        return [neighbours[node_id] for node_id in node_ids]
+
+    async def get_nodes_by_ids(
+        self, graph_name: str, node_ids: List[int]
+    ) -> List[Optional[PathNode]]:
+        """
+        Get many nodes by ID with one query
+
+        Args:
+            graph_name (str): Name of the graph to find the nodes in
+            node_ids (List[int]): Integer IDs of the nodes
+
+        Returns:
+            List of node objects in the same order as the IDs, None where
+            there is no node with an ID
+        """
+        graph_name = await self.graph_version(graph_name)
+        graph = Graph(graph_name, self.redis_db)
+
+        query = """UNWIND $node_ids AS node_id
+                   MATCH (n:way {id: node_id}) RETURN n"""
+        res = await self.__run(graph.query, query, {"node_ids": list(node_ids)})
+
+        nodes = {}
+        for node in self.__redisgraph_result_to_node(res):
+            nodes.setdefault(node.id, node)
+
+        return [nodes.get(node_id) for node_id in node_ids]
+
     async def get_node_by_id(self, graph_name: str, node_id: int) -> PathNode:
         """
         Get one node by it's ID
@@ -462,10 +1340,11 @@ class Controller:
             graph_name (str): Name of the graph to find the node in
             node_id (str): Integer ID of the node
         """
+        graph_name = await self.graph_version(graph_name)
         graph = Graph(graph_name, self.redis_db)
 
         query = """MATCH (n:way {id: $id}) RETURN n"""
-        res = graph.query(query, {"id": node_id})
+        res = await self.__run(graph.query, query, {"id": node_id})
 
         if len(res.result_set) == 0:
             raise IndexError("No node with ID found in database")
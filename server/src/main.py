@@ -3,15 +3,29 @@
 """
 import importlib.resources
 import uvicorn
-from ariadne import make_executable_schema
+from ariadne import make_executable_schema, upload_scalar
 from ariadne.asgi import GraphQL
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
 from src.api.types import query, node, edge, poi, polygon, mutation
+from src.api.api_database import db
+from src.api.loaders import Loaders
+from src.api.routes import snapshot_endpoint
 from src import api
 
 
+def get_context(request, *_):
+    """
+    Context of one GraphQL request, with fresh batching loaders so
+    nothing is cached between requests
+    """
+    return {"request": request, "loaders": Loaders(db)}
+
+
 def app():
     """
-    Setup schema and create the graphQL ASGI app
+    Setup schema and create the ASGI app, serving graphQL and the map
+    snapshots
     """
     # create schema
     schema = importlib.resources.read_text(api, "schema.graphql")
@@ -23,10 +37,18 @@ def app():
         polygon.polygon,
         poi.poi,
         mutation.mutation,
+        upload_scalar,
     )
 
     # Create an ASGI app using the schema, running in debug mode
-    asgi_app = GraphQL(exe_schema, debug=True)
+    graphql_app = GraphQL(exe_schema, context_value=get_context, debug=True)
+
+    asgi_app = Starlette(
+        routes=[
+            Route("/snapshot/{graph}", snapshot_endpoint, methods=["GET"]),
+            Mount("/", app=graphql_app),
+        ]
+    )
 
     return asgi_app
 
@@ -0,0 +1,185 @@
+"""
+    Incremental reading of GeoJSON FeatureCollections
+
+    Features are decoded one at a time from a file read in chunks, so a
+    large map never has to be held in memory as a whole (both as text and
+    as decoded JSON) before it is parsed.
+"""
+import codecs
+import json
+from typing import IO, Iterable, Iterator, Union
+
+# Characters (or bytes) read from the file at a time
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = " \t\n\r"
+
+
+class FeatureReader:
+    """
+    Decodes the members of a FeatureCollection from a file, keeping only
+    the undecoded part of the current chunk in memory
+    """
+
+    def __init__(self, file: IO, chunk_size: int = CHUNK_SIZE):
+        """
+        Args:
+            file (IO): text or binary (UTF-8) file holding a FeatureCollection
+            chunk_size (int): characters or bytes to read at a time
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.__decoder = json.JSONDecoder()
+        self.__bytes_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def __read(self) -> bool:
+        """
+        Append the next chunk of the file to the buffer, dropping what has
+        been decoded already. False at the end of the file
+        """
+        if self.eof:
+            return False
+
+        chunk = self.file.read(self.chunk_size)
+        while isinstance(chunk, bytes):
+            data = chunk
+            chunk = self.__bytes_decoder.decode(data, final=not data)
+            # the chunk ended part way through a character
+            if data and not chunk:
+                chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+
+        position, self.position = self.position, 0
+        self.buffer = self.buffer[position:] + chunk
+        return not self.eof
+
+    def __skip_whitespace(self) -> None:
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position] in WHITESPACE
+            ):
+                self.position += 1
+            if self.position < len(self.buffer) or not self.__read():
+                return
+
+    def peek(self) -> str:
+        """
+        Next non-whitespace character, "" at the end of the file
+        """
+        self.__skip_whitespace()
+        if self.position < len(self.buffer):
+            return self.buffer[self.position]
+        return ""
+
+    def expect(self, token: str) -> None:
+        """
+        Consume a single character token
+
+        Raises:
+            json.JSONDecodeError if the next character is something else
+        """
+        if self.peek() != token:
+            raise json.JSONDecodeError(
+                f"Expecting '{token}'", self.buffer, self.position
+            )
+        self.position += 1
+
+    def value(self):
+        """
+        Decode the next JSON value, reading more of the file until it is
+        complete
+        """
+        self.__skip_whitespace()
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.__read():
+                    continue
+                raise
+
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.__read():
+                continue
+
+            self.position = end
+            return value
+
+    def features(self) -> Iterator[dict]:
+        """
+        Decode the "features" of the FeatureCollection one at a time, any
+        other members of the collection are decoded and ignored
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            return
+
+        while True:
+            key = self.value()
+            self.expect(":")
+
+            if key == "features":
+                self.expect("[")
+                if self.peek() != "]":
+                    while True:
+                        yield self.value()
+                        if self.peek() != ",":
+                            break
+                        self.position += 1
+                self.expect("]")
+            else:
+                self.value()
+
+            if self.peek() != ",":
+                break
+            self.position += 1
+
+        self.expect("}")
+
+
+def iter_features(file: IO, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Iterate over the features of a GeoJSON FeatureCollection file
+
+    Raises:
+        json.JSONDecodeError if the file isn't a valid JSON object
+    """
+    return FeatureReader(file, chunk_size).features()
+
+
+def iter_feature_file(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Iterate over the features of a GeoJSON FeatureCollection at path, the
+    file is open until the iterator is exhausted
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        yield from iter_features(file, chunk_size)
+
+
+class FeatureFile:
+    """
+    The features of a GeoJSON FeatureCollection file, read from the file
+    again every time they're iterated (unlike iter_feature_file)
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter_feature_file(self.path, self.chunk_size)
+
+
+def features(collection: Union[dict, Iterable[dict]]) -> Iterable[dict]:
+    """
+    Features of a decoded FeatureCollection, or the features themselves
+    if given an iterable of them (e.g. from iter_features)
+    """
+    if isinstance(collection, dict):
+        return collection["features"]
+    return collection
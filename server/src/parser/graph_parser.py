@@ -9,93 +9,41 @@
         parser = Parser(<<path to directory containing json files>>)
 """
 import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
 import shapely.geometry
+from src.parser.geojson_stream import features
+from src.parser.kd_tree import KDTree
 from src.parser.polygon_parser import PolygonParser
 from src.types.map_types import PathNode, PoI
 
 
-class Parser:
-    """Parser for GeoJSON maps"""
+class WayParser:
+    """
+    Path nodes and edges of LineString features, features share a node
+    where they have a point with the same coordinates on the same level
+    """
 
-    def __init__(self, graph_name, polygons, linestring, points):
-        """
-        Call this to create the object
-        """
-        self.log = logging.getLogger(__name__)
+    def __init__(self, graph_name):
         self.graph_name = graph_name
-        self.poly_parser = PolygonParser(graph_name, polygons)
-        self.json_linestring = linestring
-        self.json_points = points
-
-        # This in theory might take a while so maybe async?
-        self.poly_parser.load_polygons()
-
-        self.edges = []
         self.nodes = []
-        self.pois = []
-        self.polygons = self.poly_parser.polygons
+        self.edges = []
+        # where each node and edge was first made, (feature index, point
+        # index), these order the nodes of several WayParsers when merged
+        self.node_keys = []
+        self.edge_keys = []
 
-        # polygons dictionary that has Pygeodesy object
+        # (point, level) -> node ID
         self.__node_hashes = {}
 
-        self.parse_nodes()
-        self.nodes = self.poly_parser.parse_rooms(self.nodes)
-        self.parse_pois()
-        self.edges += self.poly_parser.connect_stairways(self.nodes)
-
-    @staticmethod
-    def _nearest_node(point, nodes: list) -> int:
-        """
-        Finds the nearest node's ID in a list of nodes
-
-        Args:
-            point_lat_lon (LatLon): This should be a pygeodesy LatLon of
-                                    the point you wish to find the closest
-                                    node to
-            nodes (list[dict]): List of nodes that are to be checked
-        """
-        # if there's only one node, don't bother checking distances
-        if len(nodes) == 1:
-            return nodes[0].id
-
-        if len(nodes) == 0:
-            return None
-
-        nearest = None
-        min_distance = float("inf")
-
-        for node in nodes:
-            node_point = shapely.geometry.Point(node.lat, node.lon)
-            distance = point.distance(node_point)
-
-            if distance < min_distance:
-                nearest = node
-                min_distance = distance
-
-        return nearest.id
-
-    def parse_nodes(self):
-        """
-        Parse nodes from the Ways.json layer of a given map
-        Ways.json should be GEOJson file containing only LineString
-        features (no MultiLineString).
-
-        Also assigns to edges (sparse adajcency matrix)
-
-        Edges are tuples of 2 ids (in self.nodes)
-        """
-        return [
-            self.parse_node_feature(feature)
-            for feature in self.json_linestring["features"]
-        ]
-
-    def parse_node_feature(self, feature):
+    def parse_node_feature(self, feature, feature_index=0):
         """
         Parse a single feature from the Ways.json file
 
         Args:
             feature (dict): A geojson format dict describing a single
             feature
+            feature_index (int): position of the feature in the file
         """
         prev_id = -1
 
@@ -103,15 +51,13 @@ class Parser:
         if feature["geometry"] is None:
             return
 
-        for point in feature["geometry"]["coordinates"]:
+        point_level = feature["properties"]["level"]
+        for point_index, point in enumerate(feature["geometry"]["coordinates"]):
             point = (point[0], point[1])
-            point_level = feature["properties"]["level"]
+            key = (feature_index, point_index)
             # is p already in self.nodes ?
-            if (
-                point in self.__node_hashes
-                and self.__node_hashes[point]["level"] == point_level
-            ):
-                node_id = self.__node_hashes[point]["id"]
+            if (point, point_level) in self.__node_hashes:
+                node_id = self.__node_hashes[(point, point_level)]
             else:
                 # Id for the current node
                 node_id = len(self.nodes)
@@ -128,16 +74,306 @@ class Parser:
                         feature["properties"],
                     )
                 )
+                self.node_keys.append(key)
 
-                self.__node_hashes[point] = {"level": point_level, "id": node_id}
+                self.__node_hashes[(point, point_level)] = node_id
 
             # Append a new edge
             if prev_id != -1:
                 self.edges.append((prev_id, node_id))
+                self.edge_keys.append(key)
 
             # Store id
             prev_id = node_id
 
+
+def mean_cos_lat(lats) -> float:
+    """
+    Cosine of the mean of some latitudes, used to project points near them
+    """
+    lats = list(lats)
+    if not lats:
+        return 1.0
+    return math.cos(math.radians(sum(lats) / len(lats)))
+
+
+def poi_room(poly_parser, poi):
+    """
+    Room a GeoJSON PoI is in, or None
+    """
+    point = poi["geometry"]["coordinates"]
+    poi_lat_lon = shapely.geometry.Point(point[1], point[0])
+    return poly_parser.in_poly(poi_lat_lon, float(poi["properties"]["level"]))
+
+
+class NearestNodes:
+    """
+    KD-trees of the nodes in every room and of the path nodes on every
+    level, so each PoI is matched without scanning every node
+    """
+
+    def __init__(self, nodes, cos_lat=1.0):
+        """
+        Args:
+            nodes (List[PathNode]): nodes to match to, with their rooms
+            cos_lat (float): cosine of the latitude points are near
+        """
+        self.cos_lat = cos_lat
+
+        room_nodes = {}
+        level_nodes = {}
+        for node in nodes:
+            if node.poly_id != -1:
+                room_nodes.setdefault(node.poly_id, []).append(node)
+            if node.tags.get("indoor") == "way":
+                level_nodes.setdefault(float(node.level), []).append(node)
+
+        def tree(nodes):
+            points = [self.project(n.lat, n.lon) for n in nodes]
+            return KDTree(points), [n.id for n in nodes]
+
+        # poly_id or level -> (tree, node IDs)
+        self.room_trees = {key: tree(nodes) for key, nodes in room_nodes.items()}
+        self.level_trees = {key: tree(nodes) for key, nodes in level_nodes.items()}
+
+    def project(self, lat: float, lon: float):
+        """
+        Planar (x, y) of a point, degrees of longitude are shortened so
+        distances are roughly the same in every direction
+        """
+        return (lon * self.cos_lat, lat)
+
+    def nearest(self, room, poi):
+        """
+        ID of the node nearest to a GeoJSON PoI in its room, or if it isn't
+        in a room (or the room has no nodes) the nearest path node on its
+        level, None if there are neither
+        """
+        level = float(poi["properties"]["level"])
+        if room is not None and room.id in self.room_trees:
+            tree, node_ids = self.room_trees[room.id]
+        elif level in self.level_trees:
+            tree, node_ids = self.level_trees[level]
+        else:
+            return None
+
+        point = poi["geometry"]["coordinates"]
+        x, y = self.project(point[1], point[0])
+        return node_ids[tree.nearest(x, y)]
+
+
+def parse_level(
+    graph_name, polygons, indexed_features, indexed_pois, cos_lat, shared_rooms
+):
+    """
+    Parse the LineString features on one level, find the rooms of their
+    nodes and match the PoIs on the level, run in a worker process by
+    Parser
+
+    Args:
+        graph_name (str): name of the graph
+        polygons (List[Polygon]): polygons on the level
+        indexed_features (List[Tuple[int, dict]]): LineString features on
+            the level, with their position in the file
+        indexed_pois (List[Tuple[int, dict]]): PoIs on the level, with
+            their position in the file
+        cos_lat (float): cosine of the mean latitude of every node
+        shared_rooms (Set[int]): IDs of rooms on more than one level, PoIs
+            in these aren't matched as their nodes aren't all on the level
+
+    Returns:
+        the level's nodes, edges (between local node IDs), their keys, and
+        PoI position -> local ID of its nearest node
+    """
+    poly_parser = PolygonParser(graph_name, {"features": []})
+    poly_parser.use_polygons(polygons)
+
+    ways = WayParser(graph_name)
+    for feature_index, feature in indexed_features:
+        ways.parse_node_feature(feature, feature_index)
+    nodes = poly_parser.parse_rooms(ways.nodes)
+
+    nearest_nodes = NearestNodes(nodes, cos_lat)
+    matches = {}
+    for poi_index, poi in indexed_pois:
+        room = poi_room(poly_parser, poi)
+        if room is None or room.id not in shared_rooms:
+            matches[poi_index] = nearest_nodes.nearest(room, poi)
+
+    return nodes, ways.node_keys, ways.edges, ways.edge_keys, matches
+
+
+class Parser:
+    """Parser for GeoJSON maps"""
+
+    def __init__(self, graph_name, polygons, linestring, points, workers=1):
+        """
+        Call this to create the object
+
+        Each layer is a GeoJSON FeatureCollection, or an iterable of its
+        features (e.g. streamed from a file), which is read once
+
+        With more than one worker the levels of the map are parsed in
+        parallel processes, giving the same result as parsing serially
+        """
+        self.log = logging.getLogger(__name__)
+        self.graph_name = graph_name
+        self.poly_parser = PolygonParser(graph_name, polygons)
+        self.json_linestring = linestring
+        self.json_points = points
+        self.workers = workers
+
+        # This in theory might take a while so maybe async?
+        self.poly_parser.load_polygons()
+
+        self.edges = []
+        self.nodes = []
+        self.pois = []
+        self.polygons = self.poly_parser.polygons
+
+        if workers > 1:
+            self.parse_levels()
+        else:
+            self.parse_nodes()
+            self.parse_pois()
+        self.edges += self.poly_parser.connect_stairways(self.nodes)
+
+    def parse_nodes(self):
+        """
+        Parse nodes from the Ways.json layer of a given map, and find the
+        room each is in
+        Ways.json should be GEOJson file containing only LineString
+        features (no MultiLineString).
+
+        Also assigns to edges (sparse adajcency matrix)
+
+        Edges are tuples of 2 ids (in self.nodes)
+        """
+        ways = WayParser(self.graph_name)
+        for feature_index, feature in enumerate(features(self.json_linestring)):
+            ways.parse_node_feature(feature, feature_index)
+
+        self.nodes = self.poly_parser.parse_rooms(ways.nodes)
+        self.edges = ways.edges
+
+    def parse_levels(self):
+        """
+        parse_nodes and parse_pois with each level in a worker process,
+        levels only share nodes through stairways, connected afterwards
+        """
+        linestring = list(features(self.json_linestring))
+        levels = {}
+        # (point, level) -> lat of every node, in the order they're made
+        node_lats = {}
+        for feature_index, feature in enumerate(linestring):
+            if feature["geometry"] is None:
+                continue
+
+            level = feature["properties"]["level"]
+            levels.setdefault(float(level), []).append((feature_index, feature))
+            for point in feature["geometry"]["coordinates"]:
+                node_lats.setdefault(((point[0], point[1]), level), float(point[1]))
+        if len(levels) < 2:
+            # nothing to parse in parallel, the layer's been read so the
+            # features read are parsed instead
+            self.json_linestring = linestring
+            self.parse_nodes()
+            self.parse_pois()
+            return
+        cos_lat = mean_cos_lat(node_lats.values())
+
+        pois = list(features(self.json_points))
+        level_pois = {}
+        for poi_index, poi in enumerate(pois):
+            level = float(poi["properties"]["level"])
+            level_pois.setdefault(level, []).append((poi_index, poi))
+
+        level_polygons = {}
+        room_levels = {}
+        for poly in self.polygons:
+            level_polygons.setdefault(float(poly.level), []).append(poly)
+            room_levels.setdefault(poly.id, set()).add(float(poly.level))
+        shared_rooms = {room for room, spans in room_levels.items() if len(spans) > 1}
+
+        self.log.debug("Parsing %d levels in parallel", len(levels))
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(levels))) as pool:
+            futures = [
+                pool.submit(
+                    parse_level,
+                    self.graph_name,
+                    level_polygons.get(level, []),
+                    indexed_features,
+                    level_pois.get(level, []),
+                    cos_lat,
+                    shared_rooms,
+                )
+                for level, indexed_features in levels.items()
+            ]
+            results = [future.result() for future in futures]
+
+        node_ids = self.merge_levels(results)
+
+        matches = {}
+        for result, ids in zip(results, node_ids):
+            for poi_index, node_id in result[4].items():
+                matches[poi_index] = None if node_id is None else ids[node_id]
+
+        # PoIs in rooms on several levels, or on levels with no nodes
+        unmatched = [poi for index, poi in enumerate(pois) if index not in matches]
+        if unmatched:
+            unmatched_levels = {float(poi["properties"]["level"]) for poi in unmatched}
+            nearest_nodes = NearestNodes(
+                [
+                    node
+                    for node in self.nodes
+                    if node.poly_id in shared_rooms
+                    or float(node.level) in unmatched_levels
+                ],
+                cos_lat,
+            )
+            for index, poi in enumerate(pois):
+                if index not in matches:
+                    room = poi_room(self.poly_parser, poi)
+                    matches[index] = nearest_nodes.nearest(room, poi)
+
+        for index, poi in enumerate(pois):
+            self.add_poi(poi, matches[index])
+
+    def merge_levels(self, levels):
+        """
+        Merge the nodes and edges of levels parsed separately, giving nodes
+        the IDs they'd have had if the levels were parsed together
+
+        Args:
+            levels (list): parse_level result of each level
+
+        Returns:
+            the new ID of each level's nodes, by their ID on the level
+        """
+        keyed_nodes = []
+        for level, (nodes, node_keys, *_) in enumerate(levels):
+            keyed_nodes += [(key, level, node) for key, node in zip(node_keys, nodes)]
+        keyed_nodes.sort(key=lambda keyed: keyed[0])
+
+        node_ids = [[-1] * len(nodes) for nodes, *_ in levels]
+        self.nodes = []
+        for node_id, (_, level, node) in enumerate(keyed_nodes):
+            node_ids[level][node.id] = node_id
+            node.id = node_id
+            self.nodes.append(node)
+
+        keyed_edges = []
+        for level, (_, _, edges, edge_keys, _) in enumerate(levels):
+            ids = node_ids[level]
+            keyed_edges += [
+                (key, (ids[start], ids[end]))
+                for key, (start, end) in zip(edge_keys, edges)
+            ]
+        keyed_edges.sort(key=lambda keyed: keyed[0])
+        self.edges = [edge for _, edge in keyed_edges]
+
+        return node_ids
+
     def parse_pois(self):
         """
         Match points-of-interest to the nearest node in the ways nodes
@@ -151,33 +387,36 @@ class Parser:
             "nearest_path_node": int # ID of nearest in self.nodes
         }
         """
-        return [self.parse_poi(poi) for poi in self.json_points["features"]]
+        nearest_nodes = NearestNodes(
+            self.nodes, mean_cos_lat(n.lat for n in self.nodes)
+        )
+        return [
+            self.parse_poi(poi, nearest_nodes) for poi in features(self.json_points)
+        ]
 
-    def parse_poi(self, poi):
+    def parse_poi(self, poi, nearest_nodes):
         """
         Parses a single PoI, finds nearest path node to it
 
         Args:
             poi (dict): GeoJSON PoI object
+            nearest_nodes (NearestNodes): indices of the parsed nodes
         """
-        poi_id = len(self.pois)
-        point = poi["geometry"]["coordinates"]
-        poi_lat_lon = shapely.geometry.Point(point[1], point[0])
+        room = poi_room(self.poly_parser, poi)
+        self.add_poi(poi, nearest_nodes.nearest(room, poi))
 
-        room = self.poly_parser.in_poly(poi_lat_lon, float(poi["properties"]["level"]))
-
-        if room is not None:
-            poly_id = room.id
-
-            # Get only the path nodes that are in the current room
-            room_nodes = [n for n in self.nodes if n.poly_id == poly_id]
-            nearest_path_node = self._nearest_node(poi_lat_lon, room_nodes)
-        else:
-            nearest_path_node = None
+    def add_poi(self, poi, nearest_path_node):
+        """
+        Add a PoI, given its nearest path node
 
+        Args:
+            poi (dict): GeoJSON PoI object
+            nearest_path_node (Optional[int]): ID of the node nearest to it
+        """
+        point = poi["geometry"]["coordinates"]
         self.pois.append(
             PoI(
-                poi_id,
+                len(self.pois),
                 self.graph_name,
                 poi["properties"]["level"],
                 point[0],
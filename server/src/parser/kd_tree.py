@@ -0,0 +1,77 @@
+"""
+    2-d tree for nearest neighbour queries over a fixed set of points
+"""
+from typing import List, Tuple
+
+
+class KDTree:
+    """
+    Static 2-d tree, stored implicitly as a permutation of the points where
+    every subtree is a slice with its splitting point in the middle
+    """
+
+    def __init__(self, points: List[Tuple[float, float]]):
+        """
+        Args:
+            points (List[Tuple[float, float]]): (x, y) of every point,
+                coordinates should be planar (e.g. projected)
+        """
+        self.points = points
+        self.order = list(range(len(points)))
+
+        stack = [(0, len(points), 0)]
+        while stack:
+            low, high, axis = stack.pop()
+            if high - low <= 1:
+                continue
+
+            self.order[low:high] = sorted(
+                self.order[low:high], key=lambda index: points[index][axis]
+            )
+            middle = (low + high) // 2
+            stack.append((low, middle, 1 - axis))
+            stack.append((middle + 1, high, 1 - axis))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def nearest(self, x: float, y: float) -> int:
+        """
+        Index of the point nearest to (x, y), the lowest index if several
+        are equally near
+
+        Raises:
+            ValueError if the tree is empty
+        """
+        if not self.points:
+            raise ValueError("Nearest point of an empty tree")
+
+        best_distance = float("inf")
+        best_index = -1
+
+        # (low, high, axis, squared distance to the splitting line)
+        stack = [(0, len(self.points), 0, 0.0)]
+        while stack:
+            low, high, axis, bound = stack.pop()
+            if low >= high or bound > best_distance:
+                continue
+
+            middle = (low + high) // 2
+            index = self.order[middle]
+            point_x, point_y = self.points[index]
+
+            distance = (point_x - x) ** 2 + (point_y - y) ** 2
+            if (distance, index) < (best_distance, best_index):
+                best_distance, best_index = distance, index
+
+            offset = (x - point_x) if axis == 0 else (y - point_y)
+            below = (low, middle, 1 - axis)
+            above = (middle + 1, high, 1 - axis)
+            near, far = (below, above) if offset < 0 else (above, below)
+
+            # the far side is searched after the near side, if it can still
+            # hold something as near as the best found by then
+            stack.append((*far, offset * offset))
+            stack.append((*near, 0.0))
+
+        return best_index
@@ -4,19 +4,20 @@
     Decouples from parser, means we can async these
 """
 import os
-import json
+from src.parser.geojson_stream import FeatureFile
 
 
 class MapData:
     """
     Class that loads GeoJSON map files
+
+    The layers are streamed, polygons, linestring and points each read
+    their file feature by feature every time they're iterated, so they
+    can be iterated more than once
     """
 
     def __init__(self, path, graph_name=None):
         self.path = path
-        self.polygons = []
-        self.linestring = []
-        self.points = []
 
         if graph_name is not None:
             self.graph_name = graph_name
@@ -24,27 +25,23 @@ class MapData:
             # get graph_name from path
             self.graph_name = os.path.split(path)[-1]
 
-        self.load_polygons()
-        self.load_linestring()
-        self.load_points()
-
-    def load_polygons(self):
+    @property
+    def polygons(self) -> FeatureFile:
         """
-        Loads polygons from GeoJSON file
+        Features of the Polygons.json GeoJSON file
         """
-        with open(self.path + "/Polygons.json", "r", encoding="utf-8") as file:
-            self.polygons = json.loads(file.read())
+        return FeatureFile(self.path + "/Polygons.json")
 
-    def load_linestring(self):
+    @property
+    def linestring(self) -> FeatureFile:
         """
-        Loads linestrings from GeoJSON file
+        Features of the LineString.json GeoJSON file
         """
-        with open(self.path + "/LineString.json", "r", encoding="utf-8") as file:
-            self.linestring = json.loads(file.read())
+        return FeatureFile(self.path + "/LineString.json")
 
-    def load_points(self):
+    @property
+    def points(self) -> FeatureFile:
         """
-        Loads points from GeoJSON file
+        Features of the Points.json GeoJSON file
         """
-        with open(self.path + "/Points.json", "r", encoding="utf-8") as file:
-            self.points = json.loads(file.read())
+        return FeatureFile(self.path + "/Points.json")
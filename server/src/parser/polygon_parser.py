@@ -3,8 +3,12 @@
 """
 import logging
 import asyncio
-from typing import List, Tuple
+from itertools import combinations
+from typing import Iterable, List, Tuple, Union
 import shapely.geometry
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from src.parser.geojson_stream import features
 from src.types.map_types import Polygon, PathNode, PoI
 
 
@@ -13,12 +17,15 @@ class PolygonParser:
     Class that deals with polygon parsing and generating paths through them
     """
 
-    def __init__(self, graph_name: str, polygon_json: str):
+    def __init__(self, graph_name: str, polygon_json: Union[dict, Iterable[dict]]):
         self.log = logging.getLogger(__name__)
         self.graph_name = graph_name
         self.json_polygons = polygon_json
         self.polygons = []
         self.__geodesy_polygons = []
+        # level -> (R-tree of room polygons, prepared polygons, room IDs)
+        self.__level_index = {}
+        self.__lookup_polys = {}
 
     @staticmethod
     def nodes_between_adj_levels(nodes: List[PathNode]) -> List[Tuple[int, int]]:
@@ -34,32 +41,29 @@ class PolygonParser:
         Args:
             nodes (List[Pathnode]): List of pathnodes to connect
         Returns:
-            List of tuples containing the edges created between node IDs
+            List of tuples containing the edges created between node IDs,
+            each pair of nodes is connected once, from whichever is first
+            in the list
         """
-        # sorted list of unique levels
-        levels = sorted({n.level for n in nodes})
-        edges = []
-
+        levels = {}
         for node in nodes:
-            level_index = levels.index(node.level)
-
-            above_nodes = below_nodes = []
-            if level_index - 1 > 0:
-                below = levels[level_index - 1]
-                below_nodes = filter(lambda n, b=below: n.level == b, nodes)
-
-            if level_index + 1 < len(levels):
-                above = levels[level_index + 1]
-                above_nodes = filter(lambda n, a=above: n.level == a, nodes)
+            levels.setdefault(node.level, []).append(node)
 
-            adjacent_nodes = list(above_nodes) + list(below_nodes)
-
-            for adj in adjacent_nodes:
-                edges.append((node.id, adj.id))
+        # sorted list of unique levels
+        sorted_levels = sorted(levels)
+        adjacent_levels = {level: [] for level in sorted_levels}
+        for below, above in zip(sorted_levels, sorted_levels[1:]):
+            adjacent_levels[below].append(above)
+            adjacent_levels[above].append(below)
+        position = {id(node): index for index, node in enumerate(nodes)}
 
-            # we have exhausted this node's neighbours, since it's
-            # bidirectional we can just remove it to save iterations
-            nodes.remove(node)
+        edges = []
+        for index, node in enumerate(nodes):
+            for level in adjacent_levels[node.level]:
+                for adj in levels[level]:
+                    # the pair was connected when the earlier node was seen
+                    if position[id(adj)] > index:
+                        edges.append((node.id, adj.id))
 
         return edges
 
@@ -77,36 +81,51 @@ class PolygonParser:
         Args:
             nodes (List[Pathnode]): List of pathnodes to connect
         Returns:
-            List of tuples containing the edges created between node IDs
+            List of tuples containing the edges created between node IDs,
+            each pair of nodes is connected once
         """
-        edges = []
-
-        for node in nodes:
-            # don't join if they are on same level, probably these edges
-            # already exist, or if they dont they dont for a reason
-            for adj in nodes:
-                if adj.level != node.level:
-                    edges.append((node.id, adj.id))
-            # we have exhausted this node's neighbours, since it's
-            # bidirectional we can just remove it to save iterations
-            nodes.remove(node)
-
-        return edges
+        # don't join if they are on same level, probably these edges
+        # already exist, or if they dont they dont for a reason
+        return [
+            (node.id, adj.id)
+            for node, adj in combinations(nodes, 2)
+            if adj.level != node.level
+        ]
+
+    def __build_index(self):
+        """
+        Build an R-tree of the room polygons on each level, so in_poly only
+        tests the few rooms whose bounding boxes contain a point
+        """
+        rooms_by_level = {}
+        for room in self.__geodesy_polygons:
+            rooms_by_level.setdefault(room["level"], []).append(room)
+
+        self.__level_index = {
+            level: (
+                STRtree([room["polygon"] for room in rooms]),
+                [prep(room["polygon"]) for room in rooms],
+                [room["id"] for room in rooms],
+            )
+            for level, rooms in rooms_by_level.items()
+        }
+        self.__lookup_polys = {poly.id: poly for poly in self.polygons}
 
     def in_poly(self, node: shapely.geometry.Point, level: float):
         """
         Checks if a node is in a given room
-        first by bounding box then by isEnclosedBy
+        first by bounding box (R-tree) then by isEnclosedBy
         """
-        lookup_polys = {}
-        for poly in self.polygons:
-            lookup_polys[poly.id] = poly
+        if level not in self.__level_index:
+            return None
 
-        rooms_on_level = filter(lambda x: x["level"] == level, self.__geodesy_polygons)
+        tree, prepared, room_ids = self.__level_index[level]
 
-        for room in rooms_on_level:
-            if room["polygon"].contains(node):
-                return lookup_polys[room["id"]]
+        # rooms can overlap, test candidates in load order so the first
+        # room loaded wins
+        for index in sorted(tree.query(node)):
+            if prepared[index].contains(node):
+                return self.__lookup_polys[room_ids[index]]
 
         return None
 
@@ -116,21 +135,26 @@ class PolygonParser:
         """
         self.log.debug("Loading polygons")
 
-        level_range = {
-            str(n["properties"]["level"]) for n in self.json_polygons["features"]
-        }
-        level_range = sorted([level for level in level_range if ";" not in level])
-
-        for feature in self.json_polygons["features"]:
-            id = len(self.polygons)
+        # one pass over the features, as they may be streamed from a file,
+        # multi-level polygons are expanded once every level is known
+        rooms = []
+        level_range = set()
+        for feature in features(self.json_polygons):
             room = feature["geometry"]["coordinates"][0]
             # Important note: this means that the API returns the range
             # and the server expands it below, this might be quite confusing
             # when returning nodes vs polygons...
             level = feature["properties"]["level"]
-            properties = feature["properties"]
+            if ";" not in str(level):
+                level_range.add(str(level))
 
             vertices = [(v[1], v[0]) for v in room]
+            rooms.append((level, vertices, feature["properties"]))
+
+        level_range = sorted(level_range)
+
+        for level, vertices, properties in rooms:
+            id = len(self.polygons)
             geo_poly = shapely.geometry.Polygon(vertices)
 
             lats = [lat for lat, _ in vertices]
@@ -157,6 +181,26 @@ class PolygonParser:
                     Polygon(id, self.graph_name, span, vertices, NE, SW, properties)
                 )
 
+        self.__build_index()
+
+    def use_polygons(self, polygons: List[Polygon]):
+        """
+        Use polygons that have already been loaded (e.g. the ones on one
+        level, given to a worker process) instead of loading them again
+        """
+        self.polygons = list(polygons)
+        self.__geodesy_polygons = [
+            {
+                "id": poly.id,
+                "level": float(poly.level),
+                "polygon": shapely.geometry.Polygon(poly.vertices),
+                "tags": poly.tags,
+            }
+            for poly in self.polygons
+        ]
+
+        self.__build_index()
+
     def parse_rooms(self, nodes: List[PathNode]):
         """
         Give each node a name that corresponds
@@ -186,62 +230,40 @@ class PolygonParser:
         """
         Method to call to connect staircases in a list of nodes
         """
-        # TODO fix this to not work on wall edges
         self.log.debug("Generating stairway edges")
         total_edges = []
 
-        way_nodes = list(filter(lambda n: n.tags["indoor"] == "way", nodes))
-
-        for node in way_nodes:
-            if "indoor" in node.tags:
-                if node.tags["indoor"] == "wall":
-                    continue
-
-            self.log.debug("Adding edges for node: %s", node)
+        # path nodes grouped by the room they're in, walls aren't connected
+        room_nodes = {}
+        for node in nodes:
+            if node.tags.get("indoor") == "way":
+                room_nodes.setdefault(node.poly_id, []).append(node)
 
-            room = None
+        rooms = {}
+        for poly in self.__geodesy_polygons:
+            rooms.setdefault(poly["id"], poly)
 
-            for poly in self.__geodesy_polygons:
-                if poly["id"] == node.poly_id:
-                    self.log.debug("Found room: %s", poly["id"])
-                    room = poly
-                    break
+        for poly_id, same_room in room_nodes.items():
+            room = rooms.get(poly_id)
 
-            # Can't find the room for whatever reason, return none
+            # Can't find the room for whatever reason, skip it
             if room is None:
-                self.log.debug("Couldn't find room")
                 continue
 
             tags = room["tags"]
-            self.log.debug("Tags: %s", tags)
 
             # Ideally we'd be able to not rely on tags here but, given this
             # will do nothing for buildings that don't have these it's fine
-            if "stairs" not in tags and "highway" not in tags:
-                self.log.debug("%s, not a staircase or elevator", room)
-                continue
-
-            same_room = list(
-                filter(lambda n, node=node: node.poly_id == n.poly_id, way_nodes)
-            )
-
-            self.log.debug("Nodes in the same room: %s", same_room)
-
             if "stairs" in tags and tags["stairs"] is not None:
-                self.log.debug("%s is staircase", room["id"])
-                edges = self.nodes_between_adj_levels(same_room)
+                self.log.debug("%s is staircase", poly_id)
+                total_edges += self.nodes_between_adj_levels(same_room)
             elif "highway" in tags and tags["highway"] == "elevator":
-                self.log.debug("%s is elevator", room["id"])
-                edges = self.nodes_between_levels(same_room)
-            else:
-                # This is a for rooms that have highway tag but aren't lifts
-                edges = []
-
-            total_edges += edges
-
-        if total_edges:
-            self.log.debug(total_edges)
+                self.log.debug("%s is elevator", poly_id)
+                total_edges += self.nodes_between_levels(same_room)
+            # This is a for rooms that have highway tag but aren't lifts, or
+            # aren't staircases or elevators at all
 
+        self.log.debug("Generated %d stairway edges", len(total_edges))
         return total_edges
 
     async def create_room_paths(self, nodes: List[PathNode], pois: List[PoI]):
@@ -0,0 +1,328 @@
+"""
+    Contraction hierarchy for fast point to point routing
+
+    Nodes are contracted one by one in order of importance, adding shortcut
+    edges so that distances between the remaining nodes are preserved.
+    Queries are then a bidirectional Dijkstra that only ever moves to more
+    important nodes, which visits a tiny part of the graph.
+"""
+import heapq
+import logging
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+import networkx as nx
+
+# Version of the serialised format, bump when it changes
+FORMAT_VERSION = 1
+# Maximum nodes settled by a witness search before assuming a shortcut is
+# needed, more gives fewer shortcuts but slower preprocessing
+WITNESS_SETTLE_LIMIT = 60
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over an undirected weighted graph of node IDs
+    """
+
+    def __init__(
+        self,
+        node_ids: List[int],
+        rank: List[int],
+        upward: List[List[Tuple[int, float, int]]],
+    ):
+        """
+        Use build or from_dict to create a hierarchy
+
+        Args:
+            node_ids (List[int]): node ID of every index
+            rank (List[int]): contraction order of every index
+            upward (List[List[Tuple[int, float, int]]]): for every index,
+                edges (index, weight, middle index or -1) to higher ranked
+                indices, shortcuts have the index they bypass as middle
+        """
+        self.node_ids = node_ids
+        self.rank = rank
+        self.upward = upward
+        self.node_index = {node_id: index for index, node_id in enumerate(node_ids)}
+
+        # (lower index, higher index) -> middle index of shortcuts
+        self.middles = {}
+        for index, edges in enumerate(upward):
+            for neighbour, _, middle in edges:
+                if middle != -1:
+                    self.middles[self.__key(index, neighbour)] = middle
+
+    @staticmethod
+    def __key(a: int, b: int) -> Tuple[int, int]:
+        return (a, b) if a < b else (b, a)
+
+    @classmethod
+    def build(
+        cls, node_ids: List[int], edges: Iterable[Tuple[int, int, float]]
+    ) -> "ContractionHierarchy":
+        """
+        Preprocess a graph into a hierarchy
+
+        Args:
+            node_ids (List[int]): IDs of every node in the graph
+            edges (Iterable[Tuple[int, int, float]]): (node ID, node ID,
+                weight), edges can be travelled in both directions
+        """
+        log = logging.getLogger(__name__)
+        node_index = {node_id: index for index, node_id in enumerate(node_ids)}
+
+        # adjacency of the graph of nodes not yet contracted
+        adjacency = [{} for _ in node_ids]
+        middles = {}
+        for n, m, weight in edges:
+            i, j = node_index[n], node_index[m]
+            if i == j:
+                continue
+            if weight < adjacency[i].get(j, float("inf")):
+                adjacency[i][j] = weight
+                adjacency[j][i] = weight
+
+        contracted = [False] * len(node_ids)
+        contracted_neighbours = [0] * len(node_ids)
+        rank = [0] * len(node_ids)
+        upward = [[] for _ in node_ids]
+
+        def shortcuts(node):
+            """Shortcuts needed to contract a node"""
+            needed = []
+            neighbours = list(adjacency[node].items())
+            for index, (source, source_weight) in enumerate(neighbours):
+                targets = {
+                    target: source_weight + target_weight
+                    for target, target_weight in islice(neighbours, index + 1, None)
+                }
+                if not targets:
+                    continue
+
+                witnesses = _witness_search(
+                    adjacency, source, node, targets, max(targets.values())
+                )
+                for target, via in targets.items():
+                    if witnesses.get(target, float("inf")) > via:
+                        needed.append((source, target, via))
+            return needed
+
+        def priority(node, needed):
+            """Edge difference, plus a term to contract evenly"""
+            return len(needed) - len(adjacency[node]) + contracted_neighbours[node]
+
+        queue = [
+            (priority(node, shortcuts(node)), node) for node in range(len(node_ids))
+        ]
+        heapq.heapify(queue)
+        order = 0
+        total_shortcuts = 0
+
+        while queue:
+            _, node = heapq.heappop(queue)
+            if contracted[node]:
+                continue
+
+            # lazy update, put it back if it's no longer the least important
+            needed = shortcuts(node)
+            new_priority = priority(node, needed)
+            if queue and new_priority > queue[0][0]:
+                heapq.heappush(queue, (new_priority, node))
+                continue
+
+            for source, target, weight in needed:
+                if weight < adjacency[source].get(target, float("inf")):
+                    adjacency[source][target] = weight
+                    adjacency[target][source] = weight
+                    middles[cls.__key(source, target)] = node
+                    total_shortcuts += 1
+
+            for neighbour, weight in adjacency[node].items():
+                middle = middles.get(cls.__key(node, neighbour), -1)
+                upward[node].append((neighbour, weight, middle))
+                del adjacency[neighbour][node]
+                contracted_neighbours[neighbour] += 1
+
+            adjacency[node] = {}
+            contracted[node] = True
+            rank[node] = order
+            order += 1
+
+        log.debug(
+            "Contracted %d nodes with %d shortcuts", len(node_ids), total_shortcuts
+        )
+        return cls(list(node_ids), rank, upward)
+
+    def to_dict(self) -> dict:
+        """
+        Serialisable form of the hierarchy (for storing as JSON)
+        """
+        edges = [
+            [index, neighbour, weight, middle]
+            for index, node_edges in enumerate(self.upward)
+            for neighbour, weight, middle in node_edges
+        ]
+        return {
+            "version": FORMAT_VERSION,
+            "node_ids": self.node_ids,
+            "rank": self.rank,
+            "edges": edges,
+        }
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> Optional["ContractionHierarchy"]:
+        """
+        Load a hierarchy from to_dict output, None if the format is old
+        """
+        if dictionary.get("version") != FORMAT_VERSION:
+            return None
+
+        upward = [[] for _ in dictionary["node_ids"]]
+        for index, neighbour, weight, middle in dictionary["edges"]:
+            upward[index].append((neighbour, weight, middle))
+
+        return cls(dictionary["node_ids"], dictionary["rank"], upward)
+
+    def __search_step(self, queue, distances, parents, settled):
+        dist, node = heapq.heappop(queue)
+        if node in settled:
+            return
+        settled.add(node)
+
+        for neighbour, weight, _ in self.upward[node]:
+            new_dist = dist + weight
+            if new_dist < distances.get(neighbour, float("inf")):
+                distances[neighbour] = new_dist
+                parents[neighbour] = node
+                heapq.heappush(queue, (new_dist, neighbour))
+
+    def __unpack(self, a: int, b: int) -> List[int]:
+        """
+        Original path from a to b (not including a) of a possible shortcut
+        """
+        path = []
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            middle = self.middles.get(self.__key(a, b))
+            if middle is None:
+                path.append(b)
+            else:
+                # b side is pushed first so the a side is unpacked first
+                stack.append((middle, b))
+                stack.append((a, middle))
+        return path
+
+    def find_path(self, start_node: int, end_node: int) -> List[int]:
+        """
+        Shortest path between two node IDs
+
+        Raises:
+            nx.NodeNotFound and nx.NetworkXNoPath, as networkx does
+        """
+        for node in (start_node, end_node):
+            if node not in self.node_index:
+                raise nx.NodeNotFound(f"Node {node} is not in the hierarchy")
+
+        source = self.node_index[start_node]
+        target = self.node_index[end_node]
+
+        searches = []
+        for start in (source, target):
+            searches.append(
+                {
+                    "queue": [(0.0, start)],
+                    "distances": {start: 0.0},
+                    "parents": {start: None},
+                    "settled": set(),
+                }
+            )
+
+        best = float("inf")
+        meeting = None
+
+        while any(search["queue"] for search in searches):
+            for search, other in (searches, searches[::-1]):
+                if not search["queue"]:
+                    continue
+                # nothing left in this direction can improve on the best
+                if search["queue"][0][0] >= best:
+                    search["queue"].clear()
+                    continue
+
+                node = search["queue"][0][1]
+                self.__search_step(
+                    search["queue"],
+                    search["distances"],
+                    search["parents"],
+                    search["settled"],
+                )
+
+                if node in other["distances"]:
+                    total = search["distances"][node] + other["distances"][node]
+                    if total < best:
+                        best = total
+                        meeting = node
+
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"Node {end_node} not reachable from {start_node}")
+
+        # hierarchy path: source ... meeting ... target
+        forward = self.__chain(searches[0]["parents"], meeting)
+        backward = self.__chain(searches[1]["parents"], meeting)
+        hierarchy_path = forward + backward[::-1][1:]
+
+        path = [hierarchy_path[0]]
+        for a, b in zip(hierarchy_path, hierarchy_path[1:]):
+            path += self.__unpack(a, b)
+
+        return [self.node_ids[index] for index in path]
+
+    @staticmethod
+    def __chain(parents: Dict[int, Optional[int]], node: int) -> List[int]:
+        chain = [node]
+        while parents[node] is not None:
+            node = parents[node]
+            chain.append(node)
+        chain.reverse()
+        return chain
+
+
+def _witness_search(
+    adjacency: List[Dict[int, float]],
+    source: int,
+    ignore: int,
+    targets: Dict[int, float],
+    max_distance: float,
+) -> Dict[int, float]:
+    """
+    Limited Dijkstra from source that avoids the node being contracted,
+    returns the distances found to any of the targets
+    """
+    distances = {source: 0.0}
+    queue = [(0.0, source)]
+    settled = set()
+    found = {}
+
+    while queue and len(settled) < WITNESS_SETTLE_LIMIT:
+        dist, node = heapq.heappop(queue)
+        if node in settled:
+            continue
+        if dist > max_distance:
+            break
+        settled.add(node)
+
+        if node in targets:
+            found[node] = dist
+            if len(found) == len(targets):
+                break
+
+        for neighbour, weight in adjacency[node].items():
+            if neighbour == ignore:
+                continue
+            new_dist = dist + weight
+            if new_dist < distances.get(neighbour, float("inf")):
+                distances[neighbour] = new_dist
+                heapq.heappush(queue, (new_dist, neighbour))
+
+    return found
@@ -0,0 +1,193 @@
+""" Compressed sparse row graph for routing without networkx """
+import heapq
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import networkx as nx
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Undirected weighted graph stored as compressed sparse row arrays
+
+    Nodes are integer indices 0..n-1, the neighbours of node i are
+    indices[indptr[i]:indptr[i + 1]] with the matching weights.
+    """
+
+    def __init__(self, num_nodes: int, edges: Iterable[Tuple[int, int, float]]):
+        """
+        Compile the adjacency arrays
+
+        Args:
+            num_nodes (int): number of nodes in the graph
+            edges (Iterable[Tuple[int, int, float]]): (index, index, weight),
+                every edge can be travelled in both directions
+        """
+        self.num_nodes = num_nodes
+
+        edges = list(edges)
+        sources = np.fromiter((e[0] for e in edges), dtype=np.int32, count=len(edges))
+        targets = np.fromiter((e[1] for e in edges), dtype=np.int32, count=len(edges))
+        weights = np.fromiter((e[2] for e in edges), dtype=np.float64, count=len(edges))
+
+        # store both directions of every edge
+        sources, targets = (
+            np.concatenate((sources, targets)),
+            np.concatenate((targets, sources)),
+        )
+        weights = np.concatenate((weights, weights))
+
+        order = np.argsort(sources, kind="stable")
+        self.indices = targets[order]
+        self.weights = weights[order]
+
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=self.indptr[1:])
+
+        # indexing memoryviews gives plain python numbers, which is much
+        # faster than indexing the arrays in the search loops
+        self.__indptr = memoryview(self.indptr)
+        self.__indices = memoryview(self.indices)
+        self.__weights = memoryview(self.weights)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the adjacency arrays in bytes"""
+        return self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+    def neighbours(self, node: int) -> Tuple[List[int], List[float]]:
+        """
+        Returns the neighbouring indices of a node and the edge weights
+        """
+        indices, weights = self.__neighbour_views(node)
+        return indices.tolist(), weights.tolist()
+
+    def __neighbour_views(self, node: int) -> Tuple[memoryview, memoryview]:
+        start, end = self.__indptr[node], self.__indptr[node + 1]
+        return self.__indices[start:end], self.__weights[start:end]
+
+    def __check_node(self, node: int):
+        if not 0 <= node < self.num_nodes:
+            raise nx.NodeNotFound(f"Node {node} is not in the graph")
+
+    @staticmethod
+    def __unwind(parents: Dict[int, int], node: int) -> List[int]:
+        path = [node]
+        while parents[node] is not None:
+            node = parents[node]
+            path.append(node)
+        path.reverse()
+        return path
+
+    def astar(
+        self, source: int, target: int, heuristic: Callable[[int, int], float]
+    ) -> List[int]:
+        """
+        A* search with a binary heap
+
+        Args:
+            source (int): start index
+            target (int): end index
+            heuristic (Callable): admissible estimate of the distance
+                                  between two indices
+
+        Returns:
+            List of indices from source to target
+
+        Raises:
+            nx.NodeNotFound and nx.NetworkXNoPath, as networkx does
+        """
+        self.__check_node(source)
+        self.__check_node(target)
+
+        # the counter breaks ties so nodes themselves are never compared
+        tie_break = count()
+        queue = [(0.0, next(tie_break), source, 0.0, None)]
+        # index -> parent index of settled nodes
+        parents = {}
+        # index -> (best distance seen, heuristic)
+        enqueued = {}
+
+        while queue:
+            _, __, node, dist, parent = heapq.heappop(queue)
+
+            if node == target:
+                parents[node] = parent
+                return self.__unwind(parents, node)
+
+            if node in parents:
+                continue
+
+            parents[node] = parent
+
+            for neighbour, weight in zip(*self.__neighbour_views(node)):
+                if neighbour in parents:
+                    continue
+
+                new_dist = dist + weight
+                if neighbour in enqueued:
+                    queued_dist, estimate = enqueued[neighbour]
+                    if queued_dist <= new_dist:
+                        continue
+                else:
+                    estimate = heuristic(neighbour, target)
+
+                enqueued[neighbour] = (new_dist, estimate)
+                heapq.heappush(
+                    queue,
+                    (new_dist + estimate, next(tie_break), neighbour, new_dist, node),
+                )
+
+        raise nx.NetworkXNoPath(f"Node {target} not reachable from {source}")
+
+    def dijkstra(
+        self, source: int, targets: Optional[Iterable[int]] = None
+    ) -> Tuple[Dict[int, float], Dict[int, Optional[int]]]:
+        """
+        Single source shortest paths with a binary heap, stops early once
+        every target has been settled
+
+        Args:
+            source (int): start index
+            targets (Iterable[int]): indices to stop after, or None to
+                                     search the whole graph
+
+        Returns:
+            distances and parents of every settled index
+        """
+        self.__check_node(source)
+        remaining = None if targets is None else set(targets)
+
+        distances = {}
+        parents = {}
+        best = {source: 0.0}
+        queue = [(0.0, source, None)]
+
+        while queue:
+            dist, node, parent = heapq.heappop(queue)
+            if node in distances:
+                continue
+
+            distances[node] = dist
+            parents[node] = parent
+
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+
+            for neighbour, weight in zip(*self.__neighbour_views(node)):
+                new_dist = dist + weight
+                if neighbour not in distances and new_dist < best.get(
+                    neighbour, float("inf")
+                ):
+                    best[neighbour] = new_dist
+                    heapq.heappush(queue, (new_dist, neighbour, node))
+
+        return distances, parents
+
+    def path_to(self, parents: Dict[int, Optional[int]], node: int) -> List[int]:
+        """
+        Path from the dijkstra source to a settled node
+        """
+        return self.__unwind(parents, node)
@@ -0,0 +1,25 @@
+"""
+    Offline preprocessing of parsed graphs for routing
+"""
+from typing import List, Tuple
+from src.path_finding.contraction import ContractionHierarchy
+from src.path_finding.router import Router
+from src.types.map_types import PathNode, Polygon
+
+
+def build_hierarchy(
+    nodes: List[PathNode], edges: List[Tuple[int, int]], polygons: List[Polygon]
+) -> ContractionHierarchy:
+    """
+    Build the contraction hierarchy of a parsed graph, to be saved with it
+
+    Routers are built from the way nodes in the database (not walls), so
+    the hierarchy is built from the same nodes with the same edge weights
+
+    Args:
+        nodes (List[PathNode]): parsed nodes
+        edges (List[Tuple[int, int]]): parsed edges
+        polygons (List[Polygon]): parsed polygons
+    """
+    way_nodes = [node for node in nodes if node.tags.get("indoor") == "way"]
+    return Router(way_nodes, edges, polygons).build_hierarchy()
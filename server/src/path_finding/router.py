@@ -1,26 +1,62 @@
 """ Routing using sparse adjacency matrix """
+import heapq
 import math
-import json
-import dataclasses
-from typing import List, Type
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
 import networkx as nx
-import shapely.geometry
-from pyproj import Geod
-from src.types.map_types import PathNode
+from src.path_finding.contraction import ContractionHierarchy
+from src.path_finding.csr_graph import CSRGraph
+
+# Graph representations the router can search over
+BACKENDS = ("networkx", "csr")
+
+# Rough per-item memory costs, used for cache budgeting
+PATH_NODE_BYTES = 512
+NX_NODE_BYTES = 512
+NX_EDGE_BYTES = 256
+HIERARCHY_NODE_BYTES = 512
+
+# Mean earth radius in metres
+EARTH_RADIUS = 6371008.8
+# Extra cost of going from one room straight into another
+ROOM_PENALTY = 10000
+
+
+def haversine(lat_1, lon_1, cos_lat_1, lat_2, lon_2, cos_lat_2):
+    """
+    Great circle distance in metres between two points, latitudes and
+    longitudes are in radians and the cosines of the latitudes are passed
+    in so they can be precomputed
+    """
+    sin_lat = math.sin((lat_2 - lat_1) / 2)
+    sin_lon = math.sin((lon_2 - lon_1) / 2)
+    a = sin_lat * sin_lat + cos_lat_1 * cos_lat_2 * sin_lon * sin_lon
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
 
 
 class Router:
     """Class that provides methods to generate routes through a graph"""
 
-    def __init__(self, nodes, edges, polys):
+    def __init__(self, nodes, edges, polys, backend="networkx", hierarchy=None):
         """
-        Initialise the networkx graph
+        Initialise the graph
 
         Args:
             nodes (List[PathNode]): Nodes to find path in
             edges (List[Tuple[int, int]]): Edges between nodes
             polys (List[Polygon]): Room polygons
+            backend (str): "networkx", or "csr" for compact NumPy arrays
+                           which are lighter and faster on big graphs
+            hierarchy (ContractionHierarchy): preprocessed hierarchy of
+                                              this graph to answer
+                                              find_path with
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown router backend {backend}")
+
+        self.log = logging.getLogger(__name__)
+        self.backend = backend
         self.nodes = nodes
         self.edges = edges
 
@@ -29,112 +65,149 @@ class Router:
         for poly in polys:
             self.lookup_polys[poly.id] = poly
 
-        self.graph = nx.Graph()
-
-        nodes_tuples = []
-        for node in nodes:
-            node_as_dict = dataclasses.asdict(
-                node, dict_factory=self.__dataclass_to_flat_dict
+        self.__build_node_arrays()
+        weighted_edges = self.__weighted_edges(edges)
+
+        self.graph = None
+        self.csr = None
+
+        if backend == "networkx":
+            self.graph = nx.Graph()
+            self.graph.add_nodes_from(node.id for node in nodes)
+            self.graph.add_weighted_edges_from(weighted_edges)
+        else:
+            self.csr = CSRGraph(
+                len(nodes),
+                (
+                    (self.node_index[n], self.node_index[m], weight)
+                    for n, m, weight in weighted_edges
+                ),
             )
-            nodes_tuples.append((node.id, node_as_dict))
 
-        self.graph.add_nodes_from(nodes_tuples)
-        self.graph.add_edges_from(edges)
+        self.hierarchy = None
+        if hierarchy is not None:
+            if set(hierarchy.node_ids) == self.node_index.keys():
+                self.hierarchy = hierarchy
+            else:
+                self.log.warning("Hierarchy doesn't match the graph, ignoring it")
 
-    @staticmethod
-    def __serialise_list(ser_list):
+    def __build_node_arrays(self):
         """
-        Serialise a list, for use in the database
+        Precompute flat per-node arrays (indexed by position, not node ID)
+        so the heuristic doesn't have to build objects for every call
         """
-        return "serialised:" + json.dumps(ser_list)
-
-    @staticmethod
-    def __deserialise_list(ser_list):
+        self.node_index = {}
+        self.lats = array("d")
+        self.lons = array("d")
+        self.levels = array("d")
+        self.poly_ids = array("q")
+        # 1 if the node is inside a polygon tagged as a room
+        self.in_room = array("b")
+
+        self.__rad_lats = array("d")
+        self.__rad_lons = array("d")
+        self.__cos_lats = array("d")
+
+        for index, node in enumerate(self.nodes):
+            self.node_index[node.id] = index
+            self.lats.append(node.lat)
+            self.lons.append(node.lon)
+            self.levels.append(float(node.level))
+            self.poly_ids.append(node.poly_id)
+
+            poly = self.lookup_polys.get(node.poly_id)
+            is_room = poly is not None and poly.tags.get("indoor") == "room"
+            self.in_room.append(is_room)
+
+            rad_lat = math.radians(node.lat)
+            self.__rad_lats.append(rad_lat)
+            self.__rad_lons.append(math.radians(node.lon))
+            self.__cos_lats.append(math.cos(rad_lat))
+
+    def distance(self, n, m) -> float:
         """
-        Deserialise a list
+        Straight line distance in metres between two nodes by ID
         """
-        return json.loads(ser_list.split(":", 1)[1])
+        return self.__index_distance(self.node_index[n], self.node_index[m])
 
-    def __dataclass_to_flat_dict(self, dataclass):
+    def __index_distance(self, i, j) -> float:
         """
-        Prepares dataclass to a flat dict object
+        Straight line distance in metres between two nodes by array index
         """
-        flat_dict = {}
-        for key, value in dataclass:
-            if key == "tags":
-                flat_dict.update(value)
-            elif isinstance(value, (list, tuple)):
-                flat_dict[key] = self.__serialise_list(value)
-            elif value is None:
-                flat_dict[key] = ""
-            else:
-                flat_dict[key] = value
-
-        return flat_dict
+        return haversine(
+            self.__rad_lats[i],
+            self.__rad_lons[i],
+            self.__cos_lats[i],
+            self.__rad_lats[j],
+            self.__rad_lons[j],
+            self.__cos_lats[j],
+        )
 
-    def __flat_dict_to_dataclass(self, dictionary: dict, target_class: Type) -> Type:
+    def estimated_size(self) -> int:
         """
-        Attempts to turn a dict into an instance of the given dataclass
+        Rough estimate of the memory this router holds in bytes
         """
-        fields = [field.name for field in dataclasses.fields(target_class)]
-        fields.remove("tags")
-        kwargs = {field: dictionary[field] for field in fields}
+        size = len(self.nodes) * PATH_NODE_BYTES
 
-        tags = {k: dictionary[k] for k in fields ^ dictionary.keys()}
-        kwargs["tags"] = tags
+        if self.graph is not None:
+            size += self.graph.number_of_nodes() * NX_NODE_BYTES
+            size += self.graph.number_of_edges() * NX_EDGE_BYTES
+        else:
+            size += self.csr.nbytes
 
-        # Transform empty strings back to 'None' had to be changed when loading
-        for key, value in kwargs.items():
-            if isinstance(value, str) and value.startswith("serialised:"):
-                kwargs[key] = self.__deserialise_list(value)
-            elif value == "":
-                kwargs[key] = None
+        if self.hierarchy is not None:
+            size += len(self.hierarchy.node_ids) * HIERARCHY_NODE_BYTES
 
-        return target_class(**kwargs)
+        return size
 
-    def __heuristic(self, n, m):
+    def edge_weight(self, n, m) -> float:
         """
-        Heuristic function that should take into account:
+        Cost of travelling along the edge between two nodes by ID:
             - Distance
             - Room -> Room traversal where rooms are different
-            - Simplicity of route?
 
         Returns:
-            Integer that is weighted by the above (higher is worse)
+            Float that is weighted by the above (higher is worse)
         """
-        n_node = self.__flat_dict_to_dataclass(self.graph.nodes[n], PathNode)
-        m_node = self.__flat_dict_to_dataclass(self.graph.nodes[m], PathNode)
+        weight = self.distance(n, m)
 
-        n_lat_lon = shapely.geometry.Point(n_node.lat, n_node.lon)
-        m_lat_lon = shapely.geometry.Point(m_node.lat, m_node.lon)
+        i = self.node_index[n]
+        j = self.node_index[m]
+        if self.in_room[i] and self.in_room[j] and self.poly_ids[i] != self.poly_ids[j]:
+            # tune this
+            weight += ROOM_PENALTY
 
-        line_string = shapely.geometry.LineString([n_lat_lon, m_lat_lon])
-        geod = Geod(ellps="WGS84")
-        weight = geod.geometry_length(line_string)
-
-        # Try except as there might be no polygons or broken map, shouldn't
-        # break routing if it can be avoided (since this is optional)
-        try:
-            n_poly = self.lookup_polys[n_node.poly_id]
-            m_poly = self.lookup_polys[m_node.poly_id]
+        return weight
 
-            if n_poly.tags["indoor"] == "room" and m_poly.tags["indoor"] == "room":
-                # tune this
-                weight += 10000
-        except KeyError:
-            pass
+    def __weighted_edges(self, edges):
+        """
+        Weight every edge once when the graph is built, edges to nodes
+        that aren't in the router (e.g. walls) are left out
+        """
+        for n, m in edges:
+            if n in self.node_index and m in self.node_index:
+                yield (n, m, self.edge_weight(n, m))
 
-        return weight
+    def build_hierarchy(self) -> ContractionHierarchy:
+        """
+        Preprocess this graph into a contraction hierarchy and use it for
+        find_path, this is slow so do it when the graph is saved and pass
+        the stored hierarchy to later routers
+        """
+        self.hierarchy = ContractionHierarchy.build(
+            [node.id for node in self.nodes], self.__weighted_edges(self.edges)
+        )
+        return self.hierarchy
 
     def __angle_to(self, n, m, o):
         """n, m, o are path nodes"""
-        n_node = self.__flat_dict_to_dataclass(self.graph.nodes[n], PathNode)
-        m_node = self.__flat_dict_to_dataclass(self.graph.nodes[m], PathNode)
-        o_node = self.__flat_dict_to_dataclass(self.graph.nodes[o], PathNode)
+        n_index = self.node_index[n]
+        m_index = self.node_index[m]
+        o_index = self.node_index[o]
 
-        n_lat_lon = (n_node.lat, n_node.lon)
-        m_lat_lon = (m_node.lat, m_node.lon)
-        o_lat_lon = (o_node.lat, o_node.lon)
+        n_lat_lon = (self.lats[n_index], self.lons[n_index])
+        m_lat_lon = (self.lats[m_index], self.lons[m_index])
+        o_lat_lon = (self.lats[o_index], self.lons[o_index])
 
         v1 = (n_lat_lon[0] - m_lat_lon[0], n_lat_lon[1] - m_lat_lon[1])
         v2 = (m_lat_lon[0] - o_lat_lon[0], m_lat_lon[1] - o_lat_lon[1])
@@ -196,11 +269,143 @@ class Router:
             start_node (int): Node ID
             end_node (int): Node ID
         Returns:
-            Path from node ID to node ID with heuristic
+            Shortest path from node ID to node ID by edge weight
         """
-        return nx.algorithms.astar_path(
-            self.graph, start_node, end_node, heuristic=self.__heuristic
+        if self.hierarchy is not None:
+            return self.hierarchy.find_path(start_node, end_node)
+
+        # edge weights are never shorter than the straight line between
+        # their ends, so straight line distance is an admissible heuristic
+        if self.graph is not None:
+            return nx.algorithms.astar_path(
+                self.graph,
+                start_node,
+                end_node,
+                heuristic=self.distance,
+                weight="weight",
+            )
+
+        for node in (start_node, end_node):
+            if node not in self.node_index:
+                raise nx.NodeNotFound(f"Node {node} is not in the graph")
+
+        path = self.csr.astar(
+            self.node_index[start_node],
+            self.node_index[end_node],
+            self.__index_distance,
         )
+        return [self.nodes[index].id for index in path]
+
+    def shortest_path_tree(
+        self, source: int, targets: Optional[Iterable[int]] = None
+    ) -> Tuple[Dict[int, float], Dict[int, Optional[int]]]:
+        """
+        Dijkstra from one node, stopping once all targets are reached
+
+        Args:
+            source (int): Node ID to start from
+            targets (Iterable[int]): Node IDs to stop after, or None for
+                                     the whole graph
+
+        Returns:
+            distances and parent node IDs of every reached node ID,
+            use path_from_tree to get paths from them
+        """
+        targets = None if targets is None else list(targets)
+        for node in [source] + (targets or []):
+            if node not in self.node_index:
+                raise nx.NodeNotFound(f"Node {node} is not in the graph")
+
+        if self.csr is not None:
+            distances, parents = self.csr.dijkstra(
+                self.node_index[source],
+                None if targets is None else [self.node_index[t] for t in targets],
+            )
+            ids = self.nodes
+            return (
+                {ids[index].id: dist for index, dist in distances.items()},
+                {
+                    ids[index].id: None if parent is None else ids[parent].id
+                    for index, parent in parents.items()
+                },
+            )
+
+        remaining = None if targets is None else set(targets)
+        adjacency = self.graph.adj
+        distances = {}
+        parents = {}
+        best = {source: 0.0}
+        queue = [(0.0, source, None)]
+
+        while queue:
+            dist, node, parent = heapq.heappop(queue)
+            if node in distances:
+                continue
+
+            distances[node] = dist
+            parents[node] = parent
+
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+
+            for neighbour, attributes in adjacency[node].items():
+                new_dist = dist + attributes["weight"]
+                if neighbour not in distances and new_dist < best.get(
+                    neighbour, float("inf")
+                ):
+                    best[neighbour] = new_dist
+                    heapq.heappush(queue, (new_dist, neighbour, node))
+
+        return distances, parents
+
+    @staticmethod
+    def path_from_tree(parents: Dict[int, Optional[int]], node: int) -> List[int]:
+        """
+        Path from the root of a shortest_path_tree to a reached node
+        """
+        path = [node]
+        while parents[node] is not None:
+            node = parents[node]
+            path.append(node)
+        path.reverse()
+        return path
+
+    def route_matrix(
+        self, sources: List[int], targets: List[int], paths: bool = False
+    ) -> Tuple[List[List[Optional[float]]], Optional[List[List[Optional[List[int]]]]]]:
+        """
+        Shortest distances (and optionally paths) from every source to
+        every target, one Dijkstra per source over the same graph
+
+        Args:
+            sources (List[int]): Node IDs to route from
+            targets (List[int]): Node IDs to route to
+            paths (bool): also return the paths
+
+        Returns:
+            distances[i][j] from sources[i] to targets[j] (None if there is
+            no route), and paths in the same layout if asked for
+        """
+        distances = []
+        path_matrix = [] if paths else None
+
+        for source in sources:
+            tree_distances, parents = self.shortest_path_tree(source, targets)
+            distances.append([tree_distances.get(target) for target in targets])
+
+            if paths:
+                path_matrix.append(
+                    [
+                        self.path_from_tree(parents, target)
+                        if target in parents
+                        else None
+                        for target in targets
+                    ]
+                )
+
+        return distances, path_matrix
 
     def get_path_nodes(self, path):
         """
@@ -213,13 +418,4 @@ class Router:
         Returns:
             A list of node objects corresponding to the path
         """
-        nodes = []
-        for node in path:
-            node_dataclass = self.__flat_dict_to_dataclass(
-                self.graph.nodes[node], PathNode
-            )
-            nodes.append(
-                node_dataclass,
-            )
-
-        return nodes
+        return [self.nodes[self.node_index[node]] for node in path]
@@ -3,9 +3,31 @@ from typing import List, Optional, Tuple
 from pydantic import validate_arguments
 
 
+def unpickle(type_name: str, state: dict):
+    """
+    Rebuild a map type sent between processes, without validating its
+    fields again as they were when it was first made
+    """
+    # the module attribute is the validate_arguments wrapper of the class
+    entry_type = globals()[type_name].raw_function
+    entry = entry_type.__new__(entry_type)
+    entry.__dict__.update(state)
+    return entry
+
+
+class MapType:
+    """
+    Base of the map types, making them picklable (e.g. to be returned by
+    a worker process) even though their names refer to the wrappers
+    """
+
+    def __reduce__(self):
+        return (unpickle, (type(self).__name__, self.__dict__))
+
+
 @validate_arguments(config=dict(arbitrary_types_allowed=True))
 @dataclass
-class PathNode:
+class PathNode(MapType):
     """
     Path Node
 
@@ -28,7 +50,7 @@ class PathNode:
 
 @validate_arguments(config=dict(arbitrary_types_allowed=True))
 @dataclass
-class PoI:
+class PoI(MapType):
     """
     Point
 
@@ -51,7 +73,7 @@ class PoI:
 
 @validate_arguments(config=dict(arbitrary_types_allowed=True))
 @dataclass
-class Polygon:
+class Polygon(MapType):
     """
     Polygon
 
@@ -0,0 +1,65 @@
+from src.api.graph_cache import GraphCache
+
+
+class TestGraphCache:
+    def test_get_and_put(self):
+        cache = GraphCache(100, size_of=len)
+        assert cache.get("test") is None
+
+        assert cache.put("test", "value")
+        assert cache.get("test") == "value"
+        assert cache.current_bytes == 5
+
+    def test_evicts_least_recently_used(self):
+        cache = GraphCache(10, size_of=len)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+
+        # touch a so b is the least recently used
+        cache.get("a")
+        cache.put("c", "cccc")
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert cache.current_bytes == 8
+
+    def test_too_big_is_not_cached(self):
+        cache = GraphCache(10, size_of=len)
+        cache.put("a", "aaaa")
+
+        assert not cache.put("b", "b" * 11)
+        assert "a" in cache
+        assert "b" not in cache
+
+    def test_replace_entry(self):
+        cache = GraphCache(10, size_of=len)
+        cache.put("a", "aaaa")
+        cache.put("a", "aaaaaa")
+
+        assert cache.get("a") == "aaaaaa"
+        assert cache.current_bytes == 6
+
+    def test_invalidate(self):
+        cache = GraphCache(10, size_of=len)
+        cache.put("a", "aaaa")
+        cache.invalidate("a")
+
+        assert cache.get("a") is None
+        assert cache.current_bytes == 0
+
+    def test_stale_generation_is_not_cached(self):
+        cache = GraphCache(10, size_of=len)
+
+        generation = cache.generation("a")
+        # graph rewritten while the value was being built
+        cache.invalidate("a")
+        assert not cache.put("a", "aaaa", generation)
+        assert "a" not in cache
+
+        generation = cache.generation("a")
+        cache.clear()
+        assert not cache.put("a", "aaaa", generation)
+
+        generation = cache.generation("a")
+        assert cache.put("a", "aaaa", generation)
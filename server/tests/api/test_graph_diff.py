@@ -0,0 +1,133 @@
+from src.api.graph_diff import diff_entries, diff_graph, stable_ids
+from src.types.map_types import PathNode, PoI, Polygon
+
+
+def node(node_id, level=0.0, lat=0.0, lon=0.0):
+    return PathNode(node_id, "test", level, lat, lon, 0, {"indoor": "way"})
+
+
+def square(poly_id, level, name):
+    return Polygon(
+        poly_id,
+        "test",
+        level,
+        [(0, 0), (0, 1), (1, 1), (1, 0)],
+        (1, 1),
+        (0, 0),
+        {"room-name": name},
+    )
+
+
+class TestGraphDiff:
+    @classmethod
+    def setup_class(cls):
+        cls.nodes = [node(0), node(1), node(2), node(3, level=1.0)]
+        cls.edges = [(0, 1), (1, 0), (1, 2), (2, 3)]
+        cls.polygons = [square(0, "0.0", "hall"), square(1, "1.0", "office")]
+        cls.pois = [PoI(0, "test", 0.0, 0.5, 0.5, 1, {"amenity": "bin"})]
+        cls.graph = (cls.nodes, cls.edges, cls.polygons, cls.pois)
+
+    def test_unchanged(self):
+        diff = diff_graph(self.graph, self.graph)
+
+        assert not diff
+        assert not diff.routing_changed
+        assert diff.levels == set()
+
+    def test_moved_node(self):
+        nodes = list(self.nodes)
+        nodes[2] = node(2, lat=0.5)
+        diff = diff_graph(self.graph, (nodes, self.edges, self.polygons, self.pois))
+
+        assert diff.removed_nodes == [self.nodes[2]]
+        assert diff.added_nodes == [nodes[2]]
+        # its edges are deleted with it and created again
+        assert diff.removed_edges == []
+        assert sorted(diff.added_edges) == [(1, 2), (2, 3)]
+        # the level of the other end changes too
+        assert diff.levels == {0.0, 1.0}
+        assert diff.routing_changed
+
+    def test_edges(self):
+        edges = [(0, 1), (1, 0), (1, 0), (0, 2)]
+        diff = diff_graph(self.graph, (self.nodes, edges, self.polygons, self.pois))
+
+        assert diff.removed_nodes == diff.added_nodes == []
+        # parallel edges are recreated together
+        assert sorted(diff.removed_edges) == [(1, 0), (1, 2), (2, 3)]
+        assert sorted(diff.added_edges) == [(0, 2), (1, 0), (1, 0)]
+
+    def test_added_and_removed_nodes(self):
+        nodes = self.nodes[:3] + [node(4)]
+        edges = [(0, 1), (1, 0), (1, 2), (2, 4)]
+        diff = diff_graph(self.graph, (nodes, edges, self.polygons, self.pois))
+
+        assert diff.removed_nodes == [self.nodes[3]]
+        assert diff.added_nodes == [nodes[3]]
+        # (2, 3) goes with node 3
+        assert diff.removed_edges == []
+        assert diff.added_edges == [(2, 4)]
+
+    def test_entries_only(self):
+        pois = [PoI(0, "test", 0.0, 0.5, 0.5, 1, {"amenity": "bench"})]
+        diff = diff_graph(self.graph, (self.nodes, self.edges, self.polygons, pois))
+
+        assert diff
+        assert not diff.routing_changed
+        assert diff.removed_pois == self.pois
+        assert diff.added_pois == pois
+        assert diff.levels == {0.0}
+
+    def test_polygon_on_many_levels(self):
+        old = [square(0, "0.0", "stairs"), square(0, "1.0", "stairs")]
+        new = [square(0, "0.0", "stairs"), square(0, "2.0", "stairs")]
+        removed, added = diff_entries(old, new)
+
+        # every level of a changed polygon is replaced
+        assert removed == old
+        assert added == new
+
+    def test_stable_ids(self):
+        old_nodes = [node(i, lat=float(i)) for i in range(3)]
+        for old_node in old_nodes:
+            old_node.poly_id = -1
+        old = (old_nodes, [(0, 1), (1, 2)], self.polygons, self.pois)
+
+        # a node and a room inserted before the others, so every parsed ID
+        # after them is one more
+        nodes = [node(0, lat=9.0)] + [node(n.id + 1, lat=n.lat) for n in old_nodes]
+        for new_node in nodes:
+            new_node.poly_id = -1
+        nodes[2].poly_id = 1
+        edges = [(1, 2), (2, 3), (0, 1)]
+        cellar = square(0, "2.0", "cellar")
+        cellar.vertices = [(5, 5), (5, 6), (6, 6)]
+        polygons = [cellar] + [
+            square(p.id + 1, p.level, p.tags["room-name"]) for p in self.polygons
+        ]
+        pois = [PoI(0, "test", 0.0, 0.5, 0.5, 2, {"amenity": "bin"})]
+
+        new = stable_ids(old, (nodes, edges, polygons, pois))
+        diff = diff_graph(old, new)
+
+        assert [n.id for n in nodes] == [3, 0, 1, 2]
+        assert nodes[2].poly_id == 0
+        assert new[1] == [(0, 1), (1, 2), (3, 0)]
+        assert [p.id for p in polygons] == [2, 0, 1]
+        assert pois[0].id == 0 and pois[0].nearest_path_node == 1
+        # only the inserted node, its edge and room changed, and the node
+        # moved into a room
+        assert [n.id for n in diff.added_nodes] == [3, 1]
+        assert [n.id for n in diff.removed_nodes] == [1]
+        assert sorted(diff.added_edges) == [(0, 1), (1, 2), (3, 0)]
+        assert [p.id for p in diff.added_polygons] == [2]
+        assert diff.removed_pois == diff.added_pois == []
+
+    def test_stable_ids_duplicates(self):
+        # two new nodes where one old one was, only one keeps its ID
+        nodes = [node(0), node(1), node(2)]
+        old = ([node(5)], [], [], [])
+        new = stable_ids(old, (nodes, [(0, 1), (1, 2)], [], []))
+
+        assert [n.id for n in nodes] == [5, 6, 7]
+        assert new[1] == [(5, 6), (6, 7)]
@@ -0,0 +1,133 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from src.api.ingest import (
+    job_record,
+    parse_files,
+    parse_json,
+    snapshot_footprint,
+    update_files,
+)
+from src.parser.graph_parser import Parser
+from src.parser.map_data import MapData
+
+LAYERS = ["polygons", "linestring", "points"]
+FILES = {"polygons": "Polygons", "linestring": "LineString", "points": "Points"}
+
+
+class TestIngest:
+    @classmethod
+    def setup_class(cls):
+        cls.path = os.getcwd() + "/server/tests/parser/test_map"
+        cls.paths = {layer: f"{cls.path}/{FILES[layer]}.json" for layer in LAYERS}
+        d = MapData(cls.path)
+        cls.expected = Parser("test", d.polygons, d.linestring, d.points)
+
+    def check(cls, parsed):
+        assert parsed.graph == "test"
+        assert parsed.nodes == cls.expected.nodes
+        assert parsed.edges == cls.expected.edges
+        assert parsed.polygons == cls.expected.polygons
+        assert parsed.pois == cls.expected.pois
+        assert parsed.snapshot and parsed.etag
+        assert parsed.footprint
+
+    def test_parse_files_in_process_pool(cls):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            parsed = pool.submit(parse_files, "test", cls.paths).result()
+
+        cls.check(parsed)
+        assert parsed.hierarchy.to_dict()
+
+    def test_parse_json(cls):
+        layers = []
+        for layer in LAYERS:
+            with open(cls.paths[layer], "r", encoding="utf-8") as file:
+                layers.append(json.dumps(json.load(file)))
+
+        cls.check(parse_json("test", *layers))
+
+    def test_parse_invalid(cls, tmp_path):
+        broken = tmp_path / "broken.json"
+        broken.write_text('{"features": [{"type": "Feature"')
+
+        with pytest.raises(ValueError):
+            parse_files("test", dict(cls.paths, linestring=str(broken)))
+        with pytest.raises(ValueError):
+            parse_json("test", "{", "{}", "{}")
+
+    def test_update_unchanged(cls):
+        saved = parse_files("test", cls.paths)
+        parsed, diff = update_files("test", cls.paths, saved.snapshot)
+
+        assert not diff
+        assert parsed.hierarchy is None
+        assert parsed.etag == saved.etag
+
+    def test_update_pois(cls, tmp_path):
+        saved = parse_files("test", cls.paths)
+        with open(cls.paths["points"], "r", encoding="utf-8") as file:
+            points = json.load(file)
+        points["features"][0]["properties"]["amenity"] = "kitchen"
+        changed = tmp_path / "Points.json"
+        changed.write_text(json.dumps(points))
+
+        parsed, diff = update_files(
+            "test", dict(cls.paths, points=str(changed)), saved.snapshot
+        )
+
+        assert not diff.routing_changed
+        assert parsed.hierarchy is None
+        assert [p.tags["amenity"] for p in diff.added_pois] == ["kitchen"]
+        assert [p.id for p in diff.removed_pois] == [diff.added_pois[0].id]
+        assert parsed.etag != saved.etag
+
+    def test_update_inserted_feature(cls, tmp_path):
+        saved = parse_files("test", cls.paths)
+        with open(cls.paths["linestring"], "r", encoding="utf-8") as file:
+            linestring = json.load(file)
+        # a new way at the start of the file, away from the others
+        way = json.loads(json.dumps(linestring["features"][0]))
+        way["geometry"]["coordinates"] = [
+            [lon + 0.001, lat + 0.001] for lon, lat in way["geometry"]["coordinates"]
+        ]
+        linestring["features"].insert(0, way)
+        changed = tmp_path / "LineString.json"
+        changed.write_text(json.dumps(linestring))
+
+        parsed, diff = update_files(
+            "test", dict(cls.paths, linestring=str(changed)), saved.snapshot
+        )
+
+        # the other nodes keep their IDs, so only the new way is added
+        new_ids = {n.id for n in diff.added_nodes}
+        assert len(new_ids) == len(way["geometry"]["coordinates"])
+        assert min(new_ids) == len(saved.nodes)
+        assert diff.removed_nodes == []
+        assert all(a in new_ids or b in new_ids for a, b in diff.added_edges)
+        assert diff.removed_pois == diff.added_pois == []
+        assert parsed.hierarchy is not None
+
+    def test_snapshot_footprint(cls):
+        parsed = parse_files("test", cls.paths)
+        assert snapshot_footprint(parsed.snapshot) == parsed.footprint
+
+    def test_job_record(cls):
+        fields = {
+            "id": "abc",
+            "graph": "test",
+            "status": "parsing",
+            "error": "",
+            "created": "1.5",
+            "updated": "2.5",
+        }
+
+        assert job_record(fields) == {
+            "id": "abc",
+            "graph": "test",
+            "status": "parsing",
+            "error": None,
+            "created": 1.5,
+            "updated": 2.5,
+        }
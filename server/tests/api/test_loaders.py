@@ -0,0 +1,120 @@
+import asyncio
+import importlib.resources
+import pytest
+from ariadne import QueryType, graphql, make_executable_schema
+from src import api
+from src.api.loaders import DataLoader, Loaders, load_by_graph
+from src.api.types import node
+from src.types.map_types import PathNode, Polygon
+
+
+class FakeController:
+    """In memory stand in for the Controller batch methods"""
+
+    def __init__(self, nodes, polygons, edges):
+        self.nodes = {(n.graph, n.id): n for n in nodes}
+        self.polygons = {(p.graph, p.id): p for p in polygons}
+        self.edges = edges
+        self.calls = []
+
+    async def load_entries_by_ids(self, graph, ids, entry_type):
+        self.calls.append(("polygons", graph, list(ids)))
+        return [self.polygons.get((graph, i)) for i in ids]
+
+    async def get_nodes_by_ids(self, graph, ids):
+        self.calls.append(("nodes", graph, list(ids)))
+        return [self.nodes.get((graph, i)) for i in ids]
+
+    async def get_neighbours_of_nodes(self, graph, ids):
+        self.calls.append(("neighbours", graph, list(ids)))
+        return [[self.nodes[(graph, m)] for n, m in self.edges if n == i] for i in ids]
+
+
+class TestDataLoader:
+    @pytest.mark.asyncio
+    async def test_batches_and_caches(cls):
+        batches = []
+
+        async def batch_load(keys):
+            batches.append(keys)
+            return [key * 2 for key in keys]
+
+        loader = DataLoader(batch_load)
+        values = await asyncio.gather(*[loader.load(key) for key in [1, 2, 1, 3]])
+        assert values == [2, 4, 2, 6]
+        assert batches == [[1, 2, 3]]
+
+        # cached keys aren't loaded again
+        assert await loader.load_many([3, 4]) == [6, 8]
+        assert batches == [[1, 2, 3], [4]]
+
+        loader.prime(5, 0)
+        assert await loader.load(5) == 0
+        assert len(batches) == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(cls):
+        fail = [True]
+
+        async def batch_load(keys):
+            if fail[0]:
+                raise ValueError("database down")
+            return keys
+
+        loader = DataLoader(batch_load)
+        with pytest.raises(ValueError):
+            await loader.load(1)
+
+        fail[0] = False
+        assert await loader.load(1) == 1
+
+    @pytest.mark.asyncio
+    async def test_load_by_graph(cls):
+        calls = []
+
+        async def load(graph, ids):
+            calls.append((graph, ids))
+            return [f"{graph}{i}" for i in ids]
+
+        keys = [("a", 1), ("b", 1), ("a", 2)]
+        assert await load_by_graph(keys, load) == ["a1", "b1", "a2"]
+        assert sorted(calls) == [("a", [1, 2]), ("b", [1])]
+
+
+class TestLoaders:
+    @pytest.mark.asyncio
+    async def test_node_fields_are_batched(cls):
+        nodes = [
+            PathNode(i, "test", 0.0, 53.81, -1.56, i % 2, {"indoor": "way"})
+            for i in range(6)
+        ]
+        polygons = [
+            Polygon(i, "test", 0.0, [(0, 0), (0, 1)], (0, 1), (0, 0), {})
+            for i in range(2)
+        ]
+        edges = [(i, i + 1) for i in range(5)]
+        controller = FakeController(nodes, polygons, edges)
+
+        query = QueryType()
+        query.set_field("nodes", lambda *_, graph: nodes)
+        schema = make_executable_schema(
+            importlib.resources.read_text(api, "schema.graphql"), query, node.node
+        )
+
+        success, result = await graphql(
+            schema,
+            {
+                "query": '{ nodes(graph: "test") { id polygon { id } neighbours { id } } }'
+            },
+            context_value={"loaders": Loaders(controller)},
+        )
+
+        assert success and "errors" not in result
+        polygon_ids = [n["polygon"]["id"] for n in result["data"]["nodes"]]
+        assert polygon_ids == [0, 1] * 3
+        assert result["data"]["nodes"][0]["neighbours"] == [{"id": 1}]
+        # one call per loader however many nodes there are
+        assert sorted(call[0] for call in controller.calls) == [
+            "neighbours",
+            "polygons",
+        ]
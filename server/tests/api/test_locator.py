@@ -0,0 +1,77 @@
+from src.api.locator import BuildingLocator, building_footprint
+from src.types.map_types import Polygon
+
+
+def square(lat, lon, size):
+    return [(lat, lon), (lat + size, lon), (lat + size, lon + size), (lat, lon + size)]
+
+
+class TestBuildingLocator:
+    def test_building_footprint(self):
+        polygons = [
+            Polygon(0, "test", 0.0, square(0, 0, 1), (1, 1), (0, 0), {}),
+            Polygon(1, "test", 1.0, square(1, 1, 1), (2, 2), (1, 1), {}),
+        ]
+        footprint = building_footprint(polygons)
+
+        assert footprint[0] == footprint[-1]
+        assert set(footprint) == {(0, 0), (1, 0), (2, 1), (2, 2), (1, 2), (0, 1)}
+        assert building_footprint([]) == []
+
+    def test_locate(self):
+        locator = BuildingLocator()
+        locator.load(
+            {
+                f"building {i}": square(i * 10, i * 10, 5) + [(i * 10, i * 10)]
+                for i in range(100)
+            }
+        )
+
+        assert locator.loaded
+        assert len(locator) == 100
+        assert locator.locate(502, 503) == "building 50"
+        assert locator.locate(507, 507) is None
+
+    def test_smallest_building_wins(self):
+        locator = BuildingLocator()
+        locator.add("campus", square(0, 0, 10) + [(0, 0)])
+        locator.add("library", square(2, 2, 1) + [(2, 2)])
+
+        assert locator.locate(2.5, 2.5) == "library"
+        assert locator.locate(8, 8) == "campus"
+
+    def test_add_and_remove(self):
+        locator = BuildingLocator()
+        locator.add("a", square(0, 0, 1) + [(0, 0)])
+        assert locator.locate(0.5, 0.5) == "a"
+
+        # replacing a footprint moves the building
+        locator.add("a", square(5, 5, 1) + [(5, 5)])
+        assert locator.locate(0.5, 0.5) is None
+        assert locator.locate(5.5, 5.5) == "a"
+
+        locator.remove("a")
+        assert locator.locate(5.5, 5.5) is None
+
+        locator.add("b", square(0, 0, 1) + [(0, 0)])
+        locator.clear()
+        assert locator.locate(0.5, 0.5) is None
+
+    def test_load_keeps_newer_footprints(self):
+        locator = BuildingLocator()
+        locator.add("old", square(0, 0, 1) + [(0, 0)])
+        edits = locator.edits
+        # added while the database's footprints were being loaded
+        locator.add("a", square(5, 5, 1) + [(5, 5)])
+
+        locator.load(
+            {"a": square(0, 0, 1) + [(0, 0)], "b": square(9, 9, 1) + [(9, 9)]},
+            version=3,
+            since=edits,
+        )
+
+        assert locator.version == 3
+        assert locator.locate(5.5, 5.5) == "a"
+        assert locator.locate(9.5, 9.5) == "b"
+        # not in the database and not added since, so it was removed
+        assert "old" not in locator.footprints
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+from graphql import FragmentDefinitionNode, OperationDefinitionNode, parse
+from src.api.selection import selected_fields
+
+
+def resolve_info(query):
+    """
+    The parts of the GraphQLResolveInfo of the top level field of a query
+    that selected_fields reads
+    """
+    document = parse(query)
+    operation = next(
+        d for d in document.definitions if isinstance(d, OperationDefinitionNode)
+    )
+    fragments = {
+        d.name.value: d
+        for d in document.definitions
+        if isinstance(d, FragmentDefinitionNode)
+    }
+    return SimpleNamespace(
+        field_nodes=operation.selection_set.selections, fragments=fragments
+    )
+
+
+class TestSelectedFields:
+    def test_fields(self):
+        info = resolve_info('{ edges(graph: "test") { edge adjacent_nodes { id } } }')
+
+        # only the fields of the result, not of the fields in it
+        assert selected_fields(info) == {"edge", "adjacent_nodes"}
+
+    def test_fragments(self):
+        info = resolve_info(
+            """
+            query {
+                edges(graph: "test") { edge ...Ends }
+            }
+            fragment Ends on Edge { ...Nodes }
+            fragment Nodes on Edge { adjacent_nodes { id } ...Ends }
+            """
+        )
+
+        assert selected_fields(info) == {"edge", "adjacent_nodes"}
+
+    def test_inline_fragments(self):
+        info = resolve_info(
+            """
+            {
+                route_matrix(graph: "test", sources: [0], targets: [1]) {
+                    ... on RouteMatrix { distances ... { paths } }
+                }
+            }
+            """
+        )
+
+        assert selected_fields(info) == {"distances", "paths"}
+
+    def test_route_matrix_paths_in_fragment(self):
+        info = resolve_info(
+            """
+            query {
+                route_matrix(graph: "test", sources: [0], targets: [1]) {
+                    ...Routes
+                }
+            }
+            fragment Routes on RouteMatrix { distances paths }
+            """
+        )
+
+        assert "paths" in selected_fields(info)
+
+    def test_no_selection(self):
+        info = resolve_info("{ poi_count }")
+
+        assert selected_fields(info) == set()
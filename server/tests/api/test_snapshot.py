@@ -0,0 +1,105 @@
+import gzip
+import json
+import pytest
+from src.api.snapshot import (
+    SNAPSHOT_VERSION,
+    accepts_gzip,
+    build_snapshot,
+    etag_matches,
+    identity_etag,
+    read_snapshot,
+)
+from src.types.map_types import PathNode, PoI, Polygon
+
+
+class TestSnapshot:
+    @classmethod
+    def setup_class(cls):
+        cls.nodes = [
+            PathNode(0, "test", 0.0, 53.81, -1.56, 0, {"indoor": "way"}),
+            PathNode(1, "test", 1.0, 53.82, -1.57, -1, {"indoor": "wall"}),
+        ]
+        cls.edges = [(0, 1)]
+        cls.polygons = [
+            Polygon(
+                0,
+                "test",
+                0.0,
+                [(0, 0), (0, 1), (1, 1)],
+                (1, 1),
+                (0, 0),
+                {"room-name": "sauna"},
+            )
+        ]
+        cls.pois = [PoI(0, "test", 0.0, -1.56, 53.81, 0, {"amenity": "bin"})]
+
+    def test_columns(self):
+        blob, _ = build_snapshot(
+            "test", self.nodes, self.edges, self.polygons, self.pois
+        )
+        snapshot = json.loads(gzip.decompress(blob))
+
+        assert snapshot["version"] == SNAPSHOT_VERSION
+        assert snapshot["graph"] == "test"
+        assert snapshot["nodes"]["id"] == [0, 1]
+        assert snapshot["nodes"]["level"] == [0.0, 1.0]
+        assert snapshot["nodes"]["tags"][1] == {"indoor": "wall"}
+        assert "graph" not in snapshot["nodes"]
+        assert snapshot["edges"] == [0, 1]
+        assert snapshot["polygons"]["vertices"] == [[[0, 0], [0, 1], [1, 1]]]
+        assert snapshot["pois"]["nearest_path_node"] == [0]
+
+    def test_read_snapshot(self):
+        blob, _ = build_snapshot(
+            "test", self.nodes, self.edges, self.polygons, self.pois
+        )
+        nodes, edges, polygons, pois = read_snapshot(blob)
+
+        assert nodes == self.nodes
+        assert edges == self.edges
+        assert polygons == self.polygons
+        assert pois == self.pois
+
+    def test_read_other_version(self):
+        blob = gzip.compress(json.dumps({"version": -1}).encode("utf-8"))
+        with pytest.raises(ValueError):
+            read_snapshot(blob)
+
+    def test_etag_is_stable(self):
+        blob, etag = build_snapshot("test", self.nodes, self.edges, [], [])
+        same_blob, same_etag = build_snapshot("test", self.nodes, self.edges, [], [])
+        _, other_etag = build_snapshot("test", self.nodes, [], [], [])
+
+        assert blob == same_blob
+        assert etag == same_etag
+        assert etag != other_etag
+
+    def test_etag_matches(self):
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('W/"abc"', '"abc"')
+        assert etag_matches('"xyz", "abc"', '"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"xyz"', '"abc"')
+        assert not etag_matches("", '"abc"')
+
+
+@pytest.mark.parametrize(
+    "header, accepted",
+    [
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, GZIP;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0, *", False),
+        ("*;q=0", False),
+        ("deflate", False),
+        ("identity", False),
+        ("", False),
+    ],
+)
+def test_accepts_gzip(header, accepted):
+    assert accepts_gzip(header) == accepted
+
+
+def test_identity_etag():
+    assert identity_etag('"abc"') == '"abc-identity"'
+    assert not etag_matches('"abc"', identity_etag('"abc"'))
@@ -0,0 +1,70 @@
+from src.api.spatial import SpatialIndex
+from src.types.map_types import PathNode, PoI, Polygon
+
+
+def square(poly_id, level, lat, lon, size=1.0):
+    vertices = [
+        (lat, lon),
+        (lat + size, lon),
+        (lat + size, lon + size),
+        (lat, lon + size),
+        (lat, lon),
+    ]
+    return Polygon(
+        poly_id, "test", level, vertices, (lat + size, lon + size), (lat, lon), {}
+    )
+
+
+class TestSpatialIndex:
+    @classmethod
+    def setup_class(cls):
+        cls.polygons = [square(i, 0.0, 0.0, 2.0 * i) for i in range(5)]
+        cls.nodes = [
+            PathNode(i, "test", 0.0, 0.5, 2.0 * i + 0.5, i, {"indoor": "way"})
+            for i in range(5)
+        ]
+        cls.pois = [PoI(0, "test", 0.0, 4.5, 0.5, 2, {"amenity": "bin"})]
+
+        cls.index = SpatialIndex()
+        cls.index.add_level(0.0, cls.polygons, cls.nodes, cls.pois)
+        cls.index.add_level(1.0, [square(9, 1.0, 0.0, 0.0)], [], [])
+
+    def test_contains(self):
+        assert 0.0 in self.index
+        assert "1.0" in self.index
+        assert 2.0 not in self.index
+
+    def test_within_bbox(self):
+        polygons, nodes, pois = self.index.within_bbox(0.0, (0.0, 2.5), (1.0, 6.0))
+
+        # overlapping polygons are included, not just contained ones
+        assert [p.id for p in polygons] == [1, 2, 3]
+        assert [n.id for n in nodes] == [1, 2]
+        assert pois == self.pois
+
+    def test_levels_are_separate(self):
+        polygons, nodes, pois = self.index.within_bbox(1.0, (0.0, 0.0), (1.0, 1.0))
+        assert [p.id for p in polygons] == [9]
+        assert nodes == [] and pois == []
+
+    def test_empty_box(self):
+        assert self.index.within_bbox(0.0, (5.0, 5.0), (6.0, 6.0)) == ([], [], [])
+
+    def test_estimated_size_grows(self):
+        index = SpatialIndex()
+        index.add_level(0.0, self.polygons, [], [])
+        size = index.estimated_size()
+        index.add_level(1.0, [], self.nodes, [])
+        assert index.estimated_size() > size > 0
+
+    def test_remove_level(self):
+        index = SpatialIndex()
+        index.add_level(0.0, self.polygons, [], [])
+        size = index.estimated_size()
+        index.add_level(1.0, [], self.nodes, [])
+        index.remove_level("1.0")
+
+        assert 1.0 not in index and 0.0 in index
+        assert index.estimated_size() == size
+        # removing a level that isn't indexed does nothing
+        index.remove_level(2.0)
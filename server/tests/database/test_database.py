@@ -1,6 +1,10 @@
 """ Test redis controller """
+import asyncio
+import copy
+import json
+import os
 import pytest
-from src.database.controller import Controller
+from src.database.controller import JOB_TTL, Controller
 from src.types.map_types import PathNode, PoI, Polygon
 
 
@@ -58,6 +62,47 @@ class TestDatabase:
         assert lnodes == node_objects
         assert ledges == edges
 
+    @pytest.mark.asyncio
+    async def test_save_graph_in_batches(cls):
+        node_objects = [
+            PathNode(
+                id=i,
+                graph="test_batches",
+                level=0.0,
+                lon=-1.5678 + i * 0.00001,
+                lat=53.819,
+                tags={"indoor": "way", "room-no": str(i)},
+                poly_id=-1,
+            )
+            for i in range(7)
+        ]
+        # a wall, which shouldn't be loaded as a node
+        node_objects.append(
+            PathNode(
+                id=7,
+                graph="test_batches",
+                level=0.0,
+                lon=-1.5678,
+                lat=53.8191,
+                tags={"indoor": "wall"},
+                poly_id=-1,
+            )
+        )
+        edges = [(i, i + 1) for i in range(7)]
+
+        await cls.controller.save_graph(
+            "test_batches", node_objects, edges, batch_size=3
+        )
+        # saving again replaces the graph rather than adding to it
+        await cls.controller.save_graph(
+            "test_batches", node_objects, edges, batch_size=3
+        )
+
+        lnodes, ledges = await cls.controller.load_graph("test_batches")
+
+        assert sorted(lnodes, key=lambda n: n.id) == node_objects[:7]
+        assert sorted(ledges) == edges
+
     @pytest.mark.asyncio
     async def test_save_and_load_poi(cls):
         pois = [
@@ -91,6 +136,87 @@ class TestDatabase:
 
         assert lpois == poi_objects
 
+    @pytest.mark.asyncio
+    async def test_pipelined_entries(cls):
+        controller = Controller(host="redis", pipeline_size=3)
+        pois = [
+            PoI(i, "test_pipeline", 0.0, -1.56, 53.81 + i / 1000, i, {"amenity": "bin"})
+            for i in range(10)
+        ]
+
+        await controller.add_entries("test_pipeline", pois)
+        lpois = await controller.load_entries("test_pipeline", PoI)
+
+        assert sorted(lpois, key=lambda x: x.id) == pois
+
+    @pytest.mark.asyncio
+    async def test_entry_index(cls):
+        pois = [
+            PoI(i, "test_index", 0.0, -1.56, 53.81, i, {"amenity": "bin"})
+            for i in range(3)
+        ]
+        await cls.controller.add_entries("test_index", pois[:2])
+        await cls.controller.add_entry("test_index", pois[2])
+
+        members = cls.controller.redis_db.smembers("Entries:PoI:test_index")
+        assert members == {b"0", b"1", b"2"}
+        assert await cls.controller.load_entries("test_index", PoI) == pois
+
+        # entries saved before the index existed are found and indexed
+        cls.controller.redis_db.delete(
+            "Entries:PoI:test_index", "IndexedEntries:PoI:test_index"
+        )
+        assert await cls.controller.load_entries("test_index", PoI) == pois
+        members = cls.controller.redis_db.smembers("Entries:PoI:test_index")
+        assert members == {b"0", b"1", b"2"}
+
+    @pytest.mark.asyncio
+    async def test_add_entry_to_unindexed_graph(cls):
+        pois = [
+            PoI(i, "test_legacy", 0.0, -1.56, 53.81, i, {"amenity": "bin"})
+            for i in range(3)
+        ]
+        await cls.controller.add_entries("test_legacy", pois[:2])
+        # saved before the index existed
+        cls.controller.redis_db.delete(
+            "Entries:PoI:test_legacy", "IndexedEntries:PoI:test_legacy"
+        )
+        for key in cls.controller.redis_db.scan_iter("*Levels*test_legacy*"):
+            cls.controller.redis_db.delete(key)
+
+        # adding a PoI doesn't hide the others
+        await cls.controller.add_entry("test_legacy", pois[2])
+        assert await cls.controller.load_entries("test_legacy", PoI, 0.0) == pois
+        assert await cls.controller.load_entries("test_legacy", PoI) == pois
+
+    @pytest.mark.asyncio
+    async def test_no_entries_are_indexed(cls):
+        # a map without PoIs, they're known to be empty without scanning
+        await cls.controller.add_entries("test_no_pois", [], PoI)
+        assert cls.controller.redis_db.exists("IndexedEntries:PoI:test_no_pois")
+        assert await cls.controller.load_entries("test_no_pois", PoI) == []
+        assert await cls.controller.load_entries("test_no_pois", PoI, 0.0) == []
+
+        # scanned once for a graph saved before indexing, then marked
+        assert await cls.controller.load_entries("test_unindexed", PoI) == []
+        assert cls.controller.redis_db.exists("IndexedEntries:PoI:test_unindexed")
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests(cls):
+        controller = Controller(host="redis", max_connections=2)
+        pois = [
+            PoI(i, "test_concurrent", 0.0, -1.56, 53.81, i, {"amenity": "bin"})
+            for i in range(10)
+        ]
+        await controller.add_entries("test_concurrent", pois)
+
+        # more requests than connections, they should queue for a connection
+        results = await asyncio.gather(
+            *[controller.load_entries("test_concurrent", PoI) for _ in range(8)]
+        )
+
+        assert all(result == pois for result in results)
+
     @pytest.mark.asyncio
     async def test_room_search(cls):
         """Check that it's actually working on redis database."""
@@ -153,6 +279,51 @@ class TestDatabase:
 
         assert res == pois
 
+    @pytest.mark.asyncio
+    async def test_search_in_graph(cls):
+        rooms = [
+            Polygon(
+                i,
+                graph,
+                0.0,
+                [(0, 0), (0, 1)],
+                (0, 0),
+                (0, 1),
+                {"room-name": f"lab {i}"},
+            )
+            for i, graph in enumerate(["test-a b", "test-a b", "test other"])
+        ]
+        for room in rooms:
+            await cls.controller.add_entry(room.graph, room)
+
+        res = await cls.controller.search_rooms("test-a b", "lab")
+        assert sorted(r.id for r in res) == [0, 1]
+
+        first = await cls.controller.search_rooms("test-a b", "lab", 0, 1)
+        second = await cls.controller.search_rooms("test-a b", "lab", 1, 1)
+        assert len(first) == len(second) == 1
+        assert first[0].id != second[0].id
+
+        # the graph filter applies to every term of the search
+        res = await cls.controller.search_rooms("test-a b", "nothing | lab")
+        assert sorted(r.id for r in res) == [0, 1]
+        res = await cls.controller.search_rooms("test other", "lab | nothing")
+        assert [r.id for r in res] == [2]
+
+    @pytest.mark.asyncio
+    async def test_poi_search_in_graph(cls):
+        pois = [
+            PoI(i, graph, 0.0, -1.56, 53.81, 0, {"amenity": "vending machine"})
+            for i, graph in enumerate(["test_or_a", "test_or_b"])
+        ]
+        for poi in pois:
+            await cls.controller.add_entry(poi.graph, poi)
+
+        res = await cls.controller.search_poi_by_name_in_graph(
+            "test_or_a", "nothing | vending"
+        )
+        assert res == pois[:1]
+
     @pytest.mark.asyncio
     async def test_get_neighbours(cls):
         neighbours = [
@@ -184,3 +355,219 @@ class TestDatabase:
         lneighbours = sorted(lneighbours, key=lambda x: x.id)
 
         assert n_objs == lneighbours
+
+    @pytest.mark.asyncio
+    async def test_batch_node_queries(cls):
+        nodes = await cls.controller.get_nodes_by_ids("test", [2, 0, 99])
+        assert [n.id if n else None for n in nodes] == [2, 0, None]
+
+        neighbours = await cls.controller.get_neighbours_of_nodes("test", [0, 1])
+        assert sorted(n.id for n in neighbours[0]) == [1, 2]
+        assert sorted(n.id for n in neighbours[1]) == [0, 2]
+
+    @pytest.mark.asyncio
+    async def test_load_edges_with_nodes(cls):
+        edges = await cls.controller.load_edges_with_nodes("test")
+
+        assert sorted((n.id, m.id) for n, m in edges) == sorted(
+            await cls.controller.load_edges("test")
+        )
+        nodes = {n.id: n for n, _ in edges}
+        assert nodes[0] == await cls.controller.get_node_by_id("test", 0)
+
+    @pytest.mark.asyncio
+    async def test_save_and_load_snapshot(cls):
+        assert await cls.controller.load_snapshot("test_snapshot") is None
+
+        await cls.controller.save_snapshot("test_snapshot", b"\x1f\x8b", '"abc"')
+        assert await cls.controller.load_snapshot("test_snapshot") == (
+            b"\x1f\x8b",
+            '"abc"',
+        )
+
+    @pytest.mark.asyncio
+    async def test_load_level(cls):
+        nodes = [
+            PathNode(
+                i, "test_levels", float(i // 2), 53.81, -1.56, -1, {"indoor": "way"}
+            )
+            for i in range(4)
+        ]
+        edges = [(0, 1), (1, 2), (2, 3)]
+        await cls.controller.save_graph("test_levels", nodes, edges)
+
+        level_nodes = await cls.controller.load_nodes("test_levels", 1.0)
+        assert sorted(n.id for n in level_nodes) == [2, 3]
+        # the edge between floors is on both of them
+        level_edges = await cls.controller.load_edges("test_levels", 0.0)
+        assert sorted(level_edges) == [(0, 1), (1, 2)]
+        # from either end, and only once when both ends are on the level
+        level_edges = await cls.controller.load_edges("test_levels", 1.0)
+        assert sorted(level_edges) == [(1, 2), (2, 3)]
+        level_edges = await cls.controller.load_edges_with_nodes("test_levels", 1.0)
+        assert sorted((n.id, m.id) for n, m in level_edges) == [(1, 2), (2, 3)]
+        assert await cls.controller.load_edges("test_levels", 5.0) == []
+
+        pois = [
+            PoI(i, "test_levels", float(i % 2), -1.56, 53.81, 0, {"amenity": "bin"})
+            for i in range(4)
+        ]
+        await cls.controller.add_entries("test_levels", pois)
+        level_pois = await cls.controller.load_entries("test_levels", PoI, 1.0)
+        assert level_pois == [pois[1], pois[3]]
+
+        # entries written before levels were indexed
+        for key in cls.controller.redis_db.scan_iter("*Levels*test_levels*"):
+            cls.controller.redis_db.delete(key)
+        cls.controller.redis_db.delete("IndexedEntries:PoI:test_levels")
+        level_pois = await cls.controller.load_entries("test_levels", PoI, 0.0)
+        assert level_pois == [pois[0], pois[2]]
+        level_pois = await cls.controller.load_entries("test_levels", PoI, 0.0)
+        assert level_pois == [pois[0], pois[2]]
+
+    @pytest.mark.asyncio
+    async def test_save_and_load_footprints(cls):
+        footprint = [(0.0, 0.0), (0.0, 1.0), (1.0, 1.0), (0.0, 0.0)]
+        version = await cls.controller.footprints_version()
+        await cls.controller.save_footprint("test_footprint", footprint)
+        assert await cls.controller.footprints_version() == version + 1
+
+        footprints = await cls.controller.load_footprints()
+        assert footprints["test_footprint"] == footprint
+
+    @pytest.mark.asyncio
+    async def test_save_and_load_job(cls):
+        await cls.controller.save_job(
+            "test_job", {"graph": "test", "status": "parsing", "created": 1.5}
+        )
+        await cls.controller.save_job("test_job", {"status": "done", "error": ""})
+
+        assert await cls.controller.load_job("test_job") == {
+            "graph": "test",
+            "status": "done",
+            "created": "1.5",
+            "error": "",
+        }
+        assert await cls.controller.load_job("no_such_job") is None
+        assert 0 < cls.controller.redis_db.ttl("Job:test_job") <= JOB_TTL
+
+    @pytest.mark.asyncio
+    async def test_versions(cls):
+        graph = "test_versions"
+
+        async def write_version(name):
+            version = await cls.controller.new_version(graph)
+            nodes = [PathNode(0, graph, 0.0, 53.81, -1.56, 0, {"indoor": "way"})]
+            rooms = [
+                Polygon(
+                    0,
+                    graph,
+                    0.0,
+                    [(0, 0), (0, 1)],
+                    (0, 0),
+                    (0, 1),
+                    {"room-name": name},
+                )
+            ]
+            await cls.controller.save_graph(version, nodes, [])
+            await cls.controller.add_entries(version, rooms)
+            await cls.controller.save_snapshot(version, name.encode("utf-8"), name)
+            return version
+
+        first = await write_version("kitchen")
+        assert await cls.controller.promote_version(graph, first) is None
+        # written but not promoted, so not read or found
+        second = await write_version("pantry")
+        assert await cls.controller.graph_version(graph) == first
+        assert (await cls.controller.load_snapshot(graph))[1] == "kitchen"
+        assert await cls.controller.search_rooms(graph, "pantry") == []
+        assert len(await cls.controller.search_rooms(graph, "kitchen")) == 1
+
+        assert await cls.controller.promote_version(graph, second) is None
+        assert (await cls.controller.load_snapshot(graph))[1] == "pantry"
+        assert [
+            r.tags["room-name"]
+            for r in await cls.controller.load_entries(graph, Polygon)
+        ] == ["pantry"]
+        assert await cls.controller.search_rooms(graph, "kitchen") == []
+
+        # rolling back swaps the live and previous versions
+        assert await cls.controller.rollback_version(graph) == first
+        assert (await cls.controller.load_snapshot(graph))[1] == "kitchen"
+        assert await cls.controller.rollback_version(graph) == second
+
+        # the version before the previous one is retired
+        third = await write_version("larder")
+        assert await cls.controller.promote_version(graph, third) == first
+        await cls.controller.delete_version(first)
+        assert list(cls.controller.redis_db.scan_iter(f"*{first}*")) == []
+        assert await cls.controller.load_nodes(graph) != []
+
+    @pytest.mark.asyncio
+    async def test_graph_lock(cls):
+        order = []
+
+        async def hold(name):
+            async with cls.controller.graph_lock("test_lock"):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.2)
+                order.append(f"{name} end")
+
+        await asyncio.gather(hold("a"), hold("b"))
+
+        # one waits for the other
+        assert order[0][0] == order[1][0]
+        assert order[2][0] == order[3][0]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_updates(cls, tmp_path):
+        from src.api.ingest import parse_files, update_files
+        from src.api.types.mutation import save_graph_update, save_parsed_graph
+
+        graph = "test_update_race"
+        path = os.getcwd() + "/server/tests/parser/test_map"
+        paths = {
+            "polygons": f"{path}/Polygons.json",
+            "linestring": f"{path}/LineString.json",
+            "points": f"{path}/Points.json",
+        }
+        await save_parsed_graph(parse_files(graph, paths))
+        version = await cls.controller.graph_version(graph)
+        blob, _ = await cls.controller.load_snapshot(version)
+
+        # both updates add a way, so both create nodes with the same IDs
+        with open(paths["linestring"], "r", encoding="utf-8") as file:
+            linestring = json.load(file)
+        updates = []
+        for shift in (0.00001, 0.00002):
+            changed = copy.deepcopy(linestring)
+            way = copy.deepcopy(changed["features"][0])
+            way["geometry"]["coordinates"] = [
+                [lon + shift, lat] for lon, lat in way["geometry"]["coordinates"]
+            ]
+            changed["features"].append(way)
+            changed_path = tmp_path / f"LineString{len(updates)}.json"
+            changed_path.write_text(json.dumps(changed))
+            updates.append(
+                update_files(graph, dict(paths, linestring=str(changed_path)), blob)
+            )
+
+        results = await asyncio.gather(
+            *[save_graph_update(version, update) for update in updates],
+            return_exceptions=True,
+        )
+
+        # the second is diffed against a snapshot that's no longer current
+        failed = [r for r in results if isinstance(r, RuntimeError)]
+        assert len(failed) == 1
+        saved = updates[results.index(None)][0]
+        nodes, edges = await cls.controller.load_graph(graph)
+        assert len({n.id for n in nodes}) == len(nodes)
+        assert sorted(nodes, key=lambda n: n.id) == [
+            n for n in saved.nodes if n.tags.get("indoor") == "way"
+        ]
+        assert sorted(edges) == sorted(saved.edges)
+        # the failed update's version is deleted, the one it was diffed
+        # against is kept for rollback
+        assert len(list(cls.controller.redis_db.scan_iter(f"Snapshot:{graph}@*"))) == 2
+        assert await cls.controller.rollback_version(graph) == version
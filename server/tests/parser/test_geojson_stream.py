@@ -0,0 +1,83 @@
+import io
+import json
+import pytest
+from src.parser.geojson_stream import FeatureFile, features, iter_features
+
+
+def point(lon, lat, **properties):
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+
+
+class TestGeoJSONStream:
+    @classmethod
+    def setup_class(cls):
+        cls.features = [
+            point(-1.5549, 53.8094, level="0", name="Café"),
+            point(-1.55, 53.8, level="1;3", name="Lecture Theatre № 2"),
+            point(12345, 67890, level=0, tags=[1, 2.5, None, True]),
+        ]
+        cls.collection = {
+            "type": "FeatureCollection",
+            "name": "Points",
+            "crs": {"type": "name", "properties": {"name": "EPSG:4326"}},
+            "features": cls.features,
+            "count": 1234567,
+        }
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 16])
+    def test_text_chunks(cls, chunk_size):
+        text = json.dumps(cls.collection, indent=2, ensure_ascii=False)
+        parsed = list(iter_features(io.StringIO(text), chunk_size))
+
+        assert parsed == cls.features
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 1 << 16])
+    def test_binary_chunks(cls, chunk_size):
+        # multi-byte characters are split between chunks
+        data = json.dumps(cls.collection, ensure_ascii=False).encode("utf-8")
+        parsed = list(iter_features(io.BytesIO(data), chunk_size))
+
+        assert parsed == cls.features
+
+    def test_lazy(cls):
+        stream = iter_features(io.StringIO(json.dumps(cls.collection)), 16)
+
+        # the trailing members aren't read until the features are exhausted
+        assert next(stream) == cls.features[0]
+        assert list(stream) == cls.features[1:]
+
+    def test_empty(cls):
+        assert list(iter_features(io.StringIO("{}"))) == []
+        assert list(iter_features(io.StringIO(' { "features" : [ ] } '))) == []
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            "[]",
+            '{"features": [{"type": "Feature"}',
+            '{"features": [{"type": "Feature"} {"type": "Feature"}]}',
+            '{"features": []',
+        ],
+    )
+    def test_invalid(cls, text):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_features(io.StringIO(text), 4))
+
+    def test_feature_file(cls, tmp_path):
+        path = tmp_path / "Points.json"
+        path.write_text(json.dumps(cls.collection), encoding="utf-8")
+        layer = FeatureFile(str(path), 16)
+
+        # read again every time, not used up by the first pass
+        assert list(layer) == cls.features
+        assert list(layer) == cls.features
+        assert list(features(layer)) == cls.features
+
+    def test_features(cls):
+        assert features(cls.collection) is cls.features
+        assert list(features(iter(cls.features))) == cls.features
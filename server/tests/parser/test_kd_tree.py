@@ -0,0 +1,30 @@
+import random
+import pytest
+from src.parser.kd_tree import KDTree
+
+
+class TestKDTree:
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        points = [(rng.random(), rng.random()) for _ in range(500)]
+        # duplicates and a grid, so there are ties
+        points += points[:50] + [(x / 10, y / 10) for x in range(10) for y in range(10)]
+        tree = KDTree(points)
+
+        for _ in range(500):
+            x, y = rng.random(), rng.random()
+            expected = min(
+                range(len(points)),
+                key=lambda i: ((points[i][0] - x) ** 2 + (points[i][1] - y) ** 2, i),
+            )
+            assert tree.nearest(x, y) == expected
+
+    def test_ties_prefer_lowest_index(self):
+        tree = KDTree([(1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, 0.0), (0.0, 0.0)])
+        assert tree.nearest(0.0, 0.0) == 3
+        assert tree.nearest(0.0, 10.0) == 1
+
+    def test_small_trees(self):
+        assert KDTree([(5.0, 5.0)]).nearest(0.0, 0.0) == 0
+        with pytest.raises(ValueError):
+            KDTree([]).nearest(0.0, 0.0)
@@ -1,5 +1,8 @@
+import json
 import os
+import shapely.geometry
 from src.parser.graph_parser import Parser
+from src.parser.polygon_parser import PolygonParser
 from src.parser.map_data import MapData
 from src.types.map_types import PathNode, PoI
 
@@ -588,7 +591,8 @@ class TestParser:
                 level=0.0,
                 lon=-1.567760088424428,
                 lat=53.81901001236848,
-                nearest_path_node=28,
+                # 2.24m away, wall node 28 is 2.36m but nearer in degrees
+                nearest_path_node=2,
                 tags={"amenity": "washing machine", "level": 0.0},
             ),
             PoI(
@@ -611,3 +615,216 @@ class TestParser:
             ),
         ]
         assert cls.p.pois == expected
+
+    def test_map_data_layers(cls):
+        # the same layers parse again, they aren't used up by setup_class
+        parser = Parser("test", cls.d.polygons, cls.d.linestring, cls.d.points)
+        assert parser.nodes == cls.p.nodes
+        layer = cls.d.points
+        assert list(layer) == list(layer) != []
+
+    def test_decoded_layers(cls):
+        # whole FeatureCollections give the same graph as streamed features
+        layers = []
+        for name in ["Polygons", "LineString", "Points"]:
+            with open(f"{cls.d.path}/{name}.json", "r", encoding="utf-8") as file:
+                layers.append(json.load(file))
+        parser = Parser("test", *layers)
+
+        assert parser.nodes == cls.p.nodes
+        assert parser.edges == cls.p.edges
+        assert parser.polygons == cls.p.polygons
+        assert parser.pois == cls.p.pois
+
+    def test_poi_outside_rooms(cls):
+        def line(coordinates, indoor):
+            return {
+                "type": "Feature",
+                "properties": {"level": 0.0, "indoor": indoor},
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+            }
+
+        def point(lon, lat):
+            return {
+                "type": "Feature",
+                "properties": {"level": 0.0, "amenity": "bin"},
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            }
+
+        parser = Parser(
+            "test",
+            {"features": []},
+            {
+                "features": [
+                    line([[0.0, 0.0], [0.0, 1.0], [0.0, 2.0]], "way"),
+                    line([[1.0, 1.0], [1.0, 1.5]], "wall"),
+                ]
+            },
+            {"features": [point(0.9, 1.4), point(-0.1, 0.1)]},
+        )
+
+        # nearest path node, the wall is nearer but can't be routed to
+        assert [p.nearest_path_node for p in parser.pois] == [1, 0]
+
+
+class TestPolygonParser:
+    @staticmethod
+    def feature(level, lat, lon, size):
+        ring = [
+            [lon, lat],
+            [lon, lat + size],
+            [lon + size, lat + size],
+            [lon + size, lat],
+            [lon, lat],
+        ]
+        return {
+            "type": "Feature",
+            "properties": {"level": level, "indoor": "room"},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        }
+
+    def test_in_poly(cls):
+        parser = PolygonParser(
+            "test",
+            {
+                "features": [
+                    cls.feature("0", 0, 0, 10),
+                    # inside the first room, which was loaded first
+                    cls.feature("0", 1, 1, 2),
+                    cls.feature("0", 20, 20, 2),
+                    cls.feature("1", 0, 0, 2),
+                ]
+            },
+        )
+        parser.load_polygons()
+
+        assert parser.in_poly(shapely.geometry.Point(2, 2), 0.0).id == 0
+        assert parser.in_poly(shapely.geometry.Point(21, 21), 0.0).id == 2
+        assert parser.in_poly(shapely.geometry.Point(1, 1), 1.0).id == 3
+        assert parser.in_poly(shapely.geometry.Point(15, 15), 0.0) is None
+        assert parser.in_poly(shapely.geometry.Point(1, 1), 2.0) is None
+
+    def test_connect_stairways(cls):
+        stairs = cls.feature("0;3", 0, 0, 2)
+        stairs["properties"]["stairs"] = "yes"
+        lift = cls.feature("0;3", 5, 5, 2)
+        lift["properties"]["highway"] = "elevator"
+
+        parser = PolygonParser(
+            "test",
+            {
+                "features": [
+                    cls.feature("0", 10, 10, 2),
+                    cls.feature("1", 10, 10, 2),
+                    cls.feature("2", 10, 10, 2),
+                    stairs,
+                    lift,
+                ]
+            },
+        )
+        parser.load_polygons()
+        stairs_id, lift_id = 3, 6
+
+        def node(id, level, poly_id, indoor="way"):
+            return PathNode(id, "test", level, 0, 0, poly_id, {"indoor": indoor})
+
+        nodes = [
+            node(0, 0.0, stairs_id),
+            node(1, 1.0, stairs_id),
+            node(2, 1.0, stairs_id),
+            node(3, 2.0, stairs_id),
+            node(4, 0.0, stairs_id, "wall"),
+            node(5, 0.0, lift_id),
+            node(6, 0.0, lift_id),
+            node(7, 2.0, lift_id),
+            node(8, 1.0, 0),
+        ]
+
+        # every pair once, stairs only to the floors either side
+        assert parser.connect_stairways(nodes) == [
+            (0, 1),
+            (0, 2),
+            (1, 3),
+            (2, 3),
+            (5, 7),
+            (6, 7),
+        ]
+
+
+class TestParallelParser:
+    @staticmethod
+    def line(level, *points):
+        return {
+            "type": "Feature",
+            "properties": {"level": level, "indoor": "way"},
+            "geometry": {
+                "type": "LineString",
+                "coordinates": [list(p) for p in points],
+            },
+        }
+
+    @classmethod
+    def setup_class(cls):
+        room = TestPolygonParser.feature
+        stairs = room("0;3", 0, 0, 2)
+        stairs["properties"]["stairs"] = "yes"
+        cls.polygons = {
+            "features": [room(level, 0, 2, 8) for level in ["0", "1", "2"]] + [stairs]
+        }
+
+        # features of different levels interleaved, sharing coordinates
+        cls.linestring = {"features": []}
+        for step in range(4):
+            for level in ["2", "0", "1"]:
+                cls.linestring["features"].append(
+                    cls.line(level, (1, 1), (3 + step, 1), (3 + step, 2 + step))
+                )
+        cls.linestring["features"].append({"properties": {}, "geometry": None})
+
+        def point(level, lon, lat):
+            return {
+                "type": "Feature",
+                "properties": {"level": level, "amenity": "toilets"},
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            }
+
+        # in a room, in the stairs (on every level) and on a level with no
+        # nodes
+        cls.points = {
+            "features": [point("1", 5, 5), point("2", 1.2, 1.1), point("3", 1, 1)]
+        }
+
+    def test_same_as_serial(cls):
+        serial = Parser("test", cls.polygons, cls.linestring, cls.points)
+        parallel = Parser("test", cls.polygons, cls.linestring, cls.points, workers=3)
+
+        assert len(serial.nodes) == 3 * 9
+        assert parallel.nodes == serial.nodes
+        assert parallel.edges == serial.edges
+        assert parallel.pois == serial.pois
+        assert [p.nearest_path_node for p in serial.pois][2] is None
+        # the stairs join the levels
+        stair_edges = serial.edges[-2:]
+        levels = [
+            sorted([serial.nodes[a].level, serial.nodes[b].level])
+            for a, b in stair_edges
+        ]
+        assert sorted(levels) == [[0.0, 1.0], [1.0, 2.0]]
+
+    def test_fewer_than_two_levels(cls):
+        empty = {"features": []}
+        assert Parser("t", empty, empty, empty, workers=4).nodes == []
+
+        # one level, streamed so the layer can only be read once
+        one_level = [f for f in cls.linestring["features"][:4] if f["geometry"]]
+        serial = Parser("test", cls.polygons, {"features": one_level}, cls.points)
+        parallel = Parser(
+            "test",
+            cls.polygons,
+            iter(one_level),
+            iter(cls.points["features"]),
+            workers=4,
+        )
+        assert parallel.nodes == serial.nodes
+        assert parallel.edges == serial.edges
+        assert parallel.pois == serial.pois
@@ -0,0 +1,98 @@
+import json
+import random
+import networkx as nx
+import pytest
+from src.path_finding.contraction import ContractionHierarchy
+from src.path_finding.preprocess import build_hierarchy
+from src.path_finding.router import Router
+from src.types.map_types import PathNode
+
+
+def random_graph(size, seed):
+    """A connected graph of nodes scattered over ~100m with local edges"""
+    rng = random.Random(seed)
+    nodes = [
+        PathNode(
+            graph="test",
+            id=index * 3 + 1,
+            level=0.0,
+            lat=53.8 + rng.random() * 0.001,
+            lon=-1.55 + rng.random() * 0.0015,
+            poly_id=-1,
+            tags={"indoor": "way"},
+        )
+        for index in range(size)
+    ]
+
+    edges = []
+    for index in range(1, size):
+        # always join to an earlier node so the graph is connected
+        edges.append((nodes[rng.randrange(index)].id, nodes[index].id))
+    for _ in range(size):
+        edges.append((rng.choice(nodes).id, rng.choice(nodes).id))
+
+    return nodes, edges
+
+
+def path_length(router, path):
+    return sum(router.edge_weight(n, m) for n, m in zip(path, path[1:]))
+
+
+class TestContractionHierarchy:
+    def test_matches_astar(self):
+        nodes, edges = random_graph(150, 0)
+        router = Router(nodes, edges, [])
+        ch_router = Router(nodes, edges, [])
+        ch_router.build_hierarchy()
+
+        rng = random.Random(1)
+        for _ in range(30):
+            start, end = rng.choice(nodes).id, rng.choice(nodes).id
+            path = ch_router.find_path(start, end)
+
+            assert path[0] == start and path[-1] == end
+            assert all(router.graph.has_edge(n, m) for n, m in zip(path, path[1:]))
+            assert path_length(router, path) == pytest.approx(
+                path_length(router, router.find_path(start, end))
+            )
+
+    def test_serialise(self):
+        nodes, edges = random_graph(50, 2)
+        router = Router(nodes, edges, [])
+        hierarchy = router.build_hierarchy()
+
+        loaded = ContractionHierarchy.from_dict(
+            json.loads(json.dumps(hierarchy.to_dict()))
+        )
+        loaded_router = Router(nodes, edges, [], hierarchy=loaded)
+
+        assert loaded_router.hierarchy is loaded
+        assert loaded_router.find_path(1, 148) == router.find_path(1, 148)
+
+        old_format = dict(hierarchy.to_dict(), version=0)
+        assert ContractionHierarchy.from_dict(old_format) is None
+
+    def test_no_path(self):
+        hierarchy = ContractionHierarchy.build([0, 1, 2, 3], [(0, 1, 1.0), (2, 3, 1.0)])
+
+        assert hierarchy.find_path(0, 1) == [0, 1]
+        assert hierarchy.find_path(2, 2) == [2]
+        with pytest.raises(nx.NetworkXNoPath):
+            hierarchy.find_path(0, 3)
+        with pytest.raises(nx.NodeNotFound):
+            hierarchy.find_path(0, 4)
+
+    def test_mismatched_hierarchy_ignored(self):
+        nodes, edges = random_graph(20, 3)
+        hierarchy = Router(nodes[:10], edges, []).build_hierarchy()
+
+        router = Router(nodes, edges, [], hierarchy=hierarchy)
+        assert router.hierarchy is None
+
+    def test_build_hierarchy_skips_walls(self):
+        nodes, edges = random_graph(20, 4)
+        nodes[5].tags = {"indoor": "wall"}
+
+        hierarchy = build_hierarchy(nodes, edges, [])
+        assert nodes[5].id not in hierarchy.node_ids
+        assert len(hierarchy.node_ids) == 19
@@ -0,0 +1,109 @@
+import networkx as nx
+import pytest
+from src.path_finding.csr_graph import CSRGraph
+from src.path_finding.router import Router
+from src.types.map_types import PathNode
+
+
+def grid_nodes(width, height):
+    """Nodes on a grid roughly a metre apart, with shuffled IDs"""
+    return [
+        PathNode(
+            graph="test",
+            id=(x * height + y) * 7 + 3,
+            level=0.0,
+            lat=53.8 + y * 0.00001,
+            lon=-1.55 + x * 0.000015,
+            poly_id=-1,
+            tags={"indoor": "way"},
+        )
+        for x in range(width)
+        for y in range(height)
+    ]
+
+
+def grid_edges(width, height):
+    def node_id(x, y):
+        return (x * height + y) * 7 + 3
+
+    edges = []
+    for x in range(width):
+        for y in range(height):
+            if x + 1 < width:
+                edges.append((node_id(x, y), node_id(x + 1, y)))
+            if y + 1 < height:
+                edges.append((node_id(x, y), node_id(x, y + 1)))
+            # some diagonals so shortest paths aren't all the same length
+            if x + 1 < width and y + 1 < height and (x + y) % 3 == 0:
+                edges.append((node_id(x, y), node_id(x + 1, y + 1)))
+    return edges
+
+
+class TestCSRGraph:
+    def test_neighbours(self):
+        graph = CSRGraph(4, [(0, 1, 1.0), (1, 2, 2.0), (0, 2, 5.0)])
+
+        indices, weights = graph.neighbours(2)
+        assert sorted(zip(indices, weights)) == [(0, 5.0), (1, 2.0)]
+        assert graph.neighbours(3) == ([], [])
+
+    def test_astar(self):
+        graph = CSRGraph(4, [(0, 1, 1.0), (1, 2, 2.0), (0, 2, 5.0), (2, 3, 1.0)])
+
+        assert graph.astar(0, 3, lambda i, j: 0.0) == [0, 1, 2, 3]
+        assert graph.astar(3, 0, lambda i, j: 0.0) == [3, 2, 1, 0]
+        assert graph.astar(1, 1, lambda i, j: 0.0) == [1]
+
+    def test_no_path(self):
+        graph = CSRGraph(4, [(0, 1, 1.0), (2, 3, 1.0)])
+
+        with pytest.raises(nx.NetworkXNoPath):
+            graph.astar(0, 3, lambda i, j: 0.0)
+
+        with pytest.raises(nx.NodeNotFound):
+            graph.astar(0, 4, lambda i, j: 0.0)
+
+    def test_dijkstra(self):
+        graph = CSRGraph(4, [(0, 1, 1.0), (1, 2, 2.0), (0, 2, 5.0), (2, 3, 1.0)])
+
+        distances, parents = graph.dijkstra(0)
+        assert distances == {0: 0.0, 1: 1.0, 2: 3.0, 3: 4.0}
+        assert graph.path_to(parents, 3) == [0, 1, 2, 3]
+
+        distances, _ = graph.dijkstra(0, targets=[1])
+        assert 3 not in distances
+
+
+class TestCSRRouter:
+    def test_matches_networkx(self):
+        nodes = grid_nodes(12, 9)
+        edges = grid_edges(12, 9)
+
+        nx_router = Router(nodes, edges, [])
+        csr_router = Router(nodes, edges, [], backend="csr")
+
+        def length(router, path):
+            return sum(router.edge_weight(n, m) for n, m in zip(path, path[1:]))
+
+        for start, end in [(3, nodes[-1].id), (nodes[40].id, nodes[17].id)]:
+            nx_path = nx_router.find_path(start, end)
+            csr_path = csr_router.find_path(start, end)
+
+            assert csr_path[0] == start and csr_path[-1] == end
+            assert length(csr_router, csr_path) == pytest.approx(
+                length(nx_router, nx_path)
+            )
+            assert csr_router.get_path_nodes(csr_path) == nx_router.get_path_nodes(
+                csr_path
+            )
+
+    def test_unknown_node(self):
+        nodes = grid_nodes(2, 2)
+        router = Router(nodes, grid_edges(2, 2), [], backend="csr")
+
+        with pytest.raises(nx.NodeNotFound):
+            router.find_path(nodes[0].id, 1000)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            Router([], [], [], backend="igraph")
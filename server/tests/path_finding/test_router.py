@@ -1,3 +1,4 @@
+from src.api.types.path import RouteMatrixObj
 from src.path_finding.router import Router
 from src.types.map_types import PathNode, Polygon
 
@@ -982,3 +983,130 @@ class TestPathfinder:
         instructions = r.generate_instructions(path)
 
         assert instructions == ["Forward", "Left"]
+
+    def test_distance(self):
+        nodes = [
+            PathNode(
+                graph="test",
+                id=4,
+                level=0.0,
+                lat=53.0,
+                lon=-1.5,
+                poly_id=-1,
+            ),
+            PathNode(
+                graph="test",
+                id=7,
+                level=0.0,
+                lat=54.0,
+                lon=-1.5,
+                poly_id=-1,
+            ),
+        ]
+
+        r = Router(nodes, [(4, 7)], [])
+        # one degree of latitude is roughly 111.2km
+        assert abs(r.distance(4, 7) - 111195) < 1
+        assert r.distance(4, 7) == r.distance(7, 4)
+
+    def test_shortest_distance_not_fewest_hops(self):
+        """Routes should minimise distance rather than the number of edges"""
+        coordinates = [
+            (53.8, -1.55),
+            (53.8, -1.549),
+            # a long way off to the north
+            (53.81, -1.5495),
+            (53.8, -1.5497),
+            (53.8, -1.5493),
+        ]
+        nodes = [
+            PathNode(
+                graph="test",
+                id=index,
+                level=0.0,
+                lat=lat,
+                lon=lon,
+                poly_id=-1,
+                tags={"indoor": "way"},
+            )
+            for index, (lat, lon) in enumerate(coordinates)
+        ]
+
+        edges = [(0, 2), (2, 1), (0, 3), (3, 4), (4, 1)]
+        r = Router(nodes, edges, [])
+        assert r.find_path(0, 1) == [0, 3, 4, 1]
+
+    def test_ignores_edges_to_unknown_nodes(self):
+        nodes = [
+            {
+                "id": 0,
+                "graph": "test",
+                "level": 0.0,
+                "lon": -1.56783186301712,
+                "lat": 53.8190438905365,
+                "poly_id": 5,
+            },
+            {
+                "id": 1,
+                "graph": "test",
+                "level": 0.0,
+                "lon": -1.56780921638632,
+                "lat": 53.8190394208067,
+                "poly_id": 5,
+            },
+        ]
+
+        node_objects = [PathNode(**node) for node in nodes]
+
+        # node 2 is a wall, which isn't loaded for routing
+        edges = [(0, 1), (1, 2)]
+        r = Router(node_objects, edges, [])
+        assert r.find_path(0, 1) == [0, 1]
+        assert 2 not in r.graph
+
+    def test_route_matrix(self):
+        coordinates = [
+            (53.8, -1.55),
+            (53.8, -1.549),
+            (53.81, -1.5495),
+            (53.8, -1.5497),
+            (53.8, -1.5493),
+            # not connected to anything else
+            (53.9, -1.5),
+        ]
+        nodes = [
+            PathNode(
+                graph="test",
+                id=index,
+                level=0.0,
+                lat=lat,
+                lon=lon,
+                poly_id=-1,
+                tags={"indoor": "way"},
+            )
+            for index, (lat, lon) in enumerate(coordinates)
+        ]
+        edges = [(0, 2), (2, 1), (0, 3), (3, 4), (4, 1)]
+
+        for backend in ("networkx", "csr"):
+            r = Router(nodes, edges, [], backend=backend)
+            distances, paths = r.route_matrix([0, 5], [1, 2, 0], paths=True)
+
+            assert distances[0][0] == r.distance(0, 3) + r.distance(3, 4) + r.distance(
+                4, 1
+            )
+            assert distances[0][2] == 0.0
+            assert distances[1] == [None, None, None]
+            assert paths[0] == [[0, 3, 4, 1], [0, 2], [0]]
+            assert paths[1] == [None, None, None]
+
+            # same as routing each pair on its own
+            assert paths[0][0] == r.find_path(0, 1)
+
+            # paths are only unwound if asked for
+            assert r.route_matrix([0, 5], [1, 2, 0]) == (distances, None)
+
+            # but still resolved if they weren't expected
+            matrix = RouteMatrixObj(r, [0, 5], [1, 2, 0], paths=False)
+            assert matrix.distances() == distances
+            assert matrix.paths() == paths